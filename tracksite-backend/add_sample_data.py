@@ -12,9 +12,7 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from database import SessionLocal
 import models
-import crud
-import schemas
-import uuid
+import bulk
 
 def add_sample_data():
     """Add sample folders, bookmarks, and file/app uploads to the database"""
@@ -24,7 +22,7 @@ def add_sample_data():
     try:
         print("Adding sample data to database...")
         
-        # Create sample folders
+        # Sample folders are created on the fly by the bulk importer
         folders_data = [
             "Work Projects",
             "Personal Documents", 
@@ -32,31 +30,20 @@ def add_sample_data():
             "Reference Materials"
         ]
         
-        created_folders = []
-        for folder_name in folders_data:
-            folder = crud.get_folder_by_name(db, folder_name)
-            if not folder:
-                folder = crud.create_folder(db, schemas.FolderCreate(name=folder_name))
-                print(f"Created folder: {folder.name}")
-            created_folders.append(folder)
-        
         # Create sample URL bookmarks
         url_bookmarks = [
-            {"title": "GitHub", "url": "https://github.com", "folder_id": created_folders[2].id},
-            {"title": "Stack Overflow", "url": "https://stackoverflow.com", "folder_id": created_folders[2].id},
-            {"title": "MDN Web Docs", "url": "https://developer.mozilla.org", "folder_id": created_folders[3].id},
-            {"title": "Google Drive", "url": "https://drive.google.com", "folder_id": created_folders[1].id},
-            {"title": "Notion", "url": "https://notion.so", "folder_id": created_folders[0].id},
-            {"title": "Figma", "url": "https://figma.com", "folder_id": created_folders[0].id},
-            {"title": "Slack", "url": "https://slack.com", "folder_id": created_folders[0].id},
-            {"title": "Trello", "url": "https://trello.com", "folder_id": created_folders[0].id}
+            {"title": "GitHub", "url": "https://github.com", "folder": folders_data[2]},
+            {"title": "Stack Overflow", "url": "https://stackoverflow.com", "folder": folders_data[2]},
+            {"title": "MDN Web Docs", "url": "https://developer.mozilla.org", "folder": folders_data[3]},
+            {"title": "Google Drive", "url": "https://drive.google.com", "folder": folders_data[1]},
+            {"title": "Notion", "url": "https://notion.so", "folder": folders_data[0]},
+            {"title": "Figma", "url": "https://figma.com", "folder": folders_data[0]},
+            {"title": "Slack", "url": "https://slack.com", "folder": folders_data[0]},
+            {"title": "Trello", "url": "https://trello.com", "folder": folders_data[0]}
         ]
         
-        for bookmark_data in url_bookmarks:
-            bookmark = crud.create_bookmark(db, schemas.BookmarkCreate(**bookmark_data))
-            print(f"Created URL bookmark: {bookmark.title}")
-        
         # Create sample file bookmarks
+        file_bookmarks = []
         files_dir = Path("uploads/files")
         if files_dir.exists():
             sample_files = [
@@ -68,28 +55,22 @@ def add_sample_data():
             for filename in sample_files:
                 file_path = files_dir / filename
                 if file_path.exists():
-                    # Create unique filename for database
-                    unique_filename = f"{uuid.uuid4()}_{filename}"
                     file_url = f"file://{file_path.absolute()}"
                     
                     # Determine folder based on file type
                     if "document" in filename:
-                        folder_id = created_folders[1].id
-                    elif "spreadsheet" in filename:
-                        folder_id = created_folders[0].id
+                        folder = folders_data[1]
                     else:
-                        folder_id = created_folders[0].id
+                        folder = folders_data[0]
                     
-                    bookmark_data = schemas.BookmarkCreate(
-                        title=filename.replace("sample_", "").replace(".", " ").title(),
-                        url=file_url,
-                        folder_id=folder_id
-                    )
-                    
-                    bookmark = crud.create_bookmark(db, bookmark_data)
-                    print(f"Created file bookmark: {bookmark.title}")
+                    file_bookmarks.append({
+                        "title": filename.replace("sample_", "").replace(".", " ").title(),
+                        "url": file_url,
+                        "folder": folder
+                    })
         
         # Create sample application bookmarks
+        app_bookmarks = []
         apps_dir = Path("uploads/applications")
         if apps_dir.exists():
             sample_apps = [
@@ -100,18 +81,13 @@ def add_sample_data():
             for filename in sample_apps:
                 app_path = apps_dir / filename
                 if app_path.exists():
-                    # Create unique filename for database
-                    unique_filename = f"{uuid.uuid4()}_{filename}"
                     app_url = f"app://{app_path.absolute()}"
                     
-                    bookmark_data = schemas.BookmarkCreate(
-                        title=filename.replace("_", " ").replace(".sh", "").title(),
-                        url=app_url,
-                        folder_id=created_folders[2].id
-                    )
-                    
-                    bookmark = crud.create_bookmark(db, bookmark_data)
-                    print(f"Created app bookmark: {bookmark.title}")
+                    app_bookmarks.append({
+                        "title": filename.replace("_", " ").replace(".sh", "").title(),
+                        "url": app_url,
+                        "folder": folders_data[2]
+                    })
         
         # Create some unassigned bookmarks for variety
         unassigned_bookmarks = [
@@ -120,14 +96,15 @@ def add_sample_data():
             {"title": "News", "url": "https://news.ycombinator.com"}
         ]
         
-        for bookmark_data in unassigned_bookmarks:
-            bookmark = crud.create_bookmark(db, schemas.BookmarkCreate(**bookmark_data))
-            print(f"Created unassigned bookmark: {bookmark.title}")
+        records = url_bookmarks + file_bookmarks + app_bookmarks + unassigned_bookmarks
+        report = bulk.import_bookmarks(db, records)
+        for error in report["errors"]:
+            print(f"Skipped bookmark: {error['error']}")
         
         print("\n✅ Sample data added successfully!")
-        print(f"Created {len(created_folders)} folders")
+        print(f"Created {report['folders_created']} folders")
         print(f"Created {len(url_bookmarks)} URL bookmarks")
-        print(f"Created file and app bookmarks")
+        print(f"Created {len(file_bookmarks)} file and {len(app_bookmarks)} app bookmarks")
         print(f"Created {len(unassigned_bookmarks)} unassigned bookmarks")
         
     except Exception as e:
@@ -0,0 +1,460 @@
+# backup.py
+
+"""Online snapshots of the database and the upload store, and restoring them.
+
+    python -m backup create
+    python -m backup list
+    python -m backup restore 20261018-120000
+
+A snapshot is a directory under BACKUP_DIR holding the database, an uploads
+tree and manifest.json. It is built as NAME.partial and renamed once complete,
+so a directory without the suffix is always a whole snapshot. SQLite is copied
+with its online backup API, PAGES_PER_STEP pages at a time; MySQL is dumped
+table by table, as JSON lines, inside one consistent-snapshot transaction.
+Neither blocks writers.
+
+Uploads are content-addressed and never modified in place, so they are copied
+rsync --link-dest style: a file the previous snapshot holds at the same path
+with the same size and mtime is hardlinked from it instead of copied, and
+files that are hardlinks of each other (blobs and their upload names) stay
+linked in the snapshot. The tree is synced once before the database is copied
+and again after, which picks up uploads added in between, so the snapshot has
+the files its database refers to.
+
+Between steps the backup looks at the latency of recent requests to this
+process (see metrics.py) and waits while their p95 is over
+LATENCY_BUDGET_SECONDS, for at most MAX_WAIT_SECONDS per step. The CLI has
+no requests of its own to watch and only pauses between steps.
+
+Restoring replaces the database contents and the uploads tree with the
+snapshot's. Stop the server first.
+"""
+
+import argparse
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import stat
+import time
+from datetime import datetime
+from pathlib import Path
+from sqlalchemy import DateTime, delete, insert, select, update
+import fastjson, migrations, metrics, models, storage
+from database import engine
+
+BACKUP_DIR = Path(os.getenv("TRACKSITE_BACKUP_DIR", "backups"))
+KEEP = int(os.getenv("TRACKSITE_BACKUP_KEEP", "7"))  # newest snapshots kept, 0 keeps all
+LATENCY_BUDGET_SECONDS = float(os.getenv("TRACKSITE_BACKUP_LATENCY_BUDGET_MS", "250")) / 1000
+PAGES_PER_STEP = int(os.getenv("TRACKSITE_BACKUP_PAGES_PER_STEP", "256"))
+
+ROWS_PER_STEP = 5000
+STEP_INTERVAL_SECONDS = 0.05  # work this long between pauses
+STEP_PAUSE_SECONDS = 0.005
+MAX_WAIT_SECONDS = 5.0  # longest wait for latency to recover before taking a step anyway
+MAX_RESTARTS = 3  # SQLite backups restarted by concurrent writes before copying in one pass
+
+MANIFEST = "manifest.json"
+SQLITE_FILE = "tracksite.db"
+TABLES_DIR = "tables"
+UPLOADS_DIR = "uploads"
+PARTIAL_SUFFIX = ".partial"
+
+# Describe the database they live in rather than its data, so dumps leave them alone
+SCHEMA_TABLES = {"schema_migrations", "schema_state"}
+# Filled by triggers while the other tables are loaded; loaded last, over those rows
+CHANGE_LOG_TABLES = ("changes", "sync_state")
+
+logger = logging.getLogger("tracksite.backup")
+
+class Throttle:
+    """Paces a backup between steps and reports its progress"""
+
+    def __init__(self, budget: float = LATENCY_BUDGET_SECONDS, progress=None):
+        self.budget = budget
+        self.progress = progress
+        self.bytes = 0
+        self.waited = 0.0
+        self._last_pause = time.monotonic()
+
+    def step(self, copied: int = 0):
+        """Count copied bytes; every STEP_INTERVAL_SECONDS, report progress
+        (in MiB) and pause, for longer while live requests are over budget"""
+        self.bytes += copied
+        if time.monotonic() - self._last_pause < STEP_INTERVAL_SECONDS:
+            return
+        if self.progress is not None:
+            self.progress(self.bytes >> 20)
+        started = time.monotonic()
+        time.sleep(STEP_PAUSE_SECONDS)
+        while time.monotonic() - started < MAX_WAIT_SECONDS:
+            latency = metrics.registry.recent_latency()
+            if latency is None or latency <= self.budget:
+                break
+            time.sleep(0.1)
+        self._last_pause = time.monotonic()
+        self.waited += self._last_pause - started
+
+# Database
+class _Restarted(Exception):
+    """Concurrent writes keep restarting a stepped SQLite backup"""
+
+def backup_sqlite(engine, path: Path, throttle: Throttle) -> int:
+    """Copy a SQLite database to path with the online backup API; returns its
+    page count. Writes through other connections restart a stepped backup, so
+    after MAX_RESTARTS it copies in one pass, which in WAL mode still only
+    holds a read snapshot."""
+    if engine.url.database in (None, "", ":memory:"):
+        raise ValueError("Only file-backed SQLite databases can be backed up")
+    raw = engine.raw_connection()
+    target = sqlite3.connect(path)
+    try:
+        source = raw.driver_connection
+        page_size = source.execute("PRAGMA page_size").fetchone()[0]
+        state = {"remaining": None, "restarts": 0}
+
+        def step(status, remaining, total):
+            previous = state["remaining"]
+            if previous is None:
+                previous = total
+            elif remaining > previous:
+                state["restarts"] += 1
+                if state["restarts"] > MAX_RESTARTS:
+                    raise _Restarted()
+                previous = total  # started over from the first page
+            state["remaining"] = remaining
+            throttle.step((previous - remaining) * page_size)
+
+        try:
+            source.backup(target, pages=PAGES_PER_STEP, progress=step)
+        except _Restarted:
+            logger.warning("Backup restarted %d times by concurrent writes; copying in one pass", MAX_RESTARTS)
+            source.backup(target)
+        return target.execute("PRAGMA page_count").fetchone()[0]
+    finally:
+        target.close()
+        raw.close()
+
+def _dumped_tables():
+    return [table for table in models.Base.metadata.sorted_tables if table.name not in SCHEMA_TABLES]
+
+def dump_tables(engine, dest: Path, throttle: Throttle) -> dict:
+    """Write each table to dest/{table}.jsonl in primary key order, all from
+    one consistent snapshot; returns row counts by table"""
+    dest.mkdir()
+    counts = {}
+    with engine.connect() as conn:
+        if conn.dialect.name == "mysql":
+            conn.execution_options(isolation_level="REPEATABLE READ")
+            conn.exec_driver_sql("START TRANSACTION WITH CONSISTENT SNAPSHOT")
+        for table in _dumped_tables():
+            query = (
+                select(table)
+                .order_by(*table.primary_key.columns)
+                .execution_options(stream_results=True, yield_per=ROWS_PER_STEP)
+            )
+            counts[table.name] = 0
+            with open(dest / f"{table.name}.jsonl", "wb") as out:
+                for rows in conn.execute(query).partitions():
+                    chunk = b"".join(fastjson.dumps(row._asdict()) + b"\n" for row in rows)
+                    out.write(chunk)
+                    counts[table.name] += len(rows)
+                    throttle.step(len(chunk))
+    return counts
+
+def _decode(column, value):
+    if isinstance(value, str) and isinstance(column.type, DateTime):
+        return datetime.fromisoformat(value)
+    return value
+
+def load_tables(engine, source: Path) -> dict:
+    """Replace the rows of every dumped table with the dump's, in one
+    transaction; returns row counts by table"""
+    tables = [table for table in _dumped_tables() if (source / f"{table.name}.jsonl").exists()]
+    tables.sort(key=lambda table: table.name in CHANGE_LOG_TABLES)
+    counts = {}
+    with engine.begin() as conn:
+        if conn.dialect.name == "mysql":
+            conn.exec_driver_sql("SET FOREIGN_KEY_CHECKS = 0")  # folders may sort before their parent
+        for table in reversed(_dumped_tables()):
+            conn.execute(delete(table))
+        for table in tables:
+            if table.name in CHANGE_LOG_TABLES:
+                conn.execute(delete(table))
+            columns = {column.name: column for column in table.columns}
+            counts[table.name] = 0
+            batch = []
+            with open(source / f"{table.name}.jsonl", "rb") as lines:
+                for line in lines:
+                    row = json.loads(line)
+                    # Columns added since the dump take their defaults
+                    batch.append({name: _decode(columns[name], value) for name, value in row.items() if name in columns})
+                    if len(batch) >= ROWS_PER_STEP:
+                        conn.execute(insert(table), batch)
+                        counts[table.name] += len(batch)
+                        batch = []
+            if batch:
+                conn.execute(insert(table), batch)
+                counts[table.name] += len(batch)
+        if conn.dialect.name == "mysql":
+            conn.exec_driver_sql("SET FOREIGN_KEY_CHECKS = 1")
+    return counts
+
+def copy_database(engine, dest: Path, throttle: Throttle) -> dict:
+    """Copy the database into a snapshot directory; returns its manifest entry"""
+    dialect = engine.dialect.name
+    if dialect == "sqlite":
+        return {"format": "sqlite", "file": SQLITE_FILE, "pages": backup_sqlite(engine, dest / SQLITE_FILE, throttle)}
+    if dialect == "mysql":
+        return {"format": "tables", "dir": TABLES_DIR, "rows": dump_tables(engine, dest / TABLES_DIR, throttle)}
+    raise NotImplementedError(f"Backups are not supported on {dialect}")
+
+# Uploads
+def _files(root: Path):
+    """Regular files under root as relative paths, skipping in-progress uploads"""
+    for directory, _, names in os.walk(root):
+        for name in names:
+            if not name.endswith(".part"):
+                yield (Path(directory) / name).relative_to(root)
+
+def _copy_file(source: Path, target: Path, throttle: Throttle = None):
+    temp = target.with_name(target.name + ".part")
+    try:
+        with open(source, "rb") as src, open(temp, "wb") as out:
+            while True:
+                chunk = src.read(storage.CHUNK_SIZE)
+                if not chunk:
+                    break
+                out.write(chunk)
+                if throttle is not None:
+                    throttle.step(len(chunk))
+        shutil.copystat(source, temp)
+        os.replace(temp, target)
+    except BaseException:
+        storage.unlink_quietly(temp)
+        raise
+
+class UploadCopier:
+    """Copies an upload tree file by file, linking instead wherever it can"""
+
+    def __init__(self, dest: Path, previous: Path = None, throttle: Throttle = None):
+        self.dest = dest
+        self.previous = previous
+        self.throttle = throttle
+        self.inodes = {}  # (st_dev, st_ino) of a source file -> where it went under dest
+        self.files = self.copied = self.linked = 0
+
+    def sync(self, source: Path):
+        """Bring over every file in source that dest lacks. Uploads keep their
+        name for life, so a file already in dest is not looked at again."""
+        self.dest.mkdir(parents=True, exist_ok=True)
+        if not source.is_dir():
+            return
+        for relative in sorted(_files(source)):
+            target = self.dest / relative
+            if target.exists():
+                continue
+            try:
+                info = (source / relative).lstat()
+                if not stat.S_ISREG(info.st_mode):
+                    continue
+                self._place(source / relative, target, relative, info)
+            except FileNotFoundError:
+                continue  # deleted while we were walking
+            self.files += 1
+
+    def _link_source(self, relative: Path, info):
+        linked = self.inodes.get((info.st_dev, info.st_ino))
+        if linked is not None or self.previous is None:
+            return linked
+        earlier = self.previous / relative
+        try:
+            earlier_info = earlier.stat()
+        except FileNotFoundError:
+            return None
+        if earlier_info.st_size == info.st_size and earlier_info.st_mtime_ns == info.st_mtime_ns:
+            return earlier
+        return None
+
+    def _place(self, path: Path, target: Path, relative: Path, info):
+        target.parent.mkdir(parents=True, exist_ok=True)
+        linked = self._link_source(relative, info)
+        if linked is not None:
+            try:
+                os.link(linked, target)
+            except OSError:
+                pass  # e.g. another filesystem; copy instead
+            else:
+                self.linked += 1
+                self.inodes.setdefault((info.st_dev, info.st_ino), target)
+                if self.throttle is not None:
+                    self.throttle.step()
+                return
+        _copy_file(path, target, self.throttle)
+        self.copied += 1
+        self.inodes[(info.st_dev, info.st_ino)] = target
+
+    def summary(self) -> dict:
+        return {"files": self.files, "copied": self.copied, "linked": self.linked}
+
+def restore_uploads(source: Path, target: Path = storage.UPLOAD_DIR) -> dict:
+    """Make target hold exactly the snapshot's files: bring over what it
+    lacks and delete what the snapshot does not have"""
+    copier = UploadCopier(target)
+    copier.sync(source)
+    kept = set(_files(source))
+    removed = 0
+    for relative in list(_files(target)):
+        if relative not in kept:
+            storage.unlink_quietly(target / relative)
+            removed += 1
+    # Blob shards left empty; the top-level directories stay
+    for directory, _, _ in os.walk(target, topdown=False):
+        if Path(directory).parent != target and Path(directory) != target:
+            try:
+                os.rmdir(directory)
+            except OSError:
+                pass  # not empty
+    return {**copier.summary(), "removed": removed}
+
+# Snapshots
+def _snapshots(root: Path):
+    """Complete snapshot directories, oldest first"""
+    if not root.is_dir():
+        return []
+    return sorted(path for path in root.iterdir() if (path / MANIFEST).is_file())
+
+def read_manifest(snapshot: Path) -> dict:
+    return json.loads((snapshot / MANIFEST).read_text())
+
+def list_snapshots(root: Path = None) -> list:
+    """Manifests of the complete snapshots, newest first"""
+    return [read_manifest(path) for path in reversed(_snapshots(Path(root or BACKUP_DIR)))]
+
+def find_snapshot(name: str, root: Path = None) -> Path:
+    """A snapshot by name under root, or by path; raises LookupError"""
+    for path in (Path(root or BACKUP_DIR) / name, Path(name)):
+        if (path / MANIFEST).is_file():
+            return path
+    raise LookupError(f"No snapshot named {name!r}")
+
+def _new_name(root: Path) -> str:
+    stamp = datetime.utcnow().strftime("%Y%m%d-%H%M%S")
+    name, n = stamp, 1
+    while (root / name).exists() or (root / f"{name}{PARTIAL_SUFFIX}").exists():
+        name, n = f"{stamp}-{n}", n + 1
+    return name
+
+def prune(root: Path = None, keep: int = KEEP) -> int:
+    """Delete all but the newest keep snapshots. Files they share with newer
+    ones are hardlinks, so the newer snapshots stay whole."""
+    if keep <= 0:
+        return 0
+    expired = _snapshots(Path(root or BACKUP_DIR))[:-keep]
+    for path in expired:
+        shutil.rmtree(path)
+    return len(expired)
+
+def create_snapshot(engine=engine, root: Path = None, progress=None, budget: float = LATENCY_BUDGET_SECONDS) -> dict:
+    """Take a snapshot of the database and uploads; returns its manifest.
+    progress(done) is called now and then with the MiB copied so far."""
+    root = Path(root or BACKUP_DIR)
+    root.mkdir(parents=True, exist_ok=True)
+    snapshots = _snapshots(root)
+    previous = snapshots[-1] if snapshots else None
+    name = _new_name(root)
+    partial = root / f"{name}{PARTIAL_SUFFIX}"
+    partial.mkdir()
+    started = time.monotonic()
+    throttle = Throttle(budget, progress)
+    try:
+        uploads = UploadCopier(partial / UPLOADS_DIR, previous / UPLOADS_DIR if previous else None, throttle)
+        uploads.sync(storage.UPLOAD_DIR)
+        database = copy_database(engine, partial, throttle)
+        uploads.sync(storage.UPLOAD_DIR)
+        manifest = {
+            "name": name,
+            "created_at": datetime.utcnow().isoformat(),
+            "dialect": engine.dialect.name,
+            "seconds": round(time.monotonic() - started, 3),
+            "throttled_seconds": round(throttle.waited, 3),
+            "bytes_copied": throttle.bytes,
+            "previous": previous.name if previous else None,
+            "database": database,
+            "uploads": uploads.summary(),
+        }
+        (partial / MANIFEST).write_text(json.dumps(manifest, indent=2) + "\n")
+        os.replace(partial, root / name)
+    except BaseException:
+        shutil.rmtree(partial, ignore_errors=True)
+        raise
+    prune(root)
+    return manifest
+
+def restore_snapshot(snapshot: Path, engine=engine) -> dict:
+    """Replace the database and uploads with a snapshot's. Only while the
+    server is stopped: running processes would keep serving cached reads."""
+    manifest = read_manifest(snapshot)
+    database = manifest["database"]
+    if database["format"] == "sqlite":
+        if engine.dialect.name != "sqlite":
+            raise ValueError(f"Snapshot {manifest['name']} is a SQLite file; the database is {engine.dialect.name}")
+        source = sqlite3.connect(snapshot / database["file"])
+        raw = engine.raw_connection()
+        try:
+            source.backup(raw.driver_connection)
+        finally:
+            raw.close()
+            source.close()
+        engine.dispose()
+        rows = None
+    else:
+        migrations.upgrade(engine)  # the tables and triggers to load into
+        rows = load_tables(engine, snapshot / database["dir"])
+    migrations.upgrade(engine)  # the snapshot may predate later migrations
+    with engine.begin() as conn:
+        # The snapshot caught itself, or an earlier backup, in flight
+        conn.execute(
+            update(models.Job)
+            .where(models.Job.kind == "backup", models.Job.status.in_(("queued", "running")))
+            .values(status="cancelled", finished_at=datetime.utcnow())
+        )
+    return {"name": manifest["name"], "rows": rows, "uploads": restore_uploads(snapshot / UPLOADS_DIR)}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dir", help=f"where snapshots live (default {BACKUP_DIR}, TRACKSITE_BACKUP_DIR)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("create", help="take a snapshot while the server keeps running")
+    commands.add_parser("list", help="list snapshots, newest first")
+    restore = commands.add_parser("restore", help="replace the database and uploads with a snapshot; stop the server first")
+    restore.add_argument("snapshot", help="snapshot name, or path to a snapshot directory")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    if args.command == "create":
+        migrations.upgrade(engine)
+        manifest = create_snapshot(root=args.dir)
+        uploads = manifest["uploads"]
+        print(
+            f"Created {manifest['name']} in {manifest['seconds']:.1f}s: {manifest['bytes_copied'] >> 20} MiB copied, "
+            f"{uploads['copied']} upload(s) copied and {uploads['linked']} linked"
+        )
+    elif args.command == "list":
+        for manifest in list_snapshots(args.dir):
+            print(f"{manifest['name']}  {manifest['dialect']:<7} {manifest['uploads']['files']:>8} upload(s)")
+    else:
+        try:
+            snapshot = find_snapshot(args.snapshot, args.dir)
+        except LookupError as e:
+            parser.error(str(e))
+        result = restore_snapshot(snapshot)
+        uploads = result["uploads"]
+        print(
+            f"Restored {result['name']}: {uploads['copied']} upload(s) copied, {uploads['linked']} linked, "
+            f"{uploads['removed']} removed"
+        )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,7 @@
+"""Load-test and benchmark tooling for the Tracksite API.
+
+Run from tracksite-backend:
+
+    python -m benchmarks.run --scale small --output results.json
+    python -m benchmarks.compare baseline.json results.json
+"""
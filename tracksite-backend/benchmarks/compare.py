@@ -0,0 +1,59 @@
+# benchmarks/compare.py
+
+"""Compare two benchmark result files route by route.
+
+    python -m benchmarks.compare baseline.json candidate.json --threshold 10
+
+Exits non-zero when any route's p95 latency regressed by more than the
+threshold percentage, so it can gate CI.
+"""
+
+import argparse
+import json
+import sys
+
+METRICS = ("throughput_rps", "p50_ms", "p95_ms", "p99_ms", "queries_per_request")
+
+def _change(old, new):
+    if old in (None, 0) or new is None:
+        return None
+    return (new - old) / old * 100
+
+def compare(baseline: dict, candidate: dict, threshold: float):
+    """Print a table of changes and return the routes whose p95 regressed"""
+    regressions = []
+    print(f"{'route':<34}" + "".join(f"{metric:>22}" for metric in METRICS))
+    for name, new in candidate["results"].items():
+        old = baseline["results"].get(name)
+        if old is None:
+            print(f"{name:<34}  (new)")
+            continue
+        cells = []
+        for metric in METRICS:
+            change = _change(old.get(metric), new.get(metric))
+            value = new.get(metric)
+            cells.append(f"{'-' if value is None else value:>12}" + (f" ({change:+6.1f}%)" if change is not None else " " * 10))
+        print(f"{name:<34}" + "".join(cells))
+        change = _change(old.get("p95_ms"), new.get("p95_ms"))
+        if change is not None and change > threshold:
+            regressions.append(name)
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=10.0, help="allowed p95 regression in percent")
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+    regressions = compare(baseline, candidate, args.threshold)
+    if regressions:
+        print(f"\np95 regressed by more than {args.threshold}% on: {', '.join(regressions)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
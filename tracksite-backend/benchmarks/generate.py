@@ -0,0 +1,109 @@
+# benchmarks/generate.py
+
+"""Synthetic dataset generator.
+
+    python -m benchmarks.generate --folders 1000 --bookmarks 1000000
+
+Writes to TRACKSITE_DATABASE_URL using batched executemany inserts, one
+transaction per batch, so a million bookmarks take seconds rather than hours.
+"""
+
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, insert, select
+
+SCALES = {
+    "small": {"folders": 20, "bookmarks": 2_000},
+    "medium": {"folders": 200, "bookmarks": 100_000},
+    "large": {"folders": 1_000, "bookmarks": 1_000_000},
+}
+
+WORDS = (
+    "python rust react fastapi sqlite docs guide tutorial api design news blog "
+    "release notes video talk paper research cooking travel music photo recipe "
+    "finance budget health running garden kernel network cache index query"
+).split()
+
+HOSTS = (
+    "github.com", "stackoverflow.com", "developer.mozilla.org", "docs.python.org",
+    "news.ycombinator.com", "youtube.com", "wikipedia.org", "medium.com", "arxiv.org",
+)
+
+BATCH_SIZE = 10_000
+
+# Share of generated bookmarks that are not filed in any folder
+UNFILED_RATIO = 0.1
+
+def _bookmark_rows(rng: random.Random, folder_ids, count: int, start: datetime):
+    for n in range(count):
+        words = rng.sample(WORDS, rng.randint(2, 4))
+        host = rng.choice(HOSTS)
+        filed = folder_ids and rng.random() >= UNFILED_RATIO
+        yield {
+            "title": " ".join(words).title(),
+            "url": f"https://{host}/{'/'.join(words)}/{n}",
+            "folder_id": rng.choice(folder_ids) if filed else None,
+            "created_at": start + timedelta(seconds=n),
+        }
+
+def generate(engine, folders: int, bookmarks: int, seed: int = 0, batch_size: int = BATCH_SIZE):
+    """Append folders and bookmarks to the database behind engine.
+
+    Returns the number of (folders, bookmarks) now in the database.
+    """
+    import migrations, models
+
+    migrations.upgrade(engine)
+    rng = random.Random(seed)
+    start = datetime(2020, 1, 1)
+    with engine.begin() as conn:
+        existing = conn.scalar(select(func.count(models.Folder.id)))
+        if folders:
+            conn.execute(insert(models.Folder), [
+                {"name": f"Folder {existing + i:05d}", "created_at": start}
+                for i in range(folders)
+            ])
+        folder_ids = conn.scalars(select(models.Folder.id)).all()
+
+    rows = _bookmark_rows(rng, folder_ids, bookmarks, start)
+    remaining = bookmarks
+    while remaining > 0:
+        batch = [next(rows) for _ in range(min(batch_size, remaining))]
+        with engine.begin() as conn:
+            conn.execute(insert(models.Bookmark), batch)
+        remaining -= len(batch)
+
+    with engine.connect() as conn:
+        return (
+            conn.scalar(select(func.count(models.Folder.id))),
+            conn.scalar(select(func.count(models.Bookmark.id))),
+        )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", choices=SCALES, default="small")
+    parser.add_argument("--folders", type=int, help="override the scale's folder count")
+    parser.add_argument("--bookmarks", type=int, help="override the scale's bookmark count")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    from database import engine
+
+    scale = SCALES[args.scale]
+    folders = scale["folders"] if args.folders is None else args.folders
+    bookmarks = scale["bookmarks"] if args.bookmarks is None else args.bookmarks
+    started = time.perf_counter()
+    total_folders, total_bookmarks = generate(engine, folders, bookmarks, args.seed, args.batch_size)
+    elapsed = time.perf_counter() - started
+    print(
+        f"Inserted {folders} folders and {bookmarks} bookmarks in {elapsed:.1f}s "
+        f"({bookmarks / elapsed if elapsed else 0:,.0f} bookmarks/s); "
+        f"database now holds {total_folders} folders and {total_bookmarks} bookmarks"
+    )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,330 @@
+# benchmarks/run.py
+
+"""Drive every API route concurrently and report latency percentiles.
+
+    python -m benchmarks.run --scale medium --concurrency 16 --output results.json
+
+By default the app runs in-process behind httpx's ASGI transport in a scratch
+working directory with its own SQLite database, which also lets the runner
+count SQL statements per request. Pass --url to drive an already running
+server instead (query counts are then unavailable). Routes under /open/ are
+skipped because they launch programs on the host, and so are the ones that
+start link checks, backups or other jobs, which reach out to the network or
+copy the whole database.
+"""
+
+import argparse
+import asyncio
+import contextvars
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from contextlib import AsyncExitStack
+from datetime import datetime, timezone
+from pathlib import Path
+
+import httpx
+
+from benchmarks.generate import SCALES, WORDS, generate
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+# Name of the scenario a request belongs to, for attributing SQL statements
+current_scenario = contextvars.ContextVar("current_scenario", default=None)
+
+UPLOAD_BODY = os.urandom(256 * 1024)
+
+class Scenario:
+    """One benchmarked route: build(rng) returns (method, url, request kwargs)"""
+
+    def __init__(self, name, build, share: float = 1.0, expect=(200,)):
+        self.name = name
+        self.build = build
+        self.share = share
+        self.expect = expect
+
+def scenarios(state):
+    """Scenarios for every non-launching route in main.py"""
+    import crud
+
+    def bookmark_id(rng):
+        return rng.randint(state["min_bookmark_id"], state["max_bookmark_id"])
+
+    def folder_id(rng):
+        return rng.choice(state["folder_ids"])
+
+    deep_cursor = crud.encode_cursor(max(state["max_bookmark_id"] - 200, 0))
+    deep_skip = max(state["bookmark_count"] - 200, 0)
+
+    async def create_then_delete(client, rng):
+        created = await client.post("/bookmarks/", json={
+            "title": "bench", "url": f"https://bench.example/{rng.random()}", "folder_id": folder_id(rng),
+        })
+        return [created, await client.delete(f"/bookmarks/{created.json()['id']}")]
+
+    async def create_then_delete_folder(client, rng):
+        created = await client.post("/folders/", json={"name": f"bench {rng.random()}", "parent_id": folder_id(rng)})
+        filled = await client.post("/bookmarks/", json={
+            "title": "bench", "url": f"https://bench.example/{rng.random()}", "folder_id": created.json()["id"],
+        })
+        return [created, filled, await client.delete(f"/folders/{created.json()['id']}")]
+
+    def batch(rng):
+        ids = [bookmark_id(rng) for _ in range(20)]
+        return ("POST", "/bookmarks/batch", {"json": {"operations": [
+            {"op": "create", "title": "batch", "url": f"https://batch.example/{rng.random()}", "folder_id": folder_id(rng)},
+            {"op": "move", "ids": ids, "folder_id": folder_id(rng)},
+            {"op": "update", "id": ids[0], "title": "batch", "url": "https://batch.example/updated"},
+        ]}})
+
+    return [
+        Scenario("GET /", lambda rng: ("GET", "/", {})),
+        Scenario("GET /folders/", lambda rng: ("GET", "/folders/", {}), share=0.2),
+        Scenario("GET /folders/?view=summary", lambda rng: ("GET", "/folders/", {"params": {"view": "summary"}})),
+        Scenario("GET /folders/{id}", lambda rng: ("GET", f"/folders/{folder_id(rng)}", {}), share=0.5),
+        Scenario("GET /folders/{id}/bookmarks/", lambda rng: ("GET", f"/folders/{folder_id(rng)}/bookmarks/", {})),
+        Scenario("GET /bookmarks/", lambda rng: ("GET", "/bookmarks/", {})),
+        Scenario("GET /bookmarks/?cursor=deep", lambda rng: ("GET", "/bookmarks/", {"params": {"cursor": deep_cursor}})),
+        Scenario("GET /bookmarks/?skip=deep", lambda rng: ("GET", "/bookmarks/", {"params": {"skip": deep_skip}})),
+        Scenario("GET /bookmarks/{id}", lambda rng: ("GET", f"/bookmarks/{bookmark_id(rng)}", {}), expect=(200, 404)),
+        Scenario("GET /search", lambda rng: ("GET", "/search", {"params": {"q": rng.choice(WORDS)}})),
+        Scenario("GET /bookmarks/export", lambda rng: ("GET", "/bookmarks/export", {}), share=0.01),
+        Scenario("POST /folders/", lambda rng: ("POST", "/folders/", {"json": {"name": f"bench {rng.random()}"}}), share=0.2),
+        Scenario("POST+DELETE /bookmarks/", create_then_delete, share=0.5),
+        Scenario("PUT /bookmarks/{id}", lambda rng: ("PUT", f"/bookmarks/{bookmark_id(rng)}", {"json": {
+            "title": "updated", "url": "https://bench.example/updated", "folder_id": folder_id(rng),
+        }}), share=0.5, expect=(200, 404)),
+        Scenario("POST /bookmarks/import", lambda rng: ("POST", "/bookmarks/import", {"files": {
+            "file": ("bench.ndjson", b"".join(
+                json.dumps({"title": f"import {i}", "url": f"https://import.example/{i}"}).encode() + b"\n"
+                for i in range(100)
+            )),
+        }}), share=0.05),
+        Scenario("POST /upload/file/", lambda rng: ("POST", "/upload/file/", {
+            "files": {"file": ("bench.bin", UPLOAD_BODY)}, "data": {"title": "bench upload"},
+        }), share=0.1),
+        Scenario("GET /files/{name}", lambda rng: ("GET", f"/files/{state['upload_name']}", {}), share=0.5),
+        Scenario("GET /files/{name} (range)", lambda rng: ("GET", f"/files/{state['upload_name']}", {
+            "headers": {"Range": "bytes=1000-65535"},
+        }), share=0.5, expect=(206,)),
+        Scenario("POST /upload/application/", lambda rng: ("POST", "/upload/application/", {
+            "files": {"app_file": ("bench.app", UPLOAD_BODY)}, "data": {"title": "bench application"},
+        }), share=0.1),
+        Scenario("GET /applications/{name}", lambda rng: ("GET", f"/applications/{state['application_name']}", {}), share=0.5),
+        Scenario("GET /folders/{id}/tree", lambda rng: ("GET", f"/folders/{folder_id(rng)}/tree", {}), share=0.5),
+        Scenario("GET /folders/{id}/tree/bookmarks", lambda rng: ("GET", f"/folders/{folder_id(rng)}/tree/bookmarks", {}), share=0.5),
+        Scenario("POST+DELETE /folders/", create_then_delete_folder, share=0.2),
+        Scenario("POST /bookmarks/batch", batch, share=0.2),
+        Scenario("GET /bookmarks/duplicates", lambda rng: ("GET", "/bookmarks/duplicates", {})),
+        Scenario("GET /bookmarks/{id}/tags", lambda rng: ("GET", f"/bookmarks/{bookmark_id(rng)}/tags", {}), expect=(200, 404)),
+        Scenario("PUT /bookmarks/{id}/tags", lambda rng: ("PUT", f"/bookmarks/{bookmark_id(rng)}/tags", {"json": {
+            "tags": rng.sample(WORDS, 3),
+        }}), share=0.5, expect=(200, 404)),
+        Scenario("GET /tags/", lambda rng: ("GET", "/tags/", {})),
+        Scenario("GET /tags/?tags=", lambda rng: ("GET", "/tags/", {"params": {"tags": rng.choice(WORDS)}})),
+        Scenario("POST /bookmarks/{id}/visit", lambda rng: ("POST", f"/bookmarks/{bookmark_id(rng)}/visit", {}), expect=(204, 404)),
+        Scenario("GET /bookmarks/top", lambda rng: ("GET", "/bookmarks/top", {})),
+        Scenario("GET /bookmarks/recent", lambda rng: ("GET", "/bookmarks/recent", {})),
+        Scenario("GET /sync", lambda rng: ("GET", "/sync", {})),
+        Scenario("GET /sync?since=", lambda rng: ("GET", "/sync", {"params": {"since": state["sync_version"]}})),
+        Scenario("GET /jobs/", lambda rng: ("GET", "/jobs/", {})),
+        Scenario("GET /links/check", lambda rng: ("GET", "/links/check", {}), share=0.2),
+        Scenario("GET /links/dead", lambda rng: ("GET", "/links/dead", {})),
+        Scenario("GET /admin/backups", lambda rng: ("GET", "/admin/backups", {}), share=0.2),
+        Scenario("GET /processes", lambda rng: ("GET", "/processes", {}), share=0.2),
+        Scenario("GET /ready", lambda rng: ("GET", "/ready", {}), share=0.2),
+        Scenario("GET /metrics", lambda rng: ("GET", "/metrics", {}), share=0.2),
+    ]
+
+def percentile(sorted_values, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+async def run_scenario(client, scenario, requests: int, concurrency: int, seed: int, query_counts):
+    latencies = []
+    errors = 0
+    counter = iter(range(requests))
+
+    async def worker(worker_id):
+        nonlocal errors
+        rng = random.Random(f"{seed}-{scenario.name}-{worker_id}")
+        current_scenario.set(scenario.name)
+        for _ in counter:
+            started = time.perf_counter()
+            try:
+                if asyncio.iscoroutinefunction(scenario.build):
+                    responses = await scenario.build(client, rng)
+                else:
+                    method, url, kwargs = scenario.build(rng)
+                    responses = [await client.request(method, url, **kwargs)]
+                if any(r.status_code not in scenario.expect for r in responses):
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    result = {
+        "requests": requests,
+        "errors": errors,
+        "seconds": round(elapsed, 4),
+        "throughput_rps": round(requests / elapsed, 2) if elapsed else None,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "max_ms": round(latencies[-1] * 1000, 3) if latencies else 0.0,
+    }
+    if query_counts is not None:
+        result["queries_per_request"] = round(query_counts[scenario.name] / requests, 2)
+    return result
+
+def count_queries(query_counts):
+    """Attribute every SQL statement on the app's engines to the running scenario"""
+    from sqlalchemy import event
+    import database
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        name = current_scenario.get()
+        if name is not None:
+            query_counts[name] += 1
+
+    engines = {database.engine, database.read_engine, database.async_engine.sync_engine}
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", before_cursor_execute)
+
+async def prepare_state(client, seed: int):
+    """Look up ids the scenarios need, seed one upload of each kind to download,
+    and tag and visit some bookmarks so the tag and ranking routes have rows"""
+    folders = (await client.get("/folders/", params={"view": "summary", "limit": 1000})).json()
+    first = (await client.get("/bookmarks/", params={"limit": 1})).json()
+    upload = (await client.post("/upload/file/", files={"file": ("seed.bin", UPLOAD_BODY)}, data={"title": "seed"})).json()
+    application = (await client.post(
+        "/upload/application/", files={"app_file": ("seed.app", UPLOAD_BODY)}, data={"title": "seed"}
+    )).json()
+    rng = random.Random(seed)
+    for bookmark in (await client.get("/bookmarks/", params={"limit": 200})).json():
+        await client.put(f"/bookmarks/{bookmark['id']}/tags", json={"tags": rng.sample(WORDS, 3)})
+        await client.post(f"/bookmarks/{bookmark['id']}/visit")
+    sync_version = (await client.get("/sync")).json()["version"]
+    return {
+        "folder_ids": [f["id"] for f in folders] or [1],
+        "min_bookmark_id": first[0]["id"] if first else 1,
+        "max_bookmark_id": upload["bookmark"]["id"],
+        "bookmark_count": sum(f["bookmark_count"] for f in folders),
+        "upload_name": Path(upload["file_path"]).name,
+        "application_name": Path(application["app_path"]).name,
+        "sync_version": sync_version,
+    }
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+async def benchmark(args):
+    sys.path.insert(0, str(BACKEND_DIR))
+    query_counts = None
+    lifespan = None
+    if args.url:
+        transport, base_url = None, args.url
+    else:
+        # database.py reads its URL at import time, so configure and import here
+        os.chdir(args.workdir)
+        os.environ.setdefault("TRACKSITE_DATABASE_URL", "sqlite:///./bench.db")
+        import database
+        scale = SCALES[args.scale]
+        folders = scale["folders"] if args.folders is None else args.folders
+        bookmarks = scale["bookmarks"] if args.bookmarks is None else args.bookmarks
+        started = time.perf_counter()
+        generate(database.engine, folders, bookmarks, seed=args.seed)
+        print(f"Generated {folders} folders / {bookmarks} bookmarks in {time.perf_counter() - started:.1f}s")
+
+        import main
+        if args.no_cache:
+            from cache import read_cache
+            read_cache.maxsize = 0
+        query_counts = defaultdict(int)
+        count_queries(query_counts)
+        transport, base_url = httpx.ASGITransport(app=main.app), "http://bench"
+        # ASGITransport does not send lifespan events; run startup and shutdown here
+        lifespan = main.app.router.lifespan_context(main.app)
+
+    results = {}
+    async with AsyncExitStack() as stack:
+        if lifespan is not None:
+            await stack.enter_async_context(lifespan)
+        client = await stack.enter_async_context(
+            httpx.AsyncClient(transport=transport, base_url=base_url, timeout=None)
+        )
+        state = await prepare_state(client, args.seed)
+        for scenario in scenarios(state):
+            if args.only and args.only not in scenario.name:
+                continue
+            requests = max(1, int(args.requests * scenario.share))
+            results[scenario.name] = await run_scenario(
+                client, scenario, requests, args.concurrency, args.seed, query_counts
+            )
+            row = results[scenario.name]
+            print(
+                f"{scenario.name:<34} {row['throughput_rps'] or 0:>9.1f} req/s  "
+                f"p50 {row['p50_ms']:>8.2f}  p95 {row['p95_ms']:>8.2f}  p99 {row['p99_ms']:>8.2f} ms"
+                + (f"  {row['queries_per_request']:>6.2f} q/req" if "queries_per_request" in row else "")
+                + (f"  {row['errors']} errors" if row["errors"] else "")
+            )
+
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "target": args.url or "in-process",
+            "scale": args.scale,
+            "folders": args.folders,
+            "bookmarks": args.bookmarks,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "cache": not args.no_cache,
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="benchmark a running server instead of the in-process app")
+    parser.add_argument("--scale", choices=SCALES, default="small")
+    parser.add_argument("--folders", type=int, help="override the scale's folder count")
+    parser.add_argument("--bookmarks", type=int, help="override the scale's bookmark count")
+    parser.add_argument("--requests", type=int, default=500, help="requests per route, before its share")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--only", help="only run routes whose name contains this text")
+    parser.add_argument("--no-cache", action="store_true", help="disable the in-process read cache")
+    parser.add_argument("--workdir", help="scratch directory for the database and uploads")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    args = parser.parse_args()
+
+    output = Path(args.output).resolve() if args.output else None
+    if not args.url and not args.workdir:
+        args.workdir = tempfile.mkdtemp(prefix="tracksite-bench-")
+    report = asyncio.run(benchmark(args))
+    if output:
+        output.write_text(json.dumps(report, indent=2) + "\n")
+        print(f"Wrote {output}")
+
+if __name__ == "__main__":
+    main()
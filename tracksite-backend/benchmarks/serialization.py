@@ -0,0 +1,113 @@
+# benchmarks/serialization.py
+
+"""Rows/sec for the list endpoints' read-and-encode step, old path vs fast path.
+
+    python -m benchmarks.serialization --bookmarks 100000 --output serialization.json
+
+"orm" is how /bookmarks/ and /folders/ used to build a response: ORM objects
+validated into pydantic models and dumped. "columns" is the current path in
+crud.py: the needed columns as tuples, encoded directly. "sparse" adds
+?fields=. The read cache is bypassed; every page is read from the database.
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import List
+
+from benchmarks.generate import generate
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+PAGE_SIZE = 1000
+
+def orm_reader(fetch, schema):
+    from pydantic import TypeAdapter
+    adapter = TypeAdapter(schema)
+
+    def read(db, **kwargs):
+        rows, next_cursor = fetch(db, **kwargs)
+        return adapter.dump_json(adapter.validate_python(rows, from_attributes=True)), next_cursor
+
+    return read
+
+def read_all(db, read, **kwargs):
+    """Page through everything with cursors, returning the response bodies"""
+    bodies = []
+    cursor = None
+    while True:
+        body, cursor = read(db, limit=PAGE_SIZE, cursor=cursor, **kwargs)
+        bodies.append(body)
+        if cursor is None:
+            return bodies
+
+def count_rows(bodies) -> int:
+    """Objects serialized: top-level rows plus bookmarks nested in folders"""
+    rows = 0
+    for body in bodies:
+        for item in json.loads(body):
+            rows += 1 + len(item.get("bookmarks", ()))
+    return rows
+
+def measure(db, read, repeat: int, **kwargs):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        bodies = read_all(db, read, **kwargs)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    rows = count_rows(bodies)
+    return {
+        "rows": rows,
+        "bytes": sum(len(body) for body in bodies),
+        "seconds": round(best, 4),
+        "rows_per_sec": round(rows / best),
+    }
+
+def cases():
+    import crud, schemas
+    return [
+        ("/bookmarks/", "orm", orm_reader(crud.get_bookmarks, List[schemas.Bookmark]), {}),
+        ("/bookmarks/", "columns", crud.get_bookmarks_rows, {}),
+        ("/bookmarks/", "sparse id,title,url", crud.get_bookmarks_rows, {"fields": "id,title,url"}),
+        ("/folders/", "orm", orm_reader(crud.get_folders, List[schemas.Folder]), {}),
+        ("/folders/", "columns", crud.get_folders_rows, {}),
+        ("/folders/", "sparse id,name", crud.get_folders_rows, {"fields": "id,name"}),
+        ("/folders/?view=summary", "orm", orm_reader(crud.get_folder_summaries, List[schemas.FolderSummary]), {}),
+        ("/folders/?view=summary", "columns", crud.get_folder_summaries_rows, {}),
+    ]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--folders", type=int, default=200)
+    parser.add_argument("--bookmarks", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=3, help="runs per case; the best is reported")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    args = parser.parse_args()
+
+    output = Path(args.output).resolve() if args.output else None
+    sys.path.insert(0, str(BACKEND_DIR))
+    os.chdir(tempfile.mkdtemp(prefix="tracksite-serialization-"))
+    os.environ.setdefault("TRACKSITE_DATABASE_URL", "sqlite:///./bench.db")
+    import database
+    generate(database.engine, args.folders, args.bookmarks)
+
+    results = []
+    db = database.SessionLocal()
+    try:
+        for route, path, read, kwargs in cases():
+            row = {"route": route, "path": path, **measure(db, read, args.repeat, **kwargs)}
+            results.append(row)
+            print(f"{route:<24} {path:<22} {row['rows_per_sec']:>12,} rows/s  {row['seconds']:>8.3f}s  {row['bytes']:>12,} bytes")
+    finally:
+        db.close()
+    if output:
+        output.write_text(json.dumps({"folders": args.folders, "bookmarks": args.bookmarks, "results": results}, indent=2) + "\n")
+        print(f"Wrote {output}")
+
+if __name__ == "__main__":
+    main()
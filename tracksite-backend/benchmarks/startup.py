@@ -0,0 +1,106 @@
+# benchmarks/startup.py
+
+"""Cold-start time: how long until a fresh server process answers /ready.
+
+    python -m benchmarks.startup --repeat 5 --output startup.json
+
+"import" is `import main` in a new interpreter. "fresh database" starts
+uvicorn against an empty SQLite file, so every migration runs; "migrated
+database" starts it again against the result, where the schema fingerprint
+matches and startup skips them. Each case runs in its own process and the
+best of --repeat runs is reported.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+READY_TIMEOUT_SECONDS = 60
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def environment(workdir: Path) -> dict:
+    env = dict(os.environ)
+    env["TRACKSITE_DATABASE_URL"] = f"sqlite:///{workdir / 'bench.db'}"
+    env["TRACKSITE_JOB_WORKERS"] = "0"
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(BACKEND_DIR), env.get("PYTHONPATH")]))
+    return env
+
+def time_import(workdir: Path) -> float:
+    started = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "import main"], cwd=workdir, env=environment(workdir), check=True)
+    return time.perf_counter() - started
+
+def time_ready(workdir: Path) -> float:
+    """Seconds from spawning uvicorn until /ready returns 200"""
+    port = free_port()
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=workdir, env=environment(workdir),
+    )
+    try:
+        with httpx.Client(timeout=1.0) as client:
+            while time.perf_counter() - started < READY_TIMEOUT_SECONDS:
+                if server.poll() is not None:
+                    raise RuntimeError(f"Server exited with status {server.returncode}")
+                try:
+                    if client.get(f"http://127.0.0.1:{port}/ready").status_code == 200:
+                        return time.perf_counter() - started
+                except httpx.TransportError:
+                    pass
+                time.sleep(0.01)
+        raise RuntimeError(f"Server was not ready after {READY_TIMEOUT_SECONDS}s")
+    finally:
+        server.terminate()
+        server.wait()
+
+def measure(run, repeat: int, fresh: bool):
+    best = None
+    for _ in range(repeat):
+        workdir = Path(tempfile.mkdtemp(prefix="tracksite-startup-"))
+        try:
+            if not fresh:
+                time_ready(workdir)  # migrate once, untimed
+            elapsed = run(workdir)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+        best = elapsed if best is None else min(best, elapsed)
+    return round(best, 4)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="runs per case; the best is reported")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    args = parser.parse_args()
+
+    cases = [
+        ("import", time_import, True),
+        ("fresh database", time_ready, True),
+        ("migrated database", time_ready, False),
+    ]
+    results = []
+    for name, run, fresh in cases:
+        row = {"case": name, "seconds": measure(run, args.repeat, fresh)}
+        results.append(row)
+        print(f"{name:<20} {row['seconds']:>8.3f}s")
+    if args.output:
+        Path(args.output).write_text(json.dumps({"repeat": args.repeat, "results": results}, indent=2) + "\n")
+        print(f"Wrote {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+# bulk.py
+
+import codecs
+import json
+from datetime import datetime, timezone
+from html import escape
+from html.parser import HTMLParser
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+import models, crud
+
+BATCH_SIZE = 1000
+CHUNK_SIZE = 64 * 1024
+MAX_REPORTED_ERRORS = 100
+
+# Parsers yield plain dicts: {"title", "url", "folder", "created_at"},
+# plus "line" so errors can point back into the source file. "folder" is a
+# folder name, or a list of names from the outermost folder inwards.
+
+def iter_ndjson(fileobj):
+    """Yield one record per non-blank line of an NDJSON byte stream"""
+    for lineno, raw in enumerate(fileobj, 1):
+        line = raw.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+            if not isinstance(record, dict):
+                raise ValueError("expected a JSON object")
+        except ValueError as e:
+            yield {"line": lineno, "error": f"Invalid JSON: {e}"}
+            continue
+        record["line"] = lineno
+        yield record
+
+class NetscapeBookmarkParser(HTMLParser):
+    """Incremental parser for the Netscape bookmark file format browsers export.
+
+    Each record's folder is the tuple of folder names enclosing it, outermost first.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.records = []
+        self.folder_stack = []
+        self.pending_folder = None
+        self.text = None
+        self.anchor = None
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == "h3":
+            self.text = []
+        elif tag == "dl":
+            current = self.folder_stack[-1] if self.folder_stack else ()
+            self.folder_stack.append(current + (self.pending_folder,) if self.pending_folder else current)
+            self.pending_folder = None
+        elif tag == "a":
+            self.anchor = attrs
+            self.text = []
+
+    def handle_endtag(self, tag):
+        if tag == "h3" and self.text is not None:
+            self.pending_folder = "".join(self.text).strip() or None
+            self.text = None
+        elif tag == "dl" and self.folder_stack:
+            self.folder_stack.pop()
+        elif tag == "a" and self.anchor is not None:
+            self.records.append({
+                "title": "".join(self.text).strip(),
+                "url": self.anchor.get("href"),
+                "folder": self.folder_stack[-1] if self.folder_stack else (),
+                "created_at": self.anchor.get("add_date"),
+                "line": self.getpos()[0],
+            })
+            self.anchor = None
+            self.text = None
+
+    def handle_data(self, data):
+        if self.text is not None:
+            self.text.append(data)
+
+def iter_netscape_html(fileobj):
+    """Yield records from a bookmarks.html byte stream, one chunk at a time"""
+    parser = NetscapeBookmarkParser()
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    while True:
+        chunk = fileobj.read(CHUNK_SIZE)
+        parser.feed(decoder.decode(chunk, final=not chunk))
+        yield from parser.records
+        parser.records.clear()
+        if not chunk:
+            break
+    parser.close()
+    yield from parser.records
+
+def _parse_created_at(value):
+    if value in (None, ""):
+        return None
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, (int, float)) or str(value).isdigit():
+        return datetime.utcfromtimestamp(int(value))
+    return datetime.fromisoformat(str(value))
+
+def _resolve_folder(db: Session, names: tuple, folder_ids: dict, stats: dict):
+    """Id of the folder at names, outermost first, looking up or creating each
+    level inside the one before. folder_ids caches (id, children's path) by
+    names prefix. Raises ValueError when the folders nest too deeply."""
+    parent_id, path = None, "/"
+    for depth in range(1, len(names) + 1):
+        key = names[:depth]
+        if key not in folder_ids:
+            folder = crud.get_folder_by_name(db, key[-1], parent_id)
+            if folder:
+                folder_ids[key] = (folder.id, crud.child_path(folder))
+            else:
+                if len(path) > crud.MAX_PATH_LENGTH:
+                    raise ValueError("Folders are nested too deeply")
+                result = db.execute(insert(models.Folder).values(name=key[-1], parent_id=parent_id, path=path))
+                folder_id = result.inserted_primary_key[0]
+                folder_ids[key] = (folder_id, f"{path}{folder_id}/")
+                stats["folders_created"] += 1
+        parent_id, path = folder_ids[key]
+    return parent_id
+
+def _record_error(stats: dict, line, message: str):
+    stats["failed"] += 1
+    if len(stats["errors"]) < MAX_REPORTED_ERRORS:
+        stats["errors"].append({"line": line, "error": message})
+
+def import_bookmarks(db: Session, records, batch_size: int = BATCH_SIZE):
+    """Insert records in batched executemany transactions.
+
+    Folders named by records are looked up or created on the fly, level by
+    level for nested ones. Returns a report with counts and the first
+    MAX_REPORTED_ERRORS errors.
+    """
+    stats = {"created": 0, "folders_created": 0, "failed": 0, "errors": []}
+    folder_ids = {}
+    batch = []  # (line, row)
+
+    def flush():
+        if not batch:
+            return
+        # SQLite would store an unknown folder_id as is; MySQL would fail the
+        # whole batch. Report those records and insert the rest.
+        requested = list({row["folder_id"] for _, row in batch if row["folder_id"] is not None})
+        known = set()
+        for start in range(0, len(requested), crud.LOOKUP_CHUNK_SIZE):
+            chunk = requested[start:start + crud.LOOKUP_CHUNK_SIZE]
+            known.update(db.scalars(select(models.Folder.id).where(models.Folder.id.in_(chunk))))
+        rows = []
+        for line, row in batch:
+            if row["folder_id"] is None or row["folder_id"] in known:
+                rows.append(row)
+            else:
+                _record_error(stats, line, f"Folder {row['folder_id']} not found")
+        if rows:
+            db.execute(insert(models.Bookmark), rows)
+        db.commit()
+        stats["created"] += len(rows)
+        batch.clear()
+
+    for record in records:
+        line = record.get("line")
+        if "error" in record:
+            _record_error(stats, line, record["error"])
+            continue
+        url = record.get("url")
+        if not isinstance(url, str) or not url:
+            _record_error(stats, line, "Missing url")
+            continue
+        title = record.get("title") or url
+        try:
+            folder_id = record.get("folder_id")
+            if folder_id is not None and (not isinstance(folder_id, int) or isinstance(folder_id, bool)):
+                raise ValueError("folder_id must be an integer")
+            row = {"title": str(title), "url": url, "folder_id": folder_id}
+            folder = record.get("folder")
+            if folder:
+                names = tuple(str(name) for name in folder) if isinstance(folder, (list, tuple)) else (str(folder),)
+                row["folder_id"] = _resolve_folder(db, names, folder_ids, stats)
+            created_at = _parse_created_at(record.get("created_at"))
+            row["created_at"] = created_at or datetime.utcnow()
+        except (TypeError, ValueError, OverflowError) as e:
+            _record_error(stats, line, str(e))
+            continue
+        batch.append((line, row))
+        if len(batch) >= batch_size:
+            flush()
+    flush()
+    return stats
+
+# Export
+
+def _iter_all(fetch, *args, **kwargs):
+    cursor = None
+    while True:
+        rows, cursor = fetch(*args, limit=crud.MAX_PAGE_SIZE, cursor=cursor, **kwargs)
+        yield from rows
+        if cursor is None:
+            break
+
+def _folder_tree(db: Session):
+    """(folders by id, child ids by parent id) for every folder, children in id order"""
+    folders = {}
+    children = {}
+    for folder in _iter_all(crud.get_folder_summaries, db):
+        folders[folder.id] = folder
+        children.setdefault(folder.parent_id, []).append(folder.id)
+    return folders, children
+
+def _folder_names(folders: dict, folder_id: int) -> list:
+    """Names from the root folder down to folder_id, read off its materialized path"""
+    ids = [int(part) for part in folders[folder_id].path.strip("/").split("/") if part]
+    return [folders[ancestor].name for ancestor in ids + [folder_id]]
+
+def export_ndjson(db: Session):
+    """Yield every bookmark as an NDJSON line, one page in memory at a time.
+    "folder" is the list of folder names from the root down, as import reads it."""
+    folders, _ = _folder_tree(db)
+    paths = {}
+    for bookmark in _iter_all(crud.get_bookmarks, db):
+        folder = None
+        if bookmark.folder_id in folders:
+            if bookmark.folder_id not in paths:
+                paths[bookmark.folder_id] = _folder_names(folders, bookmark.folder_id)
+            folder = paths[bookmark.folder_id]
+        yield json.dumps({
+            "title": bookmark.title,
+            "url": bookmark.url,
+            "folder": folder,
+            "created_at": bookmark.created_at.isoformat() if bookmark.created_at else None,
+        }) + "\n"
+        db.expunge(bookmark)
+
+def _netscape_anchor(bookmark, indent: str) -> str:
+    add_date = 0
+    if bookmark.created_at:
+        add_date = int(bookmark.created_at.replace(tzinfo=timezone.utc).timestamp())
+    return (
+        f'{indent}<DT><A HREF="{escape(bookmark.url or "")}" ADD_DATE="{add_date}">'
+        f'{escape(bookmark.title or "")}</A>\n'
+    )
+
+def _netscape_folder(db: Session, folders: dict, children: dict, folder_id: int, depth: int):
+    indent = "    " * depth
+    yield f"{indent}<DT><H3>{escape(folders[folder_id].name)}</H3>\n{indent}<DL><p>\n"
+    for child_id in children.get(folder_id, ()):
+        yield from _netscape_folder(db, folders, children, child_id, depth + 1)
+    for bookmark in _iter_all(crud.get_bookmarks_by_folder, db, folder_id=folder_id):
+        yield _netscape_anchor(bookmark, indent + "    ")
+        db.expunge(bookmark)
+    yield f"{indent}</DL><p>\n"
+
+def export_netscape_html(db: Session):
+    """Yield a bookmarks.html document folder by folder, subfolders nested in
+    their parents"""
+    yield (
+        "<!DOCTYPE NETSCAPE-Bookmark-file-1>\n"
+        '<META HTTP-EQUIV="Content-Type" CONTENT="text/html; charset=UTF-8">\n'
+        "<TITLE>Bookmarks</TITLE>\n<H1>Bookmarks</H1>\n<DL><p>\n"
+    )
+    folders, children = _folder_tree(db)
+    for folder_id in children.get(None, ()):
+        yield from _netscape_folder(db, folders, children, folder_id, 1)
+    for bookmark in _iter_all(crud.get_bookmarks_by_folder, db, folder_id=None):
+        yield _netscape_anchor(bookmark, "    ")
+        db.expunge(bookmark)
+    yield "</DL><p>\n"
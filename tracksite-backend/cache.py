@@ -0,0 +1,106 @@
+# cache.py
+
+import functools
+import os
+import threading
+from collections import OrderedDict
+
+from pydantic import TypeAdapter
+from sqlalchemy import func, select
+import models
+
+# Upper bound on the serialized response bytes the cache holds, per process
+READ_CACHE_BYTES = int(os.getenv("TRACKSITE_READ_CACHE_BYTES", str(64 * 1024 * 1024)))
+
+def entry_size(value) -> int:
+    """Approximate memory held by a cached (json_bytes, next_cursor) value"""
+    body, next_cursor = value
+    return len(body) + len(next_cursor or "")
+
+class ReadCache:
+    """LRU cache of serialized read results, keyed by the database's generation.
+
+    The generation is the newest version in the change log (see sync.py), which
+    triggers advance on every write to folders, bookmarks and their tags,
+    whichever process or connection makes it. Every worker reads it from the
+    database it serves from, so a write in one worker retires the entries and
+    ETags of all of them, and workers agree on ETags.
+
+    Bounded both by entry count and by the approximate size of the serialized
+    values; a value larger than maxbytes on its own is not cached at all.
+    """
+
+    def __init__(self, maxsize: int = 512, maxbytes: int = READ_CACHE_BYTES):
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+        self.size = 0
+        self._entries = OrderedDict()  # key -> (generation, value, size)
+        self._lock = threading.Lock()
+
+    def generation(self, db) -> int:
+        """Current generation of db's database: one primary-key lookup. Falls
+        back to how far the log was pruned while it is empty."""
+        pruned_through = select(models.SyncState.pruned_through).where(models.SyncState.id == 1).scalar_subquery()
+        return db.scalar(select(func.coalesce(func.max(models.Change.version), pruned_through, 0)))
+
+    def etag(self, db) -> str:
+        """Validator for any cached read: changes on every write"""
+        return f'"g{self.generation(db)}"'
+
+    def get(self, key, generation: int):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            entry_generation, value, size = entry
+            if entry_generation != generation:
+                del self._entries[key]
+                self.size -= size
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, generation: int):
+        size = entry_size(value)
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= previous[2]
+            if size > self.maxbytes:
+                return
+            self._entries[key] = (generation, value, size)
+            self.size += size
+            while len(self._entries) > self.maxsize or self.size > self.maxbytes:
+                _, (_, _, evicted) = self._entries.popitem(last=False)
+                self.size -= evicted
+
+    def cached(self, fn, schema=None, paged: bool = True):
+        """Wrap a crud read so it returns (json_bytes, next_cursor), cached by arguments.
+
+        Without a schema, fn already returns (json_bytes, next_cursor) itself.
+        The database session is not part of the key; everything else is.
+        """
+        adapter = TypeAdapter(schema) if schema is not None else None
+
+        @functools.wraps(fn)
+        def wrapper(db, *args, **kwargs):
+            key = (fn.__name__, args, tuple(sorted(kwargs.items())))
+            # Read before the data: a write landing in between leaves a newer
+            # result filed under the older generation, never the reverse
+            generation = self.generation(db)
+            value = self.get(key, generation)
+            if value is not None:
+                return value
+            result = fn(db, *args, **kwargs)
+            if adapter is None:
+                value = result
+            else:
+                rows, next_cursor = result if paged else (result, None)
+                body = adapter.dump_json(adapter.validate_python(rows, from_attributes=True))
+                value = (body, next_cursor)
+            self.set(key, value, generation)
+            return value
+
+        return wrapper
+
+read_cache = ReadCache()
@@ -0,0 +1,326 @@
+# crawler.py
+
+"""Link-health and metadata crawler.
+
+    python crawler.py [--folder-id N] [--stale-hours H]
+
+Checks bookmark URLs with asyncio: a fixed pool of workers over one pooled
+keep-alive client, a per-host limit so no single site is hammered, HEAD with
+GET fallback, conditional requests from the stored ETag/Last-Modified and
+exponential backoff on transient failures. Results land in link_status in
+batched writes; that table is not in the change log, so they do not
+invalidate the read cache.
+"""
+
+import argparse
+import asyncio
+import html
+import logging
+import os
+import random
+import re
+from collections import defaultdict, deque
+from datetime import datetime, timedelta
+from urllib.parse import urlsplit
+
+import httpx
+from sqlalchemy import delete, insert, or_, select
+from sqlalchemy.orm import Session
+
+import crud, models
+
+CONCURRENCY = int(os.getenv("TRACKSITE_CRAWL_CONCURRENCY", "64"))
+PER_HOST = int(os.getenv("TRACKSITE_CRAWL_PER_HOST", "4"))
+TIMEOUT = float(os.getenv("TRACKSITE_CRAWL_TIMEOUT", "10"))
+RETRIES = int(os.getenv("TRACKSITE_CRAWL_RETRIES", "2"))
+
+BACKOFF_SECONDS = 0.5  # before the first retry, doubled for each one after
+MAX_BACKOFF_SECONDS = 30.0
+MAX_REDIRECTS = 10
+WRITE_BATCH_SIZE = 500
+TITLE_BYTES = 64 * 1024
+USER_AGENT = "Tracksite-LinkChecker/1.0"
+
+# Worth another try after a backoff
+RETRY_STATUSES = {429, 502, 503, 504}
+# Servers that reject or mishandle HEAD; these are retried with GET
+HEAD_REJECTED = {400, 403, 405, 501}
+# Error statuses that still mean the page exists
+ALIVE_STATUSES = {401, 403, 429}
+
+TITLE_RE = re.compile(rb"<title[^>]*>(.*?)</title", re.IGNORECASE | re.DOTALL)
+
+logger = logging.getLogger("tracksite.crawler")
+
+class CrawlProgress:
+    """Counters for the current or last crawl in this process"""
+
+    def __init__(self):
+        self.running = False
+        self.started_at = None
+        self.finished_at = None
+        self.total = 0
+        self.checked = 0
+        self.unchanged = 0
+        self.dead = 0
+        self.error = None  # why the crawl stopped early, if it did
+
+    def start(self):
+        self.__init__()
+        self.running = True
+        self.started_at = datetime.utcnow()
+
+progress = CrawlProgress()
+_task = None
+
+def is_dead(status_code, error) -> bool:
+    if status_code is None:
+        return error is not None
+    return status_code >= 400 and status_code not in ALIVE_STATUSES
+
+def extract_title(body: bytes, encoding: str = None):
+    match = TITLE_RE.search(body)
+    if not match:
+        return None
+    title = match.group(1).decode(encoding or "utf-8", errors="replace")
+    title = " ".join(html.unescape(title).split())
+    return title[:255] or None
+
+def interleave_by_host(targets):
+    """Round-robin targets across hosts, so workers rarely queue behind one busy host"""
+    by_host = defaultdict(deque)
+    for target in targets:
+        by_host[urlsplit(target["url"]).hostname].append(target)
+    queues = deque(by_host.values())
+    while queues:
+        queue = queues.popleft()
+        yield queue.popleft()
+        if queue:
+            queues.append(queue)
+
+async def load_targets(engine, folder_id: int = None, stale_hours: float = None):
+    """Bookmarks to check, with the validators and title from their last check"""
+    stmt = (
+        select(
+            models.Bookmark.id, models.Bookmark.url,
+            models.LinkStatus.etag, models.LinkStatus.last_modified, models.LinkStatus.fetched_title,
+        )
+        .outerjoin(models.LinkStatus, models.LinkStatus.bookmark_id == models.Bookmark.id)
+        .where(or_(models.Bookmark.url.like("http://%"), models.Bookmark.url.like("https://%")))
+    )
+    if folder_id is not None:
+        stmt = stmt.where(models.Bookmark.folder_id == folder_id)
+    if stale_hours is not None:
+        stale_before = datetime.utcnow() - timedelta(hours=stale_hours)
+        stmt = stmt.where(or_(
+            models.LinkStatus.last_checked.is_(None), models.LinkStatus.last_checked < stale_before
+        ))
+    async with engine.connect() as conn:
+        return [dict(row._mapping) for row in await conn.execute(stmt)]
+
+async def write_results(engine, results):
+    """Replace the link_status rows for a batch of results in one transaction"""
+    async with engine.begin() as conn:
+        ids = [result["bookmark_id"] for result in results]
+        await conn.execute(delete(models.LinkStatus).where(models.LinkStatus.bookmark_id.in_(ids)))
+        await conn.execute(insert(models.LinkStatus), results)
+
+async def remove_orphans(engine):
+    """Drop results for bookmarks deleted since they were checked"""
+    async with engine.begin() as conn:
+        await conn.execute(delete(models.LinkStatus).where(
+            models.LinkStatus.bookmark_id.not_in(select(models.Bookmark.id))
+        ))
+
+def _retry_after(response) -> float:
+    try:
+        return float(response.headers.get("retry-after", ""))
+    except ValueError:
+        return 0.0
+
+async def _send(client, method: str, url: str, headers: dict):
+    """One request; for GET, read just enough of an HTML body to find the title"""
+    async with client.stream(method, url, headers=headers) as response:
+        body = b""
+        if method == "GET" and "html" in response.headers.get("content-type", ""):
+            async for chunk in response.aiter_bytes():
+                body += chunk
+                if len(body) >= TITLE_BYTES or b"</title" in body.lower():
+                    break
+        return response, body
+
+async def send_with_retries(client, method: str, url: str, headers: dict):
+    """Send a request, backing off exponentially (with jitter) on transient failures"""
+    delay = BACKOFF_SECONDS
+    for attempt in range(RETRIES + 1):
+        try:
+            response, body = await _send(client, method, url, headers)
+            if response.status_code not in RETRY_STATUSES or attempt == RETRIES:
+                return response, body
+            wait = max(delay, _retry_after(response))
+        except (httpx.TimeoutException, httpx.NetworkError):
+            if attempt == RETRIES:
+                raise
+            wait = delay
+        await asyncio.sleep(min(wait, MAX_BACKOFF_SECONDS) * random.uniform(0.5, 1.5))
+        delay *= 2
+
+async def check_link(client, target: dict, host_limits) -> dict:
+    """Check one bookmark URL and return its link_status row"""
+    url = target["url"]
+    headers = {}
+    if target["etag"]:
+        headers["If-None-Match"] = target["etag"]
+    if target["last_modified"]:
+        headers["If-Modified-Since"] = target["last_modified"]
+
+    result = {
+        "bookmark_id": target["id"],
+        "status_code": None,
+        "final_url": None,
+        "fetched_title": target["fetched_title"],
+        "etag": target["etag"],
+        "last_modified": target["last_modified"],
+        "error": None,
+    }
+    # HEAD is enough once we know the title; until then GET, reading only the head of HTML pages
+    method = "HEAD" if target["fetched_title"] else "GET"
+    try:
+        async with host_limits[urlsplit(url).hostname]:
+            response, body = await send_with_retries(client, method, url, headers)
+            if method == "HEAD" and response.status_code in HEAD_REJECTED:
+                response, body = await send_with_retries(client, "GET", url, headers)
+    except (httpx.HTTPError, httpx.InvalidURL) as e:
+        result["error"] = (f"{type(e).__name__}: {e}" if str(e) else type(e).__name__)[:255]
+    else:
+        result["status_code"] = response.status_code
+        result["final_url"] = str(response.url)[:2048]
+        if response.status_code != 304:
+            result["etag"] = response.headers.get("etag")
+            result["last_modified"] = response.headers.get("last-modified")
+            if body:
+                result["fetched_title"] = extract_title(body, response.charset_encoding) or result["fetched_title"]
+    result["dead"] = is_dead(result["status_code"], result["error"])
+    result["last_checked"] = datetime.utcnow()
+    return result
+
+def make_client(**kwargs):
+    return httpx.AsyncClient(
+        timeout=TIMEOUT,
+        follow_redirects=True,
+        max_redirects=MAX_REDIRECTS,
+        headers={"User-Agent": USER_AGENT},
+        limits=httpx.Limits(max_connections=CONCURRENCY, max_keepalive_connections=CONCURRENCY),
+        **kwargs,
+    )
+
+async def crawl(folder_id: int = None, stale_hours: float = None, client=None, engine=None):
+    """Check every http(s) bookmark, or those in folder_id / not checked for stale_hours.
+
+    Pass client to crawl through a custom transport, e.g. against a stub server.
+    """
+    progress.start()
+    return await _crawl(folder_id, stale_hours, client, engine)
+
+async def _crawl(folder_id, stale_hours, client, engine):
+    if engine is None:
+        from database import async_engine as engine
+
+    own_client = client is None
+    client = client or make_client()
+    try:
+        await remove_orphans(engine)
+        targets = await load_targets(engine, folder_id, stale_hours)
+        progress.total = len(targets)
+        queue = deque(interleave_by_host(targets))
+        host_limits = defaultdict(lambda: asyncio.Semaphore(PER_HOST))
+        pending = []
+        write_lock = asyncio.Lock()
+
+        async def flush(minimum: int):
+            async with write_lock:
+                if len(pending) >= max(minimum, 1):
+                    batch = pending[:]
+                    del pending[:]
+                    await write_results(engine, batch)
+
+        async def worker():
+            while queue:
+                result = await check_link(client, queue.popleft(), host_limits)
+                pending.append(result)
+                progress.checked += 1
+                progress.unchanged += result["status_code"] == 304
+                progress.dead += result["dead"]
+                if len(pending) >= WRITE_BATCH_SIZE:
+                    await flush(WRITE_BATCH_SIZE)
+
+        await asyncio.gather(*(worker() for _ in range(min(CONCURRENCY, len(queue)))))
+        await flush(1)
+    finally:
+        if own_client:
+            await client.aclose()
+        progress.running = False
+        progress.finished_at = datetime.utcnow()
+    return progress
+
+def _record_failure(task):
+    """Done callback for background crawls: nobody awaits them, so keep the error"""
+    if task.cancelled():
+        progress.error = "Cancelled"
+        return
+    e = task.exception()
+    if e is not None:
+        logger.error("Link check failed", exc_info=e)
+        progress.error = (f"{type(e).__name__}: {e}" if str(e) else type(e).__name__)[:255]
+
+def start_crawl(folder_id: int = None, stale_hours: float = None) -> bool:
+    """Start a crawl in the background unless one is running; True if started"""
+    global _task
+    if _task is not None and not _task.done():
+        return False
+    progress.start()
+    _task = asyncio.get_running_loop().create_task(_crawl(folder_id, stale_hours, None, None))
+    _task.add_done_callback(_record_failure)
+    return True
+
+def get_dead_links(db: Session, folder_id: int = None, skip: int = 0, limit: int = 100, cursor: str = None):
+    """Return (rows, next_cursor) of bookmarks whose last check found them dead"""
+    query = (
+        db.query(
+            models.Bookmark.id, models.Bookmark.title, models.Bookmark.url, models.Bookmark.folder_id,
+            models.Bookmark.created_at, models.Bookmark.blob_sha256,
+            models.LinkStatus.status_code, models.LinkStatus.final_url, models.LinkStatus.fetched_title,
+            models.LinkStatus.error, models.LinkStatus.last_checked,
+        )
+        .join(models.LinkStatus, models.LinkStatus.bookmark_id == models.Bookmark.id)
+        .filter(models.LinkStatus.dead.is_(True))
+    )
+    if folder_id is not None:
+        query = query.filter(models.Bookmark.folder_id == folder_id)
+    return crud.paginate(query, models.Bookmark.id, skip=skip, limit=limit, cursor=cursor)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--folder-id", type=int, help="only check bookmarks in this folder")
+    parser.add_argument("--stale-hours", type=float, help="only check links not checked for this long")
+    args = parser.parse_args()
+
+    import migrations
+    from database import async_engine, engine
+    migrations.upgrade(engine)
+
+    async def run():
+        try:
+            return await crawl(args.folder_id, args.stale_hours)
+        finally:
+            await async_engine.dispose()
+
+    result = asyncio.run(run())
+    elapsed = (result.finished_at - result.started_at).total_seconds()
+    print(
+        f"Checked {result.checked} of {result.total} links in {elapsed:.1f}s: "
+        f"{result.dead} dead, {result.unchanged} unchanged"
+    )
+
+if __name__ == "__main__":
+    main()
@@ -1,37 +1,260 @@
 # crud.py
 
-from sqlalchemy.orm import Session
-import models, schemas
+import base64
+import json
+from collections import Counter
+from itertools import groupby
+from typing import List, Optional
+from sqlalchemy import String, and_, delete, false, func, insert, literal, or_, select, update
+from sqlalchemy.dialects import mysql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, selectinload
+import fastjson, models, schemas, storage, tagging, urls
+from cache import read_cache
+
+MAX_PAGE_SIZE = 1000
+
+# Keyset pagination
+def encode_cursor(*key) -> str:
+    """Encode the sort key of the last row on a page as an opaque cursor"""
+    raw = json.dumps(key, separators=(",", ":"), default=str)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str, arity: int = 1) -> list:
+    """Decode an opaque cursor, raising ValueError if it is malformed"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        key = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+    except Exception:
+        key = None
+    if not isinstance(key, list) or len(key) != arity:
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+    return key
+
+def paginate(query, key, skip: int = 0, limit: int = 100, cursor: str = None):
+    """Return (rows, next_cursor) for one page of query ordered by key.
+
+    With a cursor the page starts right after the last key of the previous page,
+    so the database seeks through the index instead of scanning skipped rows.
+    skip is honoured only when no cursor is given, for older clients. A limit
+    below 1 returns an empty page, as it always has.
+    """
+    if limit < 1:
+        return [], None
+    limit = min(limit, MAX_PAGE_SIZE)
+    query = query.order_by(key)
+    if cursor is not None:
+        (last_key,) = decode_cursor(cursor)
+        query = query.filter(key > last_key)
+    elif skip:
+        query = query.offset(skip)
+    rows = query.limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(getattr(rows[-1], key.key))
+    return rows, next_cursor
 
 def get_folder(db: Session, folder_id: int):
-    return db.query(models.Folder).filter(models.Folder.id == folder_id).first()
+    return (
+        db.query(models.Folder)
+        .options(selectinload(models.Folder.bookmarks))
+        .filter(models.Folder.id == folder_id)
+        .first()
+    )
+
+def get_folder_by_name(db: Session, name: str, parent_id: int = None):
+    """The folder called name directly inside parent_id, or at the root when it is None"""
+    query = db.query(models.Folder).filter(models.Folder.name == name)
+    if parent_id is None:
+        return query.filter(models.Folder.parent_id.is_(None)).first()
+    return query.filter(models.Folder.parent_id == parent_id).first()
+
+def get_folders(db: Session, skip: int = 0, limit: int = 100, cursor: str = None):
+    # Load every folder's bookmarks in one extra SELECT ... IN (...) instead of
+    # one lazy load per folder during serialization.
+    query = db.query(models.Folder).options(selectinload(models.Folder.bookmarks))
+    return paginate(query, models.Folder.id, skip=skip, limit=limit, cursor=cursor)
+
+def _folder_columns():
+    return [models.Folder.id, models.Folder.name, models.Folder.parent_id, models.Folder.path, models.Folder.created_at]
+
+def get_folder_summaries(db: Session, skip: int = 0, limit: int = 100, cursor: str = None):
+    # Folder columns plus a bookmark count, computed in a single GROUP BY query
+    bookmark_count = func.count(models.Bookmark.id).label("bookmark_count")
+    query = (
+        db.query(*_folder_columns(), bookmark_count)
+        .outerjoin(models.Bookmark, models.Bookmark.folder_id == models.Folder.id)
+        .group_by(*_folder_columns())
+    )
+    return paginate(query, models.Folder.id, skip=skip, limit=limit, cursor=cursor)
 
-def get_folder_by_name(db: Session, name: str):
-    return db.query(models.Folder).filter(models.Folder.name == name).first()
+# Folder tree, stored as materialized paths (see models.Folder.path)
+MAX_PATH_LENGTH = models.Folder.path.type.length
 
-def get_folders(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Folder).offset(skip).limit(limit).all()
+def child_path(folder) -> str:
+    """The path of folder's children"""
+    return f"{folder.path}{folder.id}/"
+
+def subtree_filter(folder):
+    """Folder and all its descendants: the primary key plus one range scan on path.
+    "0" sorts right after "/", so the range holds exactly the paths under the prefix."""
+    prefix = child_path(folder)
+    return or_(
+        models.Folder.id == folder.id,
+        and_(models.Folder.path >= prefix, models.Folder.path < prefix[:-1] + "0"),
+    )
+
+def subtree_ids(folder):
+    """SELECT of the ids in folder's subtree, for use in IN (...)"""
+    return select(models.Folder.id).where(subtree_filter(folder))
 
 def create_folder(db: Session, folder: schemas.FolderCreate):
-    db_folder = models.Folder(name=folder.name)
+    """Raises ValueError when the parent does not exist"""
+    path = "/"
+    if folder.parent_id is not None:
+        parent = db.get(models.Folder, folder.parent_id)
+        if parent is None:
+            raise ValueError(f"Parent folder {folder.parent_id} not found")
+        path = child_path(parent)
+        if len(path) > MAX_PATH_LENGTH:
+            raise ValueError("Folders are nested too deeply")
+    db_folder = models.Folder(name=folder.name, parent_id=folder.parent_id, path=path)
     db.add(db_folder)
     db.commit()
     db.refresh(db_folder)
     return db_folder
 
+def move_folder(db: Session, folder_id: int, parent_id: int = None):
+    """Move a folder, with everything below it, into parent_id (None for the root).
+
+    Two statements whatever the subtree's size: the folder's own row, then one
+    UPDATE rewriting the path prefix of every descendant over the path range.
+    Returns None if the folder does not exist; raises ValueError when the parent
+    does not exist, lies inside the subtree, or holds a folder of the same name.
+    """
+    db_folder = db.get(models.Folder, folder_id)
+    if db_folder is None:
+        return None
+    old_prefix = child_path(db_folder)
+    new_path = "/"
+    if parent_id is not None:
+        parent = db.get(models.Folder, parent_id)
+        if parent is None:
+            raise ValueError(f"Parent folder {parent_id} not found")
+        if parent.id == db_folder.id or parent.path.startswith(old_prefix):
+            raise ValueError("A folder cannot be moved into itself or one of its subfolders")
+        new_path = child_path(parent)
+    if new_path == db_folder.path:
+        return db_folder
+    sibling = get_folder_by_name(db, db_folder.name, parent_id)
+    if sibling is not None:
+        raise ValueError("Folder already exists")
+
+    new_prefix = f"{new_path}{db_folder.id}/"
+    in_subtree = and_(models.Folder.path >= old_prefix, models.Folder.path < old_prefix[:-1] + "0")
+    longest = db.scalar(select(func.max(func.length(models.Folder.path))).where(in_subtree))
+    if len(new_path) > MAX_PATH_LENGTH or (longest or 0) - len(old_prefix) + len(new_prefix) > MAX_PATH_LENGTH:
+        raise ValueError("Folders are nested too deeply")
+
+    db.execute(
+        update(models.Folder)
+        .where(in_subtree)
+        .values(path=literal(new_prefix, String) + func.substr(models.Folder.path, len(old_prefix) + 1, type_=String)),
+        execution_options={"synchronize_session": False},
+    )
+    db_folder.parent_id = parent_id
+    db_folder.path = new_path
+    db.commit()
+    db.refresh(db_folder)
+    return db_folder
+
+def get_folder_tree(db: Session, folder_id: int):
+    """A folder and its descendants in tree order, each with its own bookmark
+    count, plus the subtree's total, from one GROUP BY over the path range"""
+    db_folder = db.get(models.Folder, folder_id)
+    if db_folder is None:
+        return None
+    bookmark_count = func.count(models.Bookmark.id).label("bookmark_count")
+    rows = (
+        db.query(*_folder_columns(), bookmark_count)
+        .outerjoin(models.Bookmark, models.Bookmark.folder_id == models.Folder.id)
+        .filter(subtree_filter(db_folder))
+        .group_by(*_folder_columns())
+        .all()
+    )
+    # Tree order: a folder's position is its path followed by its own id
+    rows.sort(key=lambda row: [int(part) for part in f"{row.path}{row.id}".split("/") if part])
+    return {
+        "id": db_folder.id,
+        "bookmark_count": sum(row.bookmark_count for row in rows),
+        "folders": rows,
+    }
+
+DELETE_BATCH_SIZE = 2000
+
+def count_subtree_bookmarks(db: Session, folder) -> int:
+    return db.scalar(
+        select(func.count(models.Bookmark.id)).where(models.Bookmark.folder_id.in_(subtree_ids(folder)))
+    )
+
+def delete_subtree(db: Session, folder, batch_size: int = DELETE_BATCH_SIZE, progress=None) -> int:
+    """Delete a folder, its subfolders and their bookmarks with set-based DELETEs.
+
+    Bookmarks go in committed batches of batch_size ids, so no transaction (or
+    write lock) grows with the folder; progress(deleted) is called after each
+    and may raise to stop early. Returns the number of bookmarks deleted.
+    """
+    folders = db.execute(select(models.Folder.id, models.Folder.path).where(subtree_filter(folder))).all()
+    folder_ids = [row.id for row in folders]
+    deleted = 0
+    while True:
+        batch = db.execute(
+            select(models.Bookmark.id, models.Bookmark.url, models.Bookmark.blob_sha256)
+            .where(models.Bookmark.folder_id.in_(folder_ids))
+            .order_by(models.Bookmark.id)
+            .limit(batch_size)
+        ).all()
+        if not batch:
+            break
+        db.execute(
+            delete(models.Bookmark).where(models.Bookmark.id.in_([row.id for row in batch])),
+            execution_options={"synchronize_session": False},
+        )
+        uploads = [(row.url, row.blob_sha256) for row in batch if row.blob_sha256]
+        orphans = release_blobs(db, [sha256 for _, sha256 in uploads])
+        db.commit()
+        for url, _ in uploads:
+            storage.remove_upload(url)
+        storage.remove_upload(None, orphans)
+        deleted += len(batch)
+        if progress is not None:
+            progress(deleted)
+    # Deepest level first, so no folder outlives its parent
+    depth = lambda row: row.path.count("/")
+    for _, level in groupby(sorted(folders, key=depth, reverse=True), key=depth):
+        db.execute(
+            delete(models.Folder).where(models.Folder.id.in_([row.id for row in level])),
+            execution_options={"synchronize_session": False},
+        )
+    db.commit()
+    return deleted
+
 def delete_folder(db: Session, folder_id: int):
+    """Delete a folder with all its subfolders and their bookmarks; returns the
+    folder as it was, detached from the session"""
     db_folder = get_folder(db, folder_id)
     if db_folder:
-        db.delete(db_folder)
-        db.commit()
+        db.expunge(db_folder)  # keeps its loaded bookmarks for the response
+        delete_subtree(db, db_folder)
     return db_folder
 
 # Bookmark operations
 def get_bookmark(db: Session, bookmark_id: int):
     return db.query(models.Bookmark).filter(models.Bookmark.id == bookmark_id).first()
 
-def get_bookmarks(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Bookmark).offset(skip).limit(limit).all()
+def get_bookmarks(db: Session, skip: int = 0, limit: int = 100, cursor: str = None):
+    return paginate(db.query(models.Bookmark), models.Bookmark.id, skip=skip, limit=limit, cursor=cursor)
 
 def create_bookmark(db: Session, bookmark: schemas.BookmarkCreate):
     db_bookmark = models.Bookmark(title=bookmark.title, url=bookmark.url, folder_id=bookmark.folder_id)
@@ -45,6 +268,7 @@ def update_bookmark(db: Session, bookmark_id: int, bookmark: schemas.BookmarkCre
     if db_bookmark:
         db_bookmark.title = bookmark.title
         db_bookmark.url = bookmark.url
+        db_bookmark.url_hash = urls.url_hash(bookmark.url)
         db_bookmark.folder_id = bookmark.folder_id
         db.commit()
         db.refresh(db_bookmark)
@@ -53,9 +277,432 @@ def update_bookmark(db: Session, bookmark_id: int, bookmark: schemas.BookmarkCre
 def delete_bookmark(db: Session, bookmark_id: int):
     db_bookmark = get_bookmark(db, bookmark_id)
     if db_bookmark:
+        url, sha256 = db_bookmark.url, db_bookmark.blob_sha256
         db.delete(db_bookmark)
+        db.flush()
+        orphans = release_blobs(db, [sha256]) if sha256 else []
         db.commit()
+        if sha256:
+            storage.remove_upload(url, orphans)
     return db_bookmark
 
-def get_bookmarks_by_folder(db: Session, folder_id: int):
-    return db.query(models.Bookmark).filter(models.Bookmark.folder_id == folder_id).all()
+def get_bookmarks_by_folder(db: Session, folder_id: int, skip: int = 0, limit: int = 100, cursor: str = None):
+    # Served by the (folder_id, id) index: equality on folder_id, range on id
+    query = db.query(models.Bookmark).filter(models.Bookmark.folder_id == folder_id)
+    return paginate(query, models.Bookmark.id, skip=skip, limit=limit, cursor=cursor)
+
+# Fast list reads: select only the requested columns and encode the tuples
+# directly, skipping ORM objects and per-row model validation. Each returns
+# (json_bytes, next_cursor) with the same shape the schemas produce.
+def _select(column_map: dict, names, key):
+    """Columns for names, plus the pagination key last if it was not requested"""
+    columns = [column_map[name] for name in names]
+    if key.key not in names:
+        columns.append(key)
+    return columns
+
+def _bookmark_columns():
+    return {name: getattr(models.Bookmark, name) for name in schemas.Bookmark.model_fields}
+
+def get_bookmarks_rows(
+    db: Session, skip: int = 0, limit: int = 100, cursor: str = None, fields: str = None,
+    tags: str = None, mode: str = "all"
+):
+    names = fastjson.parse_fields(fields, schemas.Bookmark)
+    query = db.query(*_select(_bookmark_columns(), names, models.Bookmark.id))
+    for criterion in _tag_filter(db, tags, mode):
+        query = query.filter(criterion)
+    rows, next_cursor = paginate(query, models.Bookmark.id, skip=skip, limit=limit, cursor=cursor)
+    return fastjson.dumps(fastjson.row_dicts(rows, names)), next_cursor
+
+def get_bookmarks_by_folder_rows(
+    db: Session, folder_id: int, skip: int = 0, limit: int = 100, cursor: str = None, fields: str = None
+):
+    names = fastjson.parse_fields(fields, schemas.Bookmark)
+    query = (
+        db.query(*_select(_bookmark_columns(), names, models.Bookmark.id))
+        .filter(models.Bookmark.folder_id == folder_id)
+    )
+    rows, next_cursor = paginate(query, models.Bookmark.id, skip=skip, limit=limit, cursor=cursor)
+    return fastjson.dumps(fastjson.row_dicts(rows, names)), next_cursor
+
+def get_subtree_bookmarks_rows(
+    db: Session, folder_id: int, skip: int = 0, limit: int = 100, cursor: str = None, fields: str = None
+):
+    """Bookmarks anywhere in a folder's subtree; null when the folder does not exist"""
+    names = fastjson.parse_fields(fields, schemas.Bookmark)
+    db_folder = db.get(models.Folder, folder_id)
+    if db_folder is None:
+        return fastjson.dumps(None), None
+    query = (
+        db.query(*_select(_bookmark_columns(), names, models.Bookmark.id))
+        .filter(models.Bookmark.folder_id.in_(subtree_ids(db_folder)))
+    )
+    rows, next_cursor = paginate(query, models.Bookmark.id, skip=skip, limit=limit, cursor=cursor)
+    return fastjson.dumps(fastjson.row_dicts(rows, names)), next_cursor
+
+def get_folders_rows(db: Session, skip: int = 0, limit: int = 100, cursor: str = None, fields: str = None):
+    names = fastjson.parse_fields(fields, schemas.Folder)
+    folder_names = [name for name in names if name != "bookmarks"]
+    column_map = {name: getattr(models.Folder, name) for name in folder_names}
+    query = db.query(*_select(column_map, folder_names, models.Folder.id))
+    rows, next_cursor = paginate(query, models.Folder.id, skip=skip, limit=limit, cursor=cursor)
+    folders = fastjson.row_dicts(rows, folder_names)
+    if "bookmarks" in names:
+        # Every folder's bookmarks in one SELECT ... IN (...), as selectinload would
+        by_folder = {row.id: [] for row in rows}
+        bookmark_names = list(schemas.Bookmark.model_fields)
+        for chunk in _chunks(by_folder):
+            bookmarks = (
+                db.query(*_bookmark_columns().values())
+                .filter(models.Bookmark.folder_id.in_(chunk))
+                .order_by(models.Bookmark.id)
+            )
+            for bookmark in fastjson.row_dicts(bookmarks, bookmark_names):
+                by_folder[bookmark["folder_id"]].append(bookmark)
+        for row, folder in zip(rows, folders):
+            folder["bookmarks"] = by_folder[row.id]
+    return fastjson.dumps(folders), next_cursor
+
+def get_folder_summaries_rows(db: Session, skip: int = 0, limit: int = 100, cursor: str = None, fields: str = None):
+    names = fastjson.parse_fields(fields, schemas.FolderSummary)
+    bookmark_count = func.count(models.Bookmark.id).label("bookmark_count")
+    column_map = {column.key: column for column in _folder_columns()}
+    column_map["bookmark_count"] = bookmark_count
+    query = db.query(*_select(column_map, names, models.Folder.id))
+    if "bookmark_count" in names:
+        # Only pay for the join and GROUP BY when the count was asked for
+        query = (
+            query.outerjoin(models.Bookmark, models.Bookmark.folder_id == models.Folder.id)
+            .group_by(*_folder_columns())
+        )
+    rows, next_cursor = paginate(query, models.Folder.id, skip=skip, limit=limit, cursor=cursor)
+    return fastjson.dumps(fastjson.row_dicts(rows, names)), next_cursor
+
+# Tags: many-to-many through bookmark_tags
+def _tag_ids(db: Session, names) -> dict:
+    return dict(db.execute(select(models.Tag.name, models.Tag.id).where(models.Tag.name.in_(names))).all())
+
+def _tag_filter(db: Session, tags: str, mode: str = "all") -> list:
+    """Criteria on Bookmark.id for bookmarks carrying all (or any) of tags.
+
+    Each is an IN over the (tag_id, bookmark_id) index: one per tag for "all",
+    so the database intersects them, or one over every tag for "any".
+    """
+    if mode not in ("all", "any"):
+        raise ValueError(f"Unknown tag mode: {mode!r}")
+    names = tagging.parse_tags(tags)
+    if not names:
+        return []
+    tag_ids = list(_tag_ids(db, names).values())
+    tagged = select(models.BookmarkTag.bookmark_id)
+    if mode == "any":
+        if not tag_ids:
+            return [false()]
+        return [models.Bookmark.id.in_(tagged.where(models.BookmarkTag.tag_id.in_(tag_ids)))]
+    if len(tag_ids) < len(names):
+        return [false()]  # a tag nobody uses
+    return [models.Bookmark.id.in_(tagged.where(models.BookmarkTag.tag_id == tag_id)) for tag_id in tag_ids]
+
+def get_bookmark_tags(db: Session, bookmark_id: int):
+    """A bookmark's tag names in alphabetical order, or None if it does not exist"""
+    if db.get(models.Bookmark, bookmark_id) is None:
+        return None
+    return list(db.scalars(
+        select(models.Tag.name)
+        .join(models.BookmarkTag, models.BookmarkTag.tag_id == models.Tag.id)
+        .where(models.BookmarkTag.bookmark_id == bookmark_id)
+        .order_by(models.Tag.name)
+    ))
+
+def set_bookmark_tags(db: Session, bookmark_id: int, tags):
+    """Replace a bookmark's tags, creating tags that do not exist yet.
+
+    Returns the tag names, or None if the bookmark does not exist; raises
+    ValueError for invalid names.
+    """
+    names = tagging.parse_tags(tags)
+    if db.get(models.Bookmark, bookmark_id) is None:
+        return None
+    tag_ids = _tag_ids(db, names) if names else {}
+    new_names = [name for name in names if name not in tag_ids]
+    if new_names:
+        db.execute(insert(models.Tag), [{"name": name} for name in new_names])
+        tag_ids = _tag_ids(db, names)
+    links = models.BookmarkTag
+    db.execute(delete(links).where(links.bookmark_id == bookmark_id, links.tag_id.not_in(tag_ids.values())))
+    current = set(db.scalars(select(links.tag_id).where(links.bookmark_id == bookmark_id)))
+    added = [{"bookmark_id": bookmark_id, "tag_id": tag_id} for tag_id in tag_ids.values() if tag_id not in current]
+    if added:
+        db.execute(insert(links), added)
+    db.commit()
+    return sorted(names)
+
+def get_tag_facets(db: Session, tags: str = None, mode: str = "all", folder_id: int = None, limit: int = 100):
+    """Tags with how many bookmarks matching the filter carry each, most used
+    first, from one GROUP BY over bookmark_tags"""
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    count = func.count(models.BookmarkTag.bookmark_id).label("count")
+    query = (
+        db.query(models.Tag.name, count)
+        .join(models.BookmarkTag, models.BookmarkTag.tag_id == models.Tag.id)
+        .group_by(models.Tag.id, models.Tag.name)
+        .order_by(count.desc(), models.Tag.name)
+    )
+    criteria = _tag_filter(db, tags, mode)
+    if folder_id is not None:
+        criteria.append(models.Bookmark.folder_id == folder_id)
+    if criteria:
+        matching = select(models.Bookmark.id).where(*criteria)
+        query = query.filter(models.BookmarkTag.bookmark_id.in_(matching))
+    return query.limit(limit).all()
+
+# Duplicates: bookmarks whose URLs normalize to the same url_hash
+def find_duplicate(db: Session, url: str):
+    """Oldest bookmark with the same normalized URL, found through the url_hash index"""
+    return (
+        db.query(models.Bookmark)
+        .filter(models.Bookmark.url_hash == urls.url_hash(url))
+        .order_by(models.Bookmark.id)
+        .first()
+    )
+
+def get_duplicates(db: Session, url: str = None, skip: int = 0, limit: int = 100, cursor: str = None):
+    """Return (groups, next_cursor) of bookmarks sharing a normalized URL.
+
+    Groups come from a GROUP BY over the url_hash index and are paged by hash;
+    with url, only that URL's group is returned.
+    """
+    if limit < 1:
+        return [], None
+    limit = min(limit, MAX_PAGE_SIZE)
+    count = func.count(models.Bookmark.id)
+    query = (
+        db.query(models.Bookmark.url_hash, count)
+        .filter(models.Bookmark.url_hash.isnot(None))
+        .group_by(models.Bookmark.url_hash)
+        .having(count > 1)
+        .order_by(models.Bookmark.url_hash)
+    )
+    if url is not None:
+        query = query.filter(models.Bookmark.url_hash == urls.url_hash(url))
+    if cursor is not None:
+        (last_hash,) = decode_cursor(cursor)
+        query = query.filter(models.Bookmark.url_hash > last_hash)
+    elif skip:
+        query = query.offset(skip)
+    hashes = [url_hash for url_hash, _ in query.limit(limit + 1).all()]
+    next_cursor = None
+    if len(hashes) > limit:
+        hashes = hashes[:limit]
+        next_cursor = encode_cursor(hashes[-1])
+
+    groups = {url_hash: [] for url_hash in hashes}
+    if hashes:
+        bookmarks = (
+            db.query(models.Bookmark)
+            .filter(models.Bookmark.url_hash.in_(hashes))
+            .order_by(models.Bookmark.id)
+        )
+        for db_bookmark in bookmarks:
+            groups[db_bookmark.url_hash].append(db_bookmark)
+    return [
+        {
+            "url_hash": url_hash,
+            "normalized_url": urls.normalize_url(members[0].url),
+            "count": len(members),
+            "bookmarks": members,
+        }
+        for url_hash, members in groups.items()
+    ], next_cursor
+
+# Cached reads for the list endpoints: (json_bytes, next_cursor), see cache.py
+get_folder_json = read_cache.cached(get_folder, Optional[schemas.Folder], paged=False)
+get_folders_json = read_cache.cached(get_folders_rows)
+get_folder_summaries_json = read_cache.cached(get_folder_summaries_rows)
+get_bookmarks_json = read_cache.cached(get_bookmarks_rows)
+get_bookmarks_by_folder_json = read_cache.cached(get_bookmarks_by_folder_rows)
+get_subtree_bookmarks_json = read_cache.cached(get_subtree_bookmarks_rows)
+get_folder_tree_json = read_cache.cached(get_folder_tree, Optional[schemas.FolderTree], paged=False)
+get_duplicates_json = read_cache.cached(get_duplicates, List[schemas.DuplicateGroup])
+get_tag_facets_json = read_cache.cached(get_tag_facets, List[schemas.TagCount], paged=False)
+
+# Upload blobs
+def release_blobs(db: Session, hashes):
+    """Drop one reference per hash and delete blob rows nobody references.
+
+    Returns the hashes whose files can be removed once the transaction commits.
+    """
+    counts = Counter(hashes)
+    for sha256, count in counts.items():
+        db.execute(
+            update(models.Blob)
+            .where(models.Blob.sha256 == sha256)
+            .values(ref_count=models.Blob.ref_count - count)
+        )
+    if not counts:
+        return []
+    orphans = db.scalars(
+        select(models.Blob.sha256)
+        .where(models.Blob.sha256.in_(counts), models.Blob.ref_count <= 0)
+    ).all()
+    if orphans:
+        db.execute(delete(models.Blob).where(models.Blob.sha256.in_(orphans)))
+    return orphans
+
+# Batch mutations
+LOOKUP_CHUNK_SIZE = 500
+
+class BatchError(ValueError):
+    """An operation in a batch cannot be applied, so nothing is committed"""
+
+    def __init__(self, index: int, message: str):
+        super().__init__(message)
+        self.index = index
+
+def _chunks(values, size: int = LOOKUP_CHUNK_SIZE):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+def apply_batch(db: Session, operations) -> List[dict]:
+    """Apply create/update/move/delete operations in order, in one transaction.
+
+    Bookmark and folder existence are checked up front with one query each,
+    moves and deletes are single set-based statements, and runs of consecutive
+    creates or updates are sent as one executemany. Unknown bookmark ids are
+    reported per operation; an unknown folder raises BatchError and rolls back.
+    """
+    referenced, folder_ids = set(), set()
+    for op in operations:
+        if op.op == "update":
+            referenced.add(op.id)
+        elif op.op in ("move", "delete"):
+            referenced.update(op.ids)
+        if op.op != "delete" and op.folder_id is not None:
+            folder_ids.add(op.folder_id)
+
+    known_folders = set()
+    for chunk in _chunks(folder_ids):
+        known_folders.update(db.scalars(select(models.Folder.id).where(models.Folder.id.in_(chunk))))
+    for index, op in enumerate(operations):
+        if op.op != "delete" and op.folder_id is not None and op.folder_id not in known_folders:
+            raise BatchError(index, f"Folder {op.folder_id} not found")
+
+    # Bookmarks that exist at this point of the batch: id -> (url, blob_sha256)
+    live = {}
+    for chunk in _chunks(referenced):
+        stmt = select(models.Bookmark.id, models.Bookmark.url, models.Bookmark.blob_sha256)
+        for row in db.execute(stmt.where(models.Bookmark.id.in_(chunk))):
+            live[row.id] = (row.url, row.blob_sha256)
+
+    results = [None] * len(operations)
+    uploads = []
+    for kind, run in groupby(enumerate(operations), key=lambda item: item[1].op):
+        run = list(run)
+        if kind == "create":
+            created = [
+                models.Bookmark(title=op.title, url=op.url, folder_id=op.folder_id) for _, op in run
+            ]
+            db.add_all(created)
+            db.flush()
+            for (index, op), db_bookmark in zip(run, created):
+                live[db_bookmark.id] = (op.url, None)
+                results[index] = {"index": index, "op": kind, "ids": [db_bookmark.id]}
+        elif kind == "update":
+            values = []
+            for index, op in run:
+                if op.id in live:
+                    values.append({
+                        "id": op.id, "title": op.title, "url": op.url,
+                        "url_hash": urls.url_hash(op.url), "folder_id": op.folder_id,
+                    })
+                    live[op.id] = (op.url, live[op.id][1])
+                    results[index] = {"index": index, "op": kind, "ids": [op.id]}
+                else:
+                    results[index] = {"index": index, "op": kind, "missing": [op.id]}
+            if values:
+                db.execute(update(models.Bookmark), values)
+        else:
+            for index, op in run:
+                found = [i for i in dict.fromkeys(op.ids) if i in live]
+                missing = [i for i in dict.fromkeys(op.ids) if i not in live]
+                for chunk in _chunks(found):
+                    if kind == "move":
+                        stmt = update(models.Bookmark).values(folder_id=op.folder_id)
+                    else:
+                        stmt = delete(models.Bookmark)
+                    db.execute(
+                        stmt.where(models.Bookmark.id.in_(chunk)),
+                        execution_options={"synchronize_session": False},
+                    )
+                if kind == "delete":
+                    for bookmark_id in found:
+                        url, sha256 = live.pop(bookmark_id)
+                        if sha256:
+                            uploads.append((url, sha256))
+                results[index] = {"index": index, "op": kind, "ids": found, "missing": missing}
+
+    orphans = release_blobs(db, [sha256 for _, sha256 in uploads])
+    db.commit()
+    for url, _ in uploads:
+        storage.remove_upload(url)
+    storage.remove_upload(None, orphans)
+
+    # Created and updated bookmarks are returned in full, read back in one query
+    written = {}
+    for result in results:
+        if result["op"] in ("create", "update") and result.get("ids"):
+            written.setdefault(result["ids"][0], []).append(result)
+    for chunk in _chunks(written):
+        for db_bookmark in db.scalars(select(models.Bookmark).where(models.Bookmark.id.in_(chunk))):
+            for result in written[db_bookmark.id]:
+                result["bookmark"] = db_bookmark
+    return results
+
+# Async helpers for the async def upload and open routes, using an AsyncSession.
+# Only what those routes need: every other route runs sync code in the threadpool.
+async def get_blob_sha256_by_url_async(db: AsyncSession, url: str):
+    stmt = (
+        select(models.Bookmark.blob_sha256)
+        .filter(models.Bookmark.url_hash == urls.url_hash(url), models.Bookmark.url == url)
+        .limit(1)
+    )
+    return (await db.execute(stmt)).scalar()
+
+async def get_bookmark_id_by_url_async(db: AsyncSession, url: str):
+    stmt = (
+        select(models.Bookmark.id)
+        .filter(models.Bookmark.url_hash == urls.url_hash(url), models.Bookmark.url == url)
+        .order_by(models.Bookmark.id)
+        .limit(1)
+    )
+    return (await db.execute(stmt)).scalar()
+
+async def acquire_blob_async(db: AsyncSession, sha256: str, size: int):
+    """Add a reference to a blob, creating its row on first upload. One upsert,
+    so two first uploads of the same content cannot both try to insert it."""
+    table = models.Blob.__table__
+    dialect = db.bind.dialect.name
+    if dialect == "sqlite":
+        stmt = sqlite.insert(table).values(sha256=sha256, size=size, ref_count=1)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.sha256], set_={"ref_count": table.c.ref_count + 1}
+        )
+    elif dialect == "mysql":
+        stmt = mysql.insert(table).values(sha256=sha256, size=size, ref_count=1)
+        stmt = stmt.on_duplicate_key_update(ref_count=table.c.ref_count + 1)
+    else:
+        raise NotImplementedError(f"Uploads are not supported on {dialect}")
+    await db.execute(stmt)
+
+async def create_upload_bookmark_async(db: AsyncSession, bookmark: schemas.BookmarkCreate, sha256: str, size: int):
+    """Create a bookmark for an uploaded blob and take its reference in one transaction"""
+    await acquire_blob_async(db, sha256, size)
+    db_bookmark = models.Bookmark(
+        title=bookmark.title, url=bookmark.url, folder_id=bookmark.folder_id, blob_sha256=sha256
+    )
+    db.add(db_bookmark)
+    await db.commit()
+    await db.refresh(db_bookmark)
+    return db_bookmark
@@ -0,0 +1,181 @@
+# downloads.py
+
+import mimetypes
+import os
+import secrets
+from email.utils import formatdate, parsedate_to_datetime
+from urllib.parse import quote
+
+import anyio
+from fastapi import Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+
+CHUNK_SIZE = 64 * 1024
+
+# More ranges than this in one request is treated as abuse and served in full
+MAX_RANGES = 16
+
+# Blob-backed uploads live under unique names and never change, so they can be
+# cached for good. Anything else must be revalidated, which is a cheap 304.
+IMMUTABLE_CACHE_CONTROL = "private, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "private, no-cache"
+
+def make_etag(stat_result: os.stat_result, sha256: str = None) -> str:
+    """Strong ETag from the content hash when known, else from mtime and size"""
+    if sha256:
+        return f'"{sha256}"'
+    return f'"{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}"'
+
+def etag_matches(header: str, etag: str) -> bool:
+    # If-None-Match uses weak comparison, so W/ prefixes are ignored
+    if header.strip() == "*":
+        return True
+    candidates = [tag.strip() for tag in header.split(",")]
+    return any((tag[2:] if tag.startswith("W/") else tag) == etag for tag in candidates)
+
+def _not_modified_since(header: str, stat_result: os.stat_result) -> bool:
+    try:
+        since = parsedate_to_datetime(header).timestamp()
+    except (TypeError, ValueError):
+        return False
+    return int(stat_result.st_mtime) <= since
+
+def _if_range_allows(header: str, etag: str, stat_result: os.stat_result) -> bool:
+    # If-Range needs a strong validator match, otherwise the full body is sent
+    if header.startswith('"') or header.startswith("W/"):
+        return header == etag
+    try:
+        return int(stat_result.st_mtime) == int(parsedate_to_datetime(header).timestamp())
+    except (TypeError, ValueError):
+        return False
+
+def parse_range(header: str, size: int):
+    """Parse a bytes Range header into sorted, merged (start, end) pairs.
+
+    end is inclusive. Returns None when the header should be ignored and []
+    when no range is satisfiable.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or not spec:
+        return None
+    ranges = []
+    for part in spec.split(","):
+        start, sep, end = part.strip().partition("-")
+        if not sep:
+            return None
+        try:
+            if start:
+                start, end = int(start), int(end) if end else None
+                if end is not None and end < start:
+                    return None
+            elif end:
+                # Suffix range: the last N bytes
+                start, end = max(size - int(end), 0), None
+            else:
+                return None
+        except ValueError:
+            return None
+        if start < size:
+            ranges.append((start, size - 1 if end is None else min(end, size - 1)))
+    if len(ranges) > MAX_RANGES:
+        return None
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+async def _read_range(path, start: int, end: int):
+    async with await anyio.open_file(path, "rb") as f:
+        await f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = await f.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+def _content_disposition(filename: str) -> str:
+    quoted = quote(filename)
+    if quoted != filename:
+        return f"attachment; filename*=utf-8''{quoted}"
+    return f'attachment; filename="{filename}"'
+
+async def file_response(
+    request: Request,
+    path,
+    filename: str,
+    sha256: str = None,
+    cache_control: str = REVALIDATE_CACHE_CONTROL,
+) -> Response:
+    """Serve a file with ETag/Last-Modified validation and byte-range support"""
+    stat_result = await run_in_threadpool(os.stat, path)
+    size = stat_result.st_size
+    etag = make_etag(stat_result, sha256)
+    headers = {
+        "ETag": etag,
+        "Last-Modified": formatdate(stat_result.st_mtime, usegmt=True),
+        "Cache-Control": IMMUTABLE_CACHE_CONTROL if sha256 else cache_control,
+        "Accept-Ranges": "bytes",
+    }
+
+    if_none_match = request.headers.get("if-none-match")
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_none_match is not None:
+        if etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers=headers)
+    elif if_modified_since and _not_modified_since(if_modified_since, stat_result):
+        return Response(status_code=304, headers=headers)
+
+    ranges = None
+    range_header = request.headers.get("range")
+    if range_header:
+        if_range = request.headers.get("if-range")
+        if if_range is None or _if_range_allows(if_range, etag, stat_result):
+            ranges = parse_range(range_header, size)
+
+    headers["Content-Disposition"] = _content_disposition(filename)
+    if ranges is None:
+        return FileResponse(path, headers=headers, stat_result=stat_result)
+    if not ranges:
+        return Response(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+
+    media_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    if len(ranges) == 1:
+        start, end = ranges[0]
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        headers["Content-Length"] = str(end - start + 1)
+        return StreamingResponse(
+            _read_range(path, start, end), status_code=206, media_type=media_type, headers=headers
+        )
+
+    boundary = secrets.token_hex(16)
+    part_headers = [
+        (
+            f"--{boundary}\r\nContent-Type: {media_type}\r\n"
+            f"Content-Range: bytes {start}-{end}/{size}\r\n\r\n"
+        ).encode()
+        for start, end in ranges
+    ]
+    closing = f"--{boundary}--\r\n".encode()
+    length = sum(len(h) + (end - start + 1) + 2 for h, (start, end) in zip(part_headers, ranges))
+    headers["Content-Length"] = str(length + len(closing))
+
+    async def multipart():
+        for part_header, (start, end) in zip(part_headers, ranges):
+            yield part_header
+            async for chunk in _read_range(path, start, end):
+                yield chunk
+            yield b"\r\n"
+        yield closing
+
+    return StreamingResponse(
+        multipart(),
+        status_code=206,
+        media_type=f"multipart/byteranges; boundary={boundary}",
+        headers=headers,
+    )
@@ -0,0 +1,39 @@
+# fastjson.py
+
+"""JSON for list responses straight from column tuples, without building a
+pydantic model per row. Uses orjson when it is installed."""
+
+import json
+from datetime import date, datetime
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def dumps(value) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, default=_default, separators=(",", ":"), ensure_ascii=False).encode()
+
+def parse_fields(fields: str, schema) -> list:
+    """Field names to return, in the schema's order: all of them when fields is
+    empty, otherwise the comma-separated subset. Raises ValueError for unknown names."""
+    names = list(schema.model_fields)
+    if not fields:
+        return names
+    requested = {name.strip() for name in fields.split(",") if name.strip()}
+    unknown = requested.difference(names)
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}; choose from {', '.join(names)}")
+    return [name for name in names if name in requested]
+
+def row_dicts(rows, names):
+    """Map each row's leading values onto names; trailing values (such as a
+    pagination key nobody asked for) are dropped"""
+    return [dict(zip(names, row)) for row in rows]
@@ -0,0 +1,293 @@
+# jobs.py
+
+"""Background jobs for work too big to finish inside a request.
+
+The jobs table is the queue and each API process runs a small pool of worker
+threads; there is no broker. Workers claim a queued job with a conditional
+UPDATE, so several processes can share one database without running a job
+twice. Handlers report progress through the RunningJob they are given, which
+is also where cancellation and shutdown are noticed. Failed jobs are retried
+with backoff up to max_attempts; a job whose worker died is queued again once
+its heartbeat goes stale.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session
+import backup, crud, models
+from database import SessionLocal, engine
+
+WORKERS = int(os.getenv("TRACKSITE_JOB_WORKERS", "2"))
+POLL_SECONDS = 1.0
+MAX_ATTEMPTS = 3
+RETRY_DELAY_SECONDS = 5.0  # doubled after every failed attempt
+PROGRESS_INTERVAL_SECONDS = 1.0  # at most one progress write per job per interval
+STALE_SECONDS = 300  # a running job without a heartbeat for this long is re-queued
+
+# Folder deletes touching more bookmarks than this run as a job (see main.py)
+INLINE_DELETE_LIMIT = int(os.getenv("TRACKSITE_INLINE_DELETE_LIMIT", "1000"))
+
+ACTIVE = ("queued", "running")
+
+logger = logging.getLogger("tracksite.jobs")
+
+class JobCancelled(Exception):
+    """Cancellation was requested while the job was running"""
+
+class JobInterrupted(Exception):
+    """The worker is shutting down; the job goes back to the queue"""
+
+HANDLERS = {}
+
+def handler(kind: str):
+    """Register fn(job, **params) as the handler for jobs of this kind"""
+    def register(fn):
+        HANDLERS[kind] = fn
+        return fn
+    return register
+
+class RunningJob:
+    """What a handler gets: a way to report progress that also raises
+    JobCancelled or JobInterrupted when it should stop"""
+
+    def __init__(self, job_id: int, stopping: threading.Event):
+        self.id = job_id
+        self._stopping = stopping
+        self._last_write = 0.0
+
+    def progress(self, done: int, total: int = None):
+        if self._stopping.is_set():
+            raise JobInterrupted()
+        if total is None and time.monotonic() - self._last_write < PROGRESS_INTERVAL_SECONDS:
+            return
+        self._last_write = time.monotonic()
+        values = {"progress": done, "heartbeat_at": datetime.utcnow()}
+        if total is not None:
+            values["total"] = total
+        with engine.begin() as conn:
+            conn.execute(update(models.Job).where(models.Job.id == self.id).values(**values))
+            cancel = conn.scalar(select(models.Job.cancel_requested).where(models.Job.id == self.id))
+        if cancel:
+            raise JobCancelled()
+
+# Submitting and managing jobs, from request handlers
+def _encode_params(params: dict) -> str:
+    return json.dumps(params, sort_keys=True, separators=(",", ":"))
+
+def submit(db: Session, kind: str, params: dict = None, max_attempts: int = MAX_ATTEMPTS):
+    """Queue a job and return it; an identical job still queued or running is
+    returned instead of a new one. Raises ValueError for unknown kinds."""
+    if kind not in HANDLERS:
+        raise ValueError(f"Unknown job kind: {kind!r}; choose from {', '.join(sorted(HANDLERS))}")
+    encoded = _encode_params(params or {})
+    job = (
+        db.query(models.Job)
+        .filter(models.Job.status.in_(ACTIVE), models.Job.kind == kind, models.Job.params == encoded)
+        .first()
+    )
+    if job is None:
+        job = models.Job(kind=kind, params=encoded, max_attempts=max_attempts)
+        db.add(job)
+        db.commit()
+        db.refresh(job)
+    start_workers()
+    _wake.set()
+    return job
+
+def get_job(db: Session, job_id: int):
+    return db.get(models.Job, job_id)
+
+def get_jobs(db: Session, status: str = None, skip: int = 0, limit: int = 100, cursor: str = None):
+    query = db.query(models.Job)
+    if status is not None:
+        query = query.filter(models.Job.status == status)
+    return crud.paginate(query, models.Job.id, skip=skip, limit=limit, cursor=cursor)
+
+def cancel(db: Session, job_id: int):
+    """Cancel a queued job at once, or ask a running one to stop at its next
+    progress report. Returns None if the job does not exist; raises ValueError
+    if it has already finished."""
+    job = db.get(models.Job, job_id)
+    if job is None:
+        return None
+    cancelled = db.execute(
+        update(models.Job)
+        .where(models.Job.id == job_id, models.Job.status == "queued")
+        .values(status="cancelled", finished_at=datetime.utcnow())
+    ).rowcount
+    if not cancelled:
+        requested = db.execute(
+            update(models.Job)
+            .where(models.Job.id == job_id, models.Job.status == "running")
+            .values(cancel_requested=True)
+        ).rowcount
+        if not requested:
+            db.rollback()
+            raise ValueError(f"Job {job_id} has already {job.status}")
+    db.commit()
+    db.refresh(job)
+    return job
+
+def retry(db: Session, job_id: int):
+    """Queue a failed or cancelled job again with a fresh set of attempts.
+    Returns None if the job does not exist; raises ValueError otherwise."""
+    job = db.get(models.Job, job_id)
+    if job is None:
+        return None
+    retried = db.execute(
+        update(models.Job)
+        .where(models.Job.id == job_id, models.Job.status.in_(("failed", "cancelled")))
+        .values(
+            status="queued", attempts=0, progress=0, total=None, result=None, error=None,
+            cancel_requested=False, run_after=datetime.utcnow(), started_at=None, finished_at=None,
+        )
+    ).rowcount
+    if not retried:
+        db.rollback()
+        raise ValueError(f"Only failed or cancelled jobs can be retried; job {job_id} is {job.status}")
+    db.commit()
+    db.refresh(job)
+    start_workers()
+    _wake.set()
+    return job
+
+# Workers
+_threads = []
+_lock = threading.Lock()
+_stopping = threading.Event()
+_wake = threading.Event()
+
+def _claim(worker: str):
+    """Take the oldest due job, or None. The conditional UPDATE makes sure only
+    one worker, in any process, gets it."""
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        job = conn.execute(
+            select(models.Job.__table__)
+            .where(models.Job.status == "queued", models.Job.run_after <= now)
+            .order_by(models.Job.id)
+            .limit(1)
+        ).first()
+        if job is None:
+            return None
+        claimed = conn.execute(
+            update(models.Job)
+            .where(models.Job.id == job.id, models.Job.status == "queued")
+            .values(
+                status="running", attempts=models.Job.attempts + 1, worker=worker,
+                started_at=now, heartbeat_at=now, cancel_requested=False,
+            )
+        ).rowcount
+    return job if claimed else None
+
+def _requeue_stale():
+    """Put back running jobs whose worker stopped reporting, e.g. after a crash"""
+    cutoff = datetime.utcnow() - timedelta(seconds=STALE_SECONDS)
+    with engine.begin() as conn:
+        requeued = conn.execute(
+            update(models.Job)
+            .where(models.Job.status == "running", models.Job.heartbeat_at < cutoff)
+            .values(status="queued", worker=None)
+        ).rowcount
+    if requeued:
+        logger.warning("Re-queued %d job(s) with a stale heartbeat", requeued)
+
+def _finish(job_id: int, **values):
+    with engine.begin() as conn:
+        conn.execute(update(models.Job).where(models.Job.id == job_id).values(**values))
+
+def _run(job):
+    attempts = job.attempts + 1
+    fn = HANDLERS.get(job.kind)
+    try:
+        if fn is None:
+            raise LookupError(f"No handler for job kind {job.kind!r}")
+        result = fn(RunningJob(job.id, _stopping), **json.loads(job.params))
+    except JobInterrupted:
+        # Not the job's fault, so the attempt does not count
+        _finish(job.id, status="queued", attempts=attempts - 1, worker=None)
+    except JobCancelled:
+        _finish(job.id, status="cancelled", finished_at=datetime.utcnow())
+    except Exception as e:
+        logger.exception("Job %d (%s) failed on attempt %d", job.id, job.kind, attempts)
+        error = f"{type(e).__name__}: {e}"[:1024]
+        if fn is not None and attempts < job.max_attempts:
+            delay = RETRY_DELAY_SECONDS * 2 ** (attempts - 1)
+            _finish(
+                job.id, status="queued", error=error, worker=None,
+                run_after=datetime.utcnow() + timedelta(seconds=delay),
+            )
+        else:
+            _finish(job.id, status="failed", error=error, finished_at=datetime.utcnow())
+    else:
+        _finish(
+            job.id, status="succeeded", error=None, finished_at=datetime.utcnow(),
+            progress=func.coalesce(models.Job.total, models.Job.progress),
+            result=json.dumps(result, default=str),
+        )
+
+def _work(worker: str):
+    last_stale_check = 0.0
+    while not _stopping.is_set():
+        job = None
+        try:
+            if time.monotonic() - last_stale_check >= 60:
+                last_stale_check = time.monotonic()
+                _requeue_stale()
+            job = _claim(worker)
+        except Exception:
+            logger.exception("Could not claim a job")
+        if job is None:
+            _wake.wait(POLL_SECONDS)
+            _wake.clear()
+            continue
+        _run(job)
+
+def start_workers(count: int = WORKERS):
+    """Start this process's worker threads, once"""
+    with _lock:
+        if _threads or count <= 0:
+            return
+        _stopping.clear()
+        for i in range(count):
+            thread = threading.Thread(
+                target=_work, args=(f"{os.getpid()}-{i}",), name=f"tracksite-jobs-{i}", daemon=True
+            )
+            thread.start()
+            _threads.append(thread)
+
+def stop_workers(timeout: float = 10.0):
+    """Stop the workers; jobs they are running go back to the queue at their
+    next progress report"""
+    with _lock:
+        _stopping.set()
+        _wake.set()
+        for thread in _threads:
+            thread.join(timeout)
+        _threads.clear()
+
+# Handlers
+@handler("delete_folder")
+def delete_folder(job: RunningJob, folder_id: int):
+    """Delete a folder, its subfolders and all their bookmarks in batches"""
+    db = SessionLocal()
+    try:
+        folder = db.get(models.Folder, folder_id)
+        if folder is None:
+            return {"deleted_bookmarks": 0}
+        job.progress(0, crud.count_subtree_bookmarks(db, folder))
+        deleted = crud.delete_subtree(db, folder, progress=job.progress)
+        return {"deleted_bookmarks": deleted}
+    finally:
+        db.close()
+
+@handler("backup")
+def backup_snapshot(job: RunningJob):
+    """Take an online snapshot of the database and uploads; progress is in MiB"""
+    manifest = backup.create_snapshot(progress=job.progress)
+    return {"name": manifest["name"], "seconds": manifest["seconds"], "bytes_copied": manifest["bytes_copied"]}
@@ -0,0 +1,154 @@
+# launcher.py
+
+"""Supervised launching of files and applications for the /open/ routes.
+
+Programs start as asyncio subprocesses, never through a shell, in their own
+session so they outlive the request. A semaphore caps launches in flight and
+MAX_RUNNING caps live children, so a burst of clicks cannot fork-bomb the host;
+clicking the same thing again while it is starting returns the existing launch.
+Every child gets a watcher task that reaps it, records its exit code and
+enforces its timeout.
+"""
+
+import asyncio
+import itertools
+import os
+import signal
+import subprocess
+import sys
+from collections import deque
+from datetime import datetime
+
+MAX_CONCURRENT_LAUNCHES = int(os.getenv("TRACKSITE_MAX_CONCURRENT_LAUNCHES", "4"))
+MAX_RUNNING = int(os.getenv("TRACKSITE_MAX_RUNNING_PROCESSES", "32"))
+
+# Seconds an application may run before it is terminated; 0 means no limit
+LAUNCH_TIMEOUT = float(os.getenv("TRACKSITE_LAUNCH_TIMEOUT", "0"))
+# The opener (open / xdg-open) only hands the file to the desktop and exits
+OPENER_TIMEOUT = float(os.getenv("TRACKSITE_OPENER_TIMEOUT", "30"))
+
+KILL_GRACE_SECONDS = 5.0
+DEBOUNCE_SECONDS = 2.0
+HISTORY_SIZE = 100
+
+if os.name == "posix":
+    SPAWN_OPTIONS = {"start_new_session": True}
+else:
+    SPAWN_OPTIONS = {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP}
+
+class LauncherBusy(Exception):
+    """Too many launched processes are still running"""
+
+class Launch:
+    """One launched process: running, then exited, timed_out or failed"""
+
+    def __init__(self, launch_id: int, argv, timeout: float = None):
+        self.id = launch_id
+        self.argv = argv
+        self.timeout = timeout
+        self.pid = None
+        self.status = "starting"
+        self.returncode = None
+        self.error = None
+        self.started_at = datetime.utcnow()
+        self.ended_at = None
+
+    def finish(self, status: str, returncode: int = None, error: str = None):
+        self.status = status
+        self.returncode = returncode
+        self.error = error
+        self.ended_at = datetime.utcnow()
+        running.pop(self.id, None)
+        finished.append(self)
+
+_ids = itertools.count(1)
+running = {}
+finished = deque(maxlen=HISTORY_SIZE)
+_watchers = set()
+_launch_slots = asyncio.Semaphore(MAX_CONCURRENT_LAUNCHES)
+
+def processes():
+    """Running launches, then recently finished ones, newest first"""
+    return sorted(running.values(), key=lambda launch: -launch.id) + list(reversed(finished))
+
+def _recent_duplicate(argv):
+    now = datetime.utcnow()
+    for launch in running.values():
+        if launch.argv == argv and (now - launch.started_at).total_seconds() < DEBOUNCE_SECONDS:
+            return launch
+    return None
+
+def _signal(process, sig):
+    try:
+        if os.name == "posix":
+            os.killpg(process.pid, sig)  # the whole session, so helpers go too
+        elif sig == signal.SIGTERM:
+            process.terminate()
+        else:
+            process.kill()
+    except ProcessLookupError:
+        pass
+
+async def _supervise(launch: Launch, process):
+    """Wait for the child (which reaps it) and stop it if it outlives its timeout"""
+    try:
+        returncode = await asyncio.wait_for(process.wait(), launch.timeout or None)
+        launch.finish("exited", returncode)
+    except asyncio.TimeoutError:
+        _signal(process, signal.SIGTERM)
+        try:
+            returncode = await asyncio.wait_for(process.wait(), KILL_GRACE_SECONDS)
+        except asyncio.TimeoutError:
+            _signal(process, getattr(signal, "SIGKILL", signal.SIGTERM))
+            returncode = await process.wait()
+        launch.finish("timed_out", returncode)
+
+async def launch(argv, timeout: float = None) -> Launch:
+    """Start argv without a shell and supervise it until it exits.
+
+    Raises LauncherBusy when MAX_RUNNING children are alive, and OSError when
+    the program cannot be started.
+    """
+    argv = [str(arg) for arg in argv]
+    existing = _recent_duplicate(argv)
+    if existing is not None:
+        return existing
+    if len(running) >= MAX_RUNNING:
+        raise LauncherBusy(f"{len(running)} launched processes are still running")
+
+    record = Launch(next(_ids), argv, timeout)
+    running[record.id] = record  # counts against MAX_RUNNING while it starts
+    try:
+        async with _launch_slots:
+            process = await asyncio.create_subprocess_exec(
+                *argv,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                **SPAWN_OPTIONS,
+            )
+    except OSError as e:
+        record.finish("failed", error=str(e))
+        raise
+    record.pid = process.pid
+    record.status = "running"
+    watcher = asyncio.get_running_loop().create_task(_supervise(record, process))
+    _watchers.add(watcher)
+    watcher.add_done_callback(_watchers.discard)
+    return record
+
+async def open_path(path) -> Launch:
+    """Open a file with the desktop's default application.
+
+    On Windows the file is handed to the shell with os.startfile, which gives
+    no process to track, so None is returned.
+    """
+    if os.name == "nt":
+        await asyncio.get_running_loop().run_in_executor(None, os.startfile, str(path))
+        return None
+    opener = "open" if sys.platform == "darwin" else "xdg-open"
+    return await launch([opener, path], timeout=OPENER_TIMEOUT)
+
+async def run_application(path, timeout: float = None) -> Launch:
+    """Execute a program directly, subject to LAUNCH_TIMEOUT unless timeout is given"""
+    return await launch([path], timeout=LAUNCH_TIMEOUT if timeout is None else timeout)
@@ -1,33 +1,61 @@
 # main.py
 
-from typing import List
-from fastapi import FastAPI, Depends, HTTPException, UploadFile, File, Form
-from fastapi.responses import FileResponse
+from contextlib import asynccontextmanager
+from typing import List, Literal, Optional, Union
+from fastapi import FastAPI, Depends, HTTPException, UploadFile, File, Form, Query, Request, Response
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.orm import Session
 import models
 import schemas
 import crud
-from database import SessionLocal, engine
+import bulk
+import search
+import storage
+import migrations
+import downloads
+import launcher
+import jobs
+import backup
+import visits
+import sync
+import metrics
+from cache import read_cache
+from database import SessionLocal, ReadSessionLocal, AsyncSessionLocal, engine
 from fastapi.middleware.cors import CORSMiddleware
 import os
-import shutil
 from pathlib import Path
 from pydantic import BaseModel
-import uuid
 
-models.Base.metadata.create_all(bind=engine)
+def startup():
+    """Once per worker, before it serves requests. Migrations take a lock, so
+    when several workers boot together one applies them and the rest wait."""
+    storage.ensure_dirs()
+    migrations.upgrade(engine)
 
-app = FastAPI(title="Tracksite API", version="1.0.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await run_in_threadpool(startup)
+    # Pick up jobs left queued by a previous run; submitting also starts them
+    jobs.start_workers()
+    visits.buffer.start()
+    sync.pruner.start()
+    app.state.ready = True
+    yield
+    app.state.ready = False
+    await run_in_threadpool(sync.pruner.stop)
+    await run_in_threadpool(jobs.stop_workers)
+    await run_in_threadpool(visits.buffer.stop)  # writes out buffered visits
 
-# Create upload directories
-UPLOAD_DIR = Path("uploads")
-FILES_DIR = UPLOAD_DIR / "files"
-APPLICATIONS_DIR = UPLOAD_DIR / "applications"
+app = FastAPI(title="Tracksite API", version="1.0.0", lifespan=lifespan)
+app.state.ready = False
 
-# Ensure directories exist
-UPLOAD_DIR.mkdir(exist_ok=True)
-FILES_DIR.mkdir(exist_ok=True)
-APPLICATIONS_DIR.mkdir(exist_ok=True)
+# Upload directories
+FILES_DIR = storage.FILES_DIR
+APPLICATIONS_DIR = storage.APPLICATIONS_DIR
 
 origins = [
     "http://localhost:3000", 
@@ -39,8 +67,12 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag", "Content-Range", "Server-Timing"],
 )
 
+# Outermost, so latency includes CORS handling and preflight requests are counted
+app.add_middleware(metrics.MetricsMiddleware)
+
 def get_db():
     db = SessionLocal()
     try:
@@ -48,59 +80,428 @@ def get_db():
     finally:
         db.close()
 
+def get_read_db():
+    """Session for read-only routes, on the read replica when one is configured"""
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+def paged(response: Response, page):
+    """Unpack a (rows, next_cursor) page, advertising the cursor in a header"""
+    rows, next_cursor = page
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return rows
+
+def fetch_page(fetch, *args, **kwargs):
+    try:
+        return fetch(*args, **kwargs)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def cached_read(request: Request, fetch, db: Session, *args, not_found: str = None, **kwargs):
+    """Serve a cached JSON read, or a 304 after a single generation lookup when
+    the client's copy is still current"""
+    etag = read_cache.etag(db)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and downloads.etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    body, next_cursor = fetch_page(fetch, db, *args, **kwargs)
+    if not_found and body == b"null":
+        raise HTTPException(status_code=404, detail=not_found)
+    if next_cursor:
+        headers["X-Next-Cursor"] = next_cursor
+    return Response(body, media_type="application/json", headers=headers)
+
 @app.get("/")
 def read_root():
     return {"message": "Welcome to Tracksite API"}
 
+@app.get("/ready", include_in_schema=False)
+def read_readiness(db: Session = Depends(get_db)):
+    """200 once startup has finished and the database answers, 503 otherwise"""
+    if not app.state.ready:
+        raise HTTPException(status_code=503, detail="Starting up")
+    try:
+        db.execute(text("SELECT 1"))
+    except DBAPIError:
+        raise HTTPException(status_code=503, detail="Database unavailable")
+    return {"status": "ready"}
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def read_metrics():
+    """Request latency, status and SQL counters in Prometheus text format"""
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
+
 @app.post("/folders/", response_model=schemas.Folder)
 def create_folder(folder: schemas.FolderCreate, db: Session = Depends(get_db)):
-    db_folder = crud.get_folder_by_name(db, name=folder.name)
+    db_folder = crud.get_folder_by_name(db, name=folder.name, parent_id=folder.parent_id)
     if db_folder:
         raise HTTPException(status_code=400, detail="Folder already exists")
-    return crud.create_folder(db=db, folder=folder)
+    try:
+        return crud.create_folder(db=db, folder=folder)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-@app.get("/folders/", response_model=List[schemas.Folder])
-def read_folders(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    folders = crud.get_folders(db, skip=skip, limit=limit)
-    return folders
+@app.get("/folders/", response_model=Union[List[schemas.Folder], List[schemas.FolderSummary]])
+def read_folders(
+    request: Request,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    view: Literal["full", "summary"] = "full",
+    fields: Optional[str] = None,
+    db: Session = Depends(get_read_db)
+):
+    """List folders; fields=id,name,... returns only those fields"""
+    fetch = crud.get_folder_summaries_json if view == "summary" else crud.get_folders_json
+    return cached_read(request, fetch, db, skip=skip, limit=limit, cursor=cursor, fields=fields)
 
 @app.get("/folders/{folder_id}", response_model=schemas.Folder)
-def read_folder(folder_id: int, db: Session = Depends(get_db)):
-    folder = crud.get_folder(db, folder_id)
-    if folder is None:
+def read_folder(folder_id: int, request: Request, db: Session = Depends(get_read_db)):
+    return cached_read(request, crud.get_folder_json, db, folder_id, not_found="Folder not found")
+
+@app.get("/folders/{folder_id}/tree", response_model=schemas.FolderTree)
+def read_folder_tree(folder_id: int, request: Request, db: Session = Depends(get_read_db)):
+    """The folder and all its subfolders with bookmark counts, per folder and in total"""
+    return cached_read(request, crud.get_folder_tree_json, db, folder_id, not_found="Folder not found")
+
+@app.get("/folders/{folder_id}/tree/bookmarks", response_model=List[schemas.Bookmark])
+def read_folder_tree_bookmarks(
+    folder_id: int,
+    request: Request,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    db: Session = Depends(get_read_db)
+):
+    """Bookmarks in the folder or any of its subfolders"""
+    return cached_read(
+        request, crud.get_subtree_bookmarks_json, db,
+        folder_id=folder_id, skip=skip, limit=limit, cursor=cursor, fields=fields,
+        not_found="Folder not found"
+    )
+
+@app.post("/folders/{folder_id}/move", response_model=schemas.Folder)
+def move_folder(folder_id: int, move: schemas.FolderMove, db: Session = Depends(get_db)):
+    """Move a folder and everything in it under another folder, or to the root"""
+    try:
+        db_folder = crud.move_folder(db, folder_id, move.parent_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if db_folder is None:
         raise HTTPException(status_code=404, detail="Folder not found")
-    return folder
+    return db_folder
+
+def job_accepted(job):
+    """202 response for work handed to the job queue"""
+    body = schemas.Job.model_validate(job).model_dump(mode="json")
+    return JSONResponse(body, status_code=202, headers={"Location": f"/jobs/{job.id}"})
 
-@app.delete("/folders/{folder_id}", response_model=schemas.Folder)
+@app.delete(
+    "/folders/{folder_id}", response_model=schemas.Folder, responses={202: {"model": schemas.Job}}
+)
 def delete_folder(folder_id: int, db: Session = Depends(get_db)):
-    db_folder = crud.delete_folder(db, folder_id)
+    """Delete a folder together with its subfolders and all their bookmarks.
+
+    Folders holding more than TRACKSITE_INLINE_DELETE_LIMIT bookmarks are
+    deleted by a background job; the response is then 202 with the job.
+    """
+    db_folder = db.get(models.Folder, folder_id)
     if db_folder is None:
         raise HTTPException(status_code=404, detail="Folder not found")
-    return db_folder
+    if crud.count_subtree_bookmarks(db, db_folder) > jobs.INLINE_DELETE_LIMIT:
+        return job_accepted(jobs.submit(db, "delete_folder", {"folder_id": folder_id}))
+    return crud.delete_folder(db, folder_id)
 
 @app.get("/bookmarks/", response_model=List[schemas.Bookmark])
-def read_bookmarks(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    bookmarks = crud.get_bookmarks(db, skip=skip, limit=limit)
-    return bookmarks
+def read_bookmarks(
+    request: Request,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    tags: Optional[str] = None,
+    mode: Literal["all", "any"] = "all",
+    db: Session = Depends(get_read_db)
+):
+    """List bookmarks; fields=id,title,url returns only those fields, and
+    tags=a,b only bookmarks tagged with all (or, with mode=any, any) of them"""
+    return cached_read(
+        request, crud.get_bookmarks_json, db,
+        skip=skip, limit=limit, cursor=cursor, fields=fields, tags=tags, mode=mode
+    )
+
+@app.post("/bookmarks/import", response_model=schemas.ImportReport)
+def import_bookmarks(
+    file: UploadFile = File(...),
+    format: Optional[Literal["ndjson", "html"]] = Form(None),
+    db: Session = Depends(get_db)
+):
+    """Bulk-import bookmarks from NDJSON or a Netscape bookmarks.html export"""
+    if format is None:
+        is_html = Path(file.filename or "").suffix.lower() in (".html", ".htm")
+        format = "html" if is_html else "ndjson"
+    if format == "html":
+        records = bulk.iter_netscape_html(file.file)
+    else:
+        records = bulk.iter_ndjson(file.file)
+    return bulk.import_bookmarks(db, records)
+
+@app.post("/bookmarks/batch", response_model=schemas.BatchReport)
+def batch_bookmarks(batch: schemas.BatchRequest, db: Session = Depends(get_db)):
+    """Apply create, update, move and delete operations in order, in one transaction"""
+    try:
+        results = crud.apply_batch(db, batch.operations)
+    except crud.BatchError as e:
+        raise HTTPException(status_code=400, detail={"index": e.index, "error": str(e)})
+    return {"results": results}
+
+@app.get("/bookmarks/export")
+def export_bookmarks(format: Literal["ndjson", "html"] = "ndjson"):
+    """Stream every bookmark as NDJSON or as a Netscape bookmarks.html file"""
+    if format == "html":
+        exporter, media_type, filename = bulk.export_netscape_html, "text/html", "bookmarks.html"
+    else:
+        exporter, media_type, filename = bulk.export_ndjson, "application/x-ndjson", "bookmarks.ndjson"
+
+    # The request-scoped session is closed before the body streams, so the
+    # generator owns its own session.
+    def stream():
+        db = ReadSessionLocal()
+        try:
+            yield from exporter(db)
+        finally:
+            db.close()
+
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+    return StreamingResponse(stream(), media_type=media_type, headers=headers)
+
+@app.get("/bookmarks/duplicates", response_model=List[schemas.DuplicateGroup])
+def read_duplicates(
+    request: Request,
+    url: Optional[str] = None,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_read_db)
+):
+    """Groups of bookmarks whose URLs normalize to the same address, or url's group"""
+    return cached_read(request, crud.get_duplicates_json, db, url=url, skip=skip, limit=limit, cursor=cursor)
+
+@app.get("/bookmarks/top", response_model=List[schemas.VisitedBookmark])
+def read_top_bookmarks(folder_id: Optional[int] = None, limit: int = 20, db: Session = Depends(get_read_db)):
+    """Most used bookmarks, ranked by frecency: visits count for less as they age"""
+    return Response(visits.get_top(db, folder_id=folder_id, limit=limit), media_type="application/json")
+
+@app.get("/bookmarks/recent", response_model=List[schemas.VisitedBookmark])
+def read_recent_bookmarks(folder_id: Optional[int] = None, limit: int = 20, db: Session = Depends(get_read_db)):
+    """Most recently opened bookmarks"""
+    return Response(visits.get_recent(db, folder_id=folder_id, limit=limit), media_type="application/json")
+
+@app.post("/bookmarks/{bookmark_id}/visit", status_code=204)
+def visit_bookmark(bookmark_id: int, db: Session = Depends(get_read_db)):
+    """Count a visit; it is written to the database within TRACKSITE_VISIT_FLUSH_SECONDS"""
+    if db.get(models.Bookmark, bookmark_id) is None:
+        raise HTTPException(status_code=404, detail="Bookmark not found")
+    visits.buffer.record(bookmark_id)
+    return Response(status_code=204)
 
 @app.get("/bookmarks/{bookmark_id}", response_model=schemas.Bookmark)
-def read_bookmark(bookmark_id: int, db: Session = Depends(get_db)):
+def read_bookmark(bookmark_id: int, db: Session = Depends(get_read_db)):
     bookmark = crud.get_bookmark(db, bookmark_id)
     if bookmark is None:
         raise HTTPException(status_code=404, detail="Bookmark not found")
     return bookmark
 
+@app.get("/bookmarks/{bookmark_id}/tags", response_model=List[str])
+def read_bookmark_tags(bookmark_id: int, db: Session = Depends(get_read_db)):
+    tags = crud.get_bookmark_tags(db, bookmark_id)
+    if tags is None:
+        raise HTTPException(status_code=404, detail="Bookmark not found")
+    return tags
+
+@app.put("/bookmarks/{bookmark_id}/tags", response_model=List[str])
+def update_bookmark_tags(bookmark_id: int, body: schemas.TagList, db: Session = Depends(get_db)):
+    """Replace a bookmark's tags"""
+    try:
+        tags = crud.set_bookmark_tags(db, bookmark_id, body.tags)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if tags is None:
+        raise HTTPException(status_code=404, detail="Bookmark not found")
+    return tags
+
+@app.get("/tags/", response_model=List[schemas.TagCount])
+def read_tag_facets(
+    request: Request,
+    tags: Optional[str] = None,
+    mode: Literal["all", "any"] = "all",
+    folder_id: Optional[int] = None,
+    limit: int = 100,
+    db: Session = Depends(get_read_db)
+):
+    """Tag counts over the bookmarks matching tags/mode/folder_id, most used first"""
+    return cached_read(
+        request, crud.get_tag_facets_json, db, tags=tags, mode=mode, folder_id=folder_id, limit=limit
+    )
+
 @app.get("/folders/{folder_id}/bookmarks/", response_model=List[schemas.Bookmark])
-def read_bookmarks_by_folder(folder_id: int, db: Session = Depends(get_db)):
-    bookmarks = crud.get_bookmarks_by_folder(db, folder_id=folder_id)
-    return bookmarks
+def read_bookmarks_by_folder(
+    folder_id: int,
+    request: Request,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    db: Session = Depends(get_read_db)
+):
+    return cached_read(
+        request, crud.get_bookmarks_by_folder_json, db,
+        folder_id=folder_id, skip=skip, limit=limit, cursor=cursor, fields=fields
+    )
+
+@app.post("/jobs/", response_model=schemas.Job, status_code=202)
+def submit_job(body: schemas.JobCreate, db: Session = Depends(get_db)):
+    """Queue a background job; an identical job that is still pending is returned instead"""
+    try:
+        return job_accepted(jobs.submit(db, body.kind, body.params))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/jobs/", response_model=List[schemas.Job])
+def read_jobs(
+    response: Response,
+    status: Optional[Literal["queued", "running", "succeeded", "failed", "cancelled"]] = None,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    return paged(response, fetch_page(jobs.get_jobs, db, status=status, skip=skip, limit=limit, cursor=cursor))
+
+@app.get("/jobs/{job_id}", response_model=schemas.Job)
+def read_job(job_id: int, db: Session = Depends(get_db)):
+    """A job's status and progress (done out of total, when known)"""
+    job = jobs.get_job(db, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.post("/jobs/{job_id}/cancel", response_model=schemas.Job)
+def cancel_job(job_id: int, db: Session = Depends(get_db)):
+    """Cancel a queued job, or ask a running one to stop at its next checkpoint"""
+    try:
+        job = jobs.cancel(db, job_id)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.post("/jobs/{job_id}/retry", response_model=schemas.Job)
+def retry_job(job_id: int, db: Session = Depends(get_db)):
+    """Run a failed or cancelled job again"""
+    try:
+        job = jobs.retry(db, job_id)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.post("/admin/backups", response_model=schemas.Job, status_code=202)
+def create_backup(db: Session = Depends(get_db)):
+    """Snapshot the database and uploads in the background, without blocking
+    writers; restore with `python -m backup restore` while the server is stopped"""
+    return job_accepted(jobs.submit(db, "backup"))
+
+@app.get("/admin/backups", response_model=List[schemas.Backup])
+def read_backups():
+    """Complete snapshots, newest first"""
+    return backup.list_snapshots()
+
+@app.get("/sync", response_model=schemas.SyncResult)
+def sync_changes(
+    since: Optional[int] = Query(None, ge=0),
+    limit: int = sync.MAX_SYNC_CHANGES,
+    db: Session = Depends(get_read_db)
+):
+    """Folders and bookmarks changed after version since, plus ids deleted since then"""
+    try:
+        return sync.get_changes(db, since, limit=limit)
+    except sync.SyncExpired as e:
+        raise HTTPException(status_code=410, detail=str(e))
+
+@app.get("/search", response_model=List[schemas.SearchResult])
+def search_bookmarks(
+    response: Response,
+    q: str = Query(..., min_length=1),
+    folder_id: Optional[int] = None,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_read_db)
+):
+    """Full-text search over bookmark titles and URLs, best matches first"""
+    results = paged(response, fetch_page(
+        search.search_bookmarks, db, q, folder_id=folder_id, limit=limit, cursor=cursor
+    ))
+    return results
+
+@app.post("/links/check", response_model=schemas.CrawlStatus, status_code=202)
+async def start_link_check(folder_id: Optional[int] = None, stale_hours: Optional[float] = None):
+    """Check bookmark links in the background: all, one folder, or those not checked recently"""
+    import crawler  # imported on first use: it pulls in httpx, which slows startup
+    if not crawler.start_crawl(folder_id, stale_hours):
+        raise HTTPException(status_code=409, detail="A link check is already running")
+    return crawler.progress
+
+@app.get("/links/check", response_model=schemas.CrawlStatus)
+async def read_link_check():
+    """Progress of the current or last link check in this process"""
+    import crawler
+    return crawler.progress
+
+@app.get("/links/dead", response_model=List[schemas.DeadLink])
+def read_dead_links(
+    response: Response,
+    folder_id: Optional[int] = None,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_read_db)
+):
+    """Bookmarks whose last link check found them dead"""
+    import crawler
+    return paged(response, fetch_page(
+        crawler.get_dead_links, db, folder_id=folder_id, skip=skip, limit=limit, cursor=cursor
+    ))
 
 @app.post("/bookmarks/", response_model=schemas.Bookmark)
-def create_bookmark(bookmark: schemas.BookmarkCreate, db: Session = Depends(get_db)):
+def create_bookmark(
+    bookmark: schemas.BookmarkCreate,
+    on_duplicate: Literal["create", "return", "reject"] = "create",
+    db: Session = Depends(get_db)
+):
+    """Create a bookmark; on_duplicate=return|reject looks for the same normalized URL first"""
     if bookmark.folder_id:
         folder = crud.get_folder(db, folder_id=bookmark.folder_id)
         if folder is None:
             raise HTTPException(status_code=400, detail="Folder not found")
+    if on_duplicate != "create":
+        existing = crud.find_duplicate(db, bookmark.url)
+        if existing is not None:
+            if on_duplicate == "reject":
+                raise HTTPException(status_code=409, detail={"error": "Duplicate URL", "id": existing.id})
+            return existing
     db_bookmark = crud.create_bookmark(db=db, bookmark=bookmark)
     return db_bookmark
 
@@ -123,18 +524,15 @@ def delete_bookmark(bookmark_id: int, db: Session = Depends(get_db)):
 async def upload_file(
     file: UploadFile = File(...),
     title: str = Form(...),
-    folder_id: int = Form(None)
+    folder_id: int = Form(None),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Upload a file and create a bookmark for it"""
     try:
-        # Generate unique filename to avoid conflicts
-        file_extension = Path(file.filename).suffix
-        unique_filename = f"{uuid.uuid4()}_{file.filename}"
-        
-        # Save file
-        file_path = FILES_DIR / unique_filename
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        # Store the content once by hash and link it under a unique filename
+        sha256, size, file_path = await run_in_threadpool(
+            storage.store_upload, file.file, FILES_DIR, file.filename
+        )
         
         # Create bookmark with file:// URL
         file_url = f"file://{file_path.absolute()}"
@@ -146,12 +544,11 @@ async def upload_file(
             folder_id=folder_id
         )
         
-        db = next(get_db())
-        db_bookmark = crud.create_bookmark(db=db, bookmark=bookmark_data)
+        db_bookmark = await crud.create_upload_bookmark_async(db, bookmark_data, sha256, size)
         
         return {
             "message": "File uploaded successfully",
-            "bookmark": db_bookmark,
+            "bookmark": schemas.Bookmark.model_validate(db_bookmark),
             "file_path": str(file_path),
             "original_filename": file.filename
         }
@@ -162,21 +559,16 @@ async def upload_file(
 async def upload_application(
     app_file: UploadFile = File(...),
     title: str = Form(...),
-    folder_id: int = Form(None)
+    folder_id: int = Form(None),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Upload an application and create a bookmark for it"""
     try:
-        # Generate unique filename to avoid conflicts
-        file_extension = Path(app_file.filename).suffix
-        unique_filename = f"{uuid.uuid4()}_{app_file.filename}"
-        
-        # Save application
-        app_path = APPLICATIONS_DIR / unique_filename
-        with open(app_path, "wb") as buffer:
-            shutil.copyfileobj(app_file.file, buffer)
-        
-        # Make executable on Unix systems
-        os.chmod(app_path, 0o755)
+        # Store the content once by hash, link it under a unique filename
+        # and make it executable on Unix systems
+        sha256, size, app_path = await run_in_threadpool(
+            storage.store_upload, app_file.file, APPLICATIONS_DIR, app_file.filename, 0o755
+        )
         
         # Create bookmark with app:// URL
         app_url = f"app://{app_path.absolute()}"
@@ -188,12 +580,11 @@ async def upload_application(
             folder_id=folder_id
         )
         
-        db = next(get_db())
-        db_bookmark = crud.create_bookmark(db=db, bookmark=bookmark_data)
+        db_bookmark = await crud.create_upload_bookmark_async(db, bookmark_data, sha256, size)
         
         return {
             "message": "Application uploaded successfully",
-            "bookmark": db_bookmark,
+            "bookmark": schemas.Bookmark.model_validate(db_bookmark),
             "app_path": str(app_path),
             "original_filename": app_file.filename
         }
@@ -201,8 +592,8 @@ async def upload_application(
         raise HTTPException(status_code=500, detail=f"Application upload failed: {str(e)}")
 
 @app.get("/files/{filename}")
-async def download_file(filename: str):
-    """Download a file"""
+async def download_file(filename: str, request: Request, db: AsyncSession = Depends(get_async_db)):
+    """Download a file, with conditional GET and byte-range support"""
     file_path = FILES_DIR / filename
     if not file_path.exists():
         raise HTTPException(status_code=404, detail="File not found")
@@ -210,11 +601,12 @@ async def download_file(filename: str):
     # Extract original filename from the stored filename
     original_filename = filename.split('_', 1)[1] if '_' in filename else filename
     
-    return FileResponse(file_path, filename=original_filename)
+    sha256 = await crud.get_blob_sha256_by_url_async(db, f"file://{file_path.absolute()}")
+    return await downloads.file_response(request, file_path, original_filename, sha256=sha256)
 
 @app.get("/applications/{filename}")
-async def download_application(filename: str):
-    """Download an application"""
+async def download_application(filename: str, request: Request, db: AsyncSession = Depends(get_async_db)):
+    """Download an application, with conditional GET and byte-range support"""
     app_path = APPLICATIONS_DIR / filename
     if not app_path.exists():
         raise HTTPException(status_code=404, detail="Application not found")
@@ -222,81 +614,82 @@ async def download_application(filename: str):
     # Extract original filename from the stored filename
     original_filename = filename.split('_', 1)[1] if '_' in filename else filename
     
-    return FileResponse(app_path, filename=original_filename)
+    sha256 = await crud.get_blob_sha256_by_url_async(db, f"app://{app_path.absolute()}")
+    return await downloads.file_response(request, app_path, original_filename, sha256=sha256)
+
+def launch_response(launch, message: str):
+    return {
+        "success": True,
+        "message": message,
+        "process": None if launch is None else schemas.ProcessInfo.model_validate(launch),
+    }
+
+async def open_with_launcher(start, *args, **kwargs):
+    """Run a launcher call, mapping its failures onto HTTP errors"""
+    try:
+        return await start(*args, **kwargs)
+    except launcher.LauncherBusy as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    except OSError as e:
+        raise HTTPException(status_code=500, detail=f"Failed to launch: {e}")
+
+async def record_open(db: AsyncSession, url: str):
+    """Count opening an upload as a visit to its bookmark, if it has one"""
+    bookmark_id = await crud.get_bookmark_id_by_url_async(db, url)
+    if bookmark_id is not None:
+        visits.buffer.record(bookmark_id)
+
+@app.get("/processes", response_model=List[schemas.ProcessInfo])
+async def read_processes():
+    """Processes started by the /open/ routes: running ones, then recently finished"""
+    return launcher.processes()
 
 @app.post("/open/file/{filename}")
-async def open_file(filename: str):
+async def open_file(filename: str, db: AsyncSession = Depends(get_async_db)):
     """Open a file with the system default application"""
     file_path = FILES_DIR / filename
     if not file_path.exists():
         raise HTTPException(status_code=404, detail="File not found")
-    
-    try:
-        # Open file with system default application
-        if os.name == 'nt':  # Windows
-            os.startfile(str(file_path))
-        else:  # macOS/Linux
-            os.system(f'open "{file_path}"')
-        return {"success": True, "message": f"Opening file: {filename}"}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to open file: {str(e)}")
+    launch = await open_with_launcher(launcher.open_path, file_path)
+    await record_open(db, f"file://{file_path.absolute()}")
+    return launch_response(launch, f"Opening file: {filename}")
 
 @app.post("/open/application/{filename}")
-async def open_application(filename: str):
+async def open_application(
+    filename: str, timeout: Optional[float] = None, db: AsyncSession = Depends(get_async_db)
+):
     """Execute an application"""
     app_path = APPLICATIONS_DIR / filename
     if not app_path.exists():
         raise HTTPException(status_code=404, detail="Application not found")
-    
-    try:
-        # Execute application
-        if os.name == 'nt':  # Windows
-            os.startfile(str(app_path))
-        else:  # macOS/Linux
-            os.system(f'"{app_path}" &')
-        return {"success": True, "message": f"Launching application: {filename}"}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to launch application: {str(e)}")
+    launch = await open_with_launcher(launcher.run_application, app_path, timeout=timeout)
+    await record_open(db, f"app://{app_path.absolute()}")
+    return launch_response(launch, f"Launching application: {filename}")
 
 class FilePathRequest(BaseModel):
     file_path: str
 
 class AppPathRequest(BaseModel):
     app_path: str
+    timeout: Optional[float] = None
 
 @app.post("/open/file-by-path/")
-async def open_file_by_path(request: FilePathRequest):
+async def open_file_by_path(request: FilePathRequest, db: AsyncSession = Depends(get_async_db)):
     """Open a file by its full path with the system default application"""
-    try:
-        file_path = request.file_path
-        if not os.path.exists(file_path):
-            raise HTTPException(status_code=404, detail="File not found")
-        
-        # Open file with system default application
-        if os.name == 'nt':  # Windows
-            os.startfile(file_path)
-        else:  # macOS/Linux
-            os.system(f'open "{file_path}"')
-        return {"success": True, "message": f"Opening file: {file_path}"}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to open file: {str(e)}")
+    if not os.path.exists(request.file_path):
+        raise HTTPException(status_code=404, detail="File not found")
+    launch = await open_with_launcher(launcher.open_path, request.file_path)
+    await record_open(db, f"file://{Path(request.file_path).absolute()}")
+    return launch_response(launch, f"Opening file: {request.file_path}")
 
 @app.post("/open/application-by-path/")
-async def open_application_by_path(request: AppPathRequest):
+async def open_application_by_path(request: AppPathRequest, db: AsyncSession = Depends(get_async_db)):
     """Execute an application by its full path"""
-    try:
-        app_path = request.app_path
-        if not os.path.exists(app_path):
-            raise HTTPException(status_code=404, detail="Application not found")
-        
-        # Execute application
-        if os.name == 'nt':  # Windows
-            os.startfile(app_path)
-        else:  # macOS/Linux
-            os.system(f'"{app_path}" &')
-        return {"success": True, "message": f"Launching application: {app_path}"}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to launch application: {str(e)}")
+    if not os.path.exists(request.app_path):
+        raise HTTPException(status_code=404, detail="Application not found")
+    launch = await open_with_launcher(launcher.run_application, request.app_path, timeout=request.timeout)
+    await record_open(db, f"app://{Path(request.app_path).absolute()}")
+    return launch_response(launch, f"Launching application: {request.app_path}")
 
 if __name__ == "__main__":
     import uvicorn
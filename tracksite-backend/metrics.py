@@ -0,0 +1,190 @@
+# metrics.py
+
+import bisect
+import contextvars
+import logging
+import os
+import threading
+import time
+from collections import defaultdict, deque
+
+from sqlalchemy import event
+
+# Queries slower than this are logged with their parameters and route
+SLOW_QUERY_SECONDS = float(os.getenv("TRACKSITE_SLOW_QUERY_MS", "200")) / 1000
+
+# Add a Server-Timing header (db time, query count, total time) to responses
+SERVER_TIMING = os.getenv("TRACKSITE_SERVER_TIMING", "").lower() in ("1", "true", "yes")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+MAX_LOGGED_PARAMS = 500
+
+# Latencies of the last RECENT_REQUESTS requests are kept, for background work
+# (see backup.py) that backs off when live requests slow down
+RECENT_REQUESTS = 2048
+RECENT_WINDOW_SECONDS = 10.0
+
+slow_query_log = logging.getLogger("tracksite.slow_query")
+
+class RequestStats:
+    __slots__ = ("scope", "queries", "db_seconds")
+
+    def __init__(self, scope):
+        self.scope = scope
+        self.queries = 0
+        self.db_seconds = 0.0
+
+    @property
+    def route(self) -> str:
+        """Path template of the matched route, set on the scope by the router"""
+        return getattr(self.scope.get("route"), "path", None) or "unmatched"
+
+current_request = contextvars.ContextVar("current_request", default=None)
+
+class Registry:
+    """Per-process counters and latency histograms, rendered for Prometheus"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = defaultdict(int)                        # (method, route, status)
+        self.latency = defaultdict(lambda: [0] * (len(LATENCY_BUCKETS) + 1))  # (method, route)
+        self.latency_sum = defaultdict(float)
+        self.queries = defaultdict(int)                         # route
+        self.db_seconds = defaultdict(float)
+        self.slow_queries = defaultdict(int)
+        self.recent = deque(maxlen=RECENT_REQUESTS)             # (finished at, seconds)
+
+    def observe_request(self, method: str, route: str, status: int, seconds: float, stats: RequestStats):
+        bucket = bisect.bisect_left(LATENCY_BUCKETS, seconds)
+        with self._lock:
+            self.requests[(method, route, status)] += 1
+            self.latency[(method, route)][bucket] += 1
+            self.latency_sum[(method, route)] += seconds
+            self.queries[route] += stats.queries
+            self.db_seconds[route] += stats.db_seconds
+            self.recent.append((time.monotonic(), seconds))
+
+    def observe_slow_query(self, route: str):
+        with self._lock:
+            self.slow_queries[route] += 1
+
+    def recent_latency(self, quantile: float = 0.95, window: float = RECENT_WINDOW_SECONDS):
+        """Latency quantile of requests finished in the last window seconds, or
+        None if there were none"""
+        cutoff = time.monotonic() - window
+        with self._lock:
+            latencies = sorted(seconds for finished, seconds in self.recent if finished >= cutoff)
+        if not latencies:
+            return None
+        return latencies[min(len(latencies) - 1, int(quantile * len(latencies)))]
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            lines += [
+                "# HELP tracksite_http_requests_total HTTP requests by route and status.",
+                "# TYPE tracksite_http_requests_total counter",
+            ]
+            for (method, route, status), count in sorted(self.requests.items()):
+                lines.append(f'tracksite_http_requests_total{{method="{method}",route="{route}",status="{status}"}} {count}')
+
+            lines += [
+                "# HELP tracksite_http_request_duration_seconds HTTP request latency.",
+                "# TYPE tracksite_http_request_duration_seconds histogram",
+            ]
+            for (method, route), buckets in sorted(self.latency.items()):
+                labels = f'method="{method}",route="{route}"'
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS + ("+Inf",), buckets):
+                    cumulative += count
+                    lines.append(f'tracksite_http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f"tracksite_http_request_duration_seconds_sum{{{labels}}} {self.latency_sum[(method, route)]:.6f}")
+                lines.append(f"tracksite_http_request_duration_seconds_count{{{labels}}} {cumulative}")
+
+            for name, help_text, values in (
+                ("tracksite_db_queries_total", "SQL statements executed, by route.", self.queries),
+                ("tracksite_db_query_duration_seconds_total", "Time spent in SQL statements, by route.", self.db_seconds),
+                ("tracksite_db_slow_queries_total", "SQL statements slower than the slow-query threshold.", self.slow_queries),
+            ):
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+                for route, value in sorted(values.items()):
+                    lines.append(f'{name}{{route="{route}"}} {value:g}' if isinstance(value, float) else f'{name}{{route="{route}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+def _statement_finished(conn, statement, parameters):
+    """Pop the statement's start time and record it against the current request"""
+    elapsed = time.perf_counter() - conn.info["query_start"].pop()
+    stats = current_request.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_seconds += elapsed
+    if elapsed >= SLOW_QUERY_SECONDS:
+        route = stats.route if stats is not None else "-"
+        registry.observe_slow_query(route)
+        slow_query_log.warning(
+            "Slow query (%.1f ms) on %s: %s; parameters: %.*r",
+            elapsed * 1000, route, " ".join(statement.split()), MAX_LOGGED_PARAMS, parameters,
+        )
+
+def instrument_engine(sync_engine):
+    """Count and time every statement on the engine against the current request"""
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        _statement_finished(conn, statement, parameters)
+
+    # A statement that raises never reaches after_cursor_execute; without this
+    # its start time would stay on the connection's stack for good
+    @event.listens_for(sync_engine, "handle_error")
+    def handle_error(exception_context):
+        conn = exception_context.connection
+        if conn is not None and conn.info.get("query_start"):
+            _statement_finished(conn, exception_context.statement or "", exception_context.parameters)
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency, status and SQL cost per route.
+
+    Routes are labelled by their path template, so label cardinality stays
+    bounded. Implemented at the ASGI level to avoid BaseHTTPMiddleware's extra
+    task and buffering on every request.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats(scope)
+        token = current_request.set(stats)
+        started = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if SERVER_TIMING:
+                    total_ms = (time.perf_counter() - started) * 1000
+                    header = (
+                        f'db;dur={stats.db_seconds * 1000:.2f};desc="{stats.queries} queries", '
+                        f"app;dur={total_ms:.2f}"
+                    )
+                    message.setdefault("headers", [])
+                    message["headers"] = list(message["headers"]) + [(b"server-timing", header.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            registry.observe_request(scope["method"], stats.route, status, time.perf_counter() - started, stats)
+            current_request.reset(token)
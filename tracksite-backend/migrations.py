@@ -0,0 +1,204 @@
+# migrations.py
+
+import hashlib
+import logging
+import os
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from sqlalchemy import bindparam, insert, inspect, select, text, update
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.schema import CreateIndex, CreateTable
+import models, search, sync, tagging, urls, visits
+
+BACKFILL_BATCH_SIZE = 5000
+
+LOCK_NAME = "tracksite_migrations"
+LOCK_TIMEOUT_SECONDS = int(os.getenv("TRACKSITE_MIGRATION_LOCK_TIMEOUT", "300"))
+
+logger = logging.getLogger("tracksite.migrations")
+
+def add_missing_columns(conn):
+    """ALTER existing tables to add model columns that create_all cannot add"""
+    inspector = inspect(conn)
+    existing_tables = set(inspector.get_table_names())
+    for table in models.Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing:
+                column_type = column.type.compile(dialect=conn.dialect)
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+
+def drop_unique_folder_names(conn):
+    """Folder names used to be unique across the database; with nesting they are
+    unique among siblings only (ux_folders_path_name). Drop the old index."""
+    for index in inspect(conn).get_indexes("folders"):
+        if index.get("unique") and index["column_names"] == ["name"]:
+            if conn.dialect.name == "mysql":
+                conn.execute(text(f"ALTER TABLE folders DROP INDEX {index['name']}"))
+            else:
+                conn.execute(text(f"DROP INDEX {index['name']}"))
+
+def backfill_url_hashes(engine):
+    """Hash the URLs of bookmarks written before url_hash existed, one batch per transaction"""
+    bookmarks = models.Bookmark.__table__
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(
+                select(bookmarks.c.id, bookmarks.c.url)
+                .where(bookmarks.c.url_hash.is_(None), bookmarks.c.url.isnot(None))
+                .limit(BACKFILL_BATCH_SIZE)
+            ).all()
+            if not rows:
+                return
+            conn.execute(
+                update(bookmarks).where(bookmarks.c.id == bindparam("row_id")).values(url_hash=bindparam("hash")),
+                [{"row_id": row.id, "hash": urls.url_hash(row.url)} for row in rows],
+            )
+
+# Versioned migrations. Each runs once per database, in version order, and is
+# recorded in schema_migrations. All of them are idempotent, so databases set up
+# before versioning existed simply run them once more. Never renumber; append.
+MIGRATIONS = []
+
+def migration(version: int, name: str):
+    def register(fn):
+        MIGRATIONS.append((version, name, fn))
+        MIGRATIONS.sort(key=lambda entry: entry[0])
+        return fn
+    return register
+
+@migration(1, "url_hashes")
+def _url_hashes(engine):
+    backfill_url_hashes(engine)
+
+@migration(2, "nested_folders")
+def _nested_folders(engine):
+    with engine.begin() as conn:
+        # Folders from before nesting become root folders
+        conn.execute(update(models.Folder.__table__).where(models.Folder.path.is_(None)).values(path="/"))
+        drop_unique_folder_names(conn)
+        for index in models.Folder.__table__.indexes:
+            index.create(conn, checkfirst=True)
+
+@migration(3, "search_index")
+def _search_index(engine):
+    search.ensure_search_index(engine)
+
+@migration(4, "change_log")
+def _change_log(engine):
+    sync.ensure_change_log(engine)
+
+@migration(5, "tag_cleanup")
+def _tag_cleanup(engine):
+    tagging.ensure_tag_cleanup(engine)
+
+@migration(6, "visit_cleanup")
+def _visit_cleanup(engine):
+    visits.ensure_visit_cleanup(engine)
+
+@migration(7, "tag_change_log")
+def _tag_change_log(engine):
+    sync.ensure_change_log(engine)  # adds the bookmark_tags triggers
+
+def schema_fingerprint(dialect) -> str:
+    """Hash of the DDL models.py would emit, so model changes are noticed at boot"""
+    digest = hashlib.sha256()
+    for table in sorted(models.Base.metadata.sorted_tables, key=lambda table: table.name):
+        digest.update(str(CreateTable(table).compile(dialect=dialect)).encode())
+        for index in sorted(table.indexes, key=lambda index: index.name):
+            digest.update(str(CreateIndex(index).compile(dialect=dialect)).encode())
+    return digest.hexdigest()
+
+def sync_models(engine):
+    """Create missing tables, columns and indexes for models.py"""
+    models.Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        add_missing_columns(conn)
+        # create_all skips indexes on tables that already exist
+        for table in models.Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
+
+def _pending(engine):
+    """(models_changed, pending migrations), both as cheap reads; everything is
+    pending while the bookkeeping tables do not exist yet"""
+    fingerprint = schema_fingerprint(engine.dialect)
+    try:
+        with engine.connect() as conn:
+            stored = conn.scalar(select(models.SchemaState.fingerprint).where(models.SchemaState.id == 1))
+            applied = set(conn.scalars(select(models.SchemaMigration.version)))
+    except DBAPIError:
+        return True, list(MIGRATIONS)
+    return stored != fingerprint, [entry for entry in MIGRATIONS if entry[0] not in applied]
+
+@contextmanager
+def migration_lock(engine):
+    """Hold a lock that only one process at a time can take: an advisory lock on
+    MySQL, a lock file next to the database on SQLite"""
+    if engine.dialect.name == "mysql":
+        with engine.connect() as conn:
+            acquired = conn.scalar(text("SELECT GET_LOCK(:name, :timeout)"), {"name": LOCK_NAME, "timeout": LOCK_TIMEOUT_SECONDS})
+            if acquired != 1:
+                raise TimeoutError(f"Could not take the {LOCK_NAME} lock within {LOCK_TIMEOUT_SECONDS}s")
+            try:
+                yield
+            finally:
+                conn.scalar(text("SELECT RELEASE_LOCK(:name)"), {"name": LOCK_NAME})
+        return
+    database = engine.url.database if engine.dialect.name == "sqlite" else None
+    if not database or database == ":memory:":
+        yield  # a private database, nobody to race with
+        return
+    with open(f"{database}.migrate.lock", "a+b") as lock_file:
+        if os.name == "nt":
+            import msvcrt
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if os.name == "nt":
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+def upgrade(engine) -> bool:
+    """Bring the database up to date with models.py and MIGRATIONS.
+
+    Safe to call from every worker at boot: an up-to-date database costs two
+    small SELECTs, and otherwise the first worker to take the migration lock
+    does the work while the others wait and then find nothing left to do.
+    Returns True if this call changed anything.
+    """
+    models_changed, pending = _pending(engine)
+    if not models_changed and not pending:
+        return False
+    with migration_lock(engine):
+        models_changed, pending = _pending(engine)
+        if not models_changed and not pending:
+            return False
+        if models_changed:
+            sync_models(engine)
+        for version, name, fn in pending:
+            started = time.perf_counter()
+            fn(engine)
+            with engine.begin() as conn:
+                conn.execute(insert(models.SchemaMigration).values(version=version, name=name, applied_at=datetime.utcnow()))
+            logger.info("Applied migration %d (%s) in %.2fs", version, name, time.perf_counter() - started)
+        if models_changed:
+            fingerprint = schema_fingerprint(engine.dialect)
+            with engine.begin() as conn:
+                updated = conn.execute(
+                    update(models.SchemaState).where(models.SchemaState.id == 1)
+                    .values(fingerprint=fingerprint, updated_at=datetime.utcnow())
+                ).rowcount
+                if not updated:
+                    conn.execute(insert(models.SchemaState).values(id=1, fingerprint=fingerprint, updated_at=datetime.utcnow()))
+    return True
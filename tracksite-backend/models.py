@@ -1,9 +1,10 @@
 # models.py
 
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Index, BigInteger, Boolean, Float, Text
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.declarative import declarative_base
 from datetime import datetime
+import urls
 
 Base = declarative_base()
 
@@ -11,16 +12,154 @@ class Folder(Base):
     __tablename__ = 'folders'
 
     id = Column(Integer, primary_key=True, index=True)
-    name = Column(String(255), unique=True, index=True)
+    name = Column(String(255), index=True)
+    parent_id = Column(Integer, ForeignKey('folders.id'), nullable=True, index=True)
+    # Materialized path: the ids of the folder's ancestors, root first. "/" for a
+    # root folder, "/1/5/" for a child of 5 inside 1. A folder's descendants are
+    # exactly the paths starting with f"{path}{id}/", one range scan on the index
+    # below (see crud.subtree_filter).
+    path = Column(String(512), nullable=False, default="/")
     created_at = Column(DateTime, default=datetime.utcnow)
     bookmarks = relationship("Bookmark", back_populates="folder", cascade="all, delete")
 
+    __table_args__ = (
+        # Names are unique among siblings; also serves subtree range scans on path
+        Index("ux_folders_path_name", "path", "name", unique=True),
+    )
+
+def _hash_url(context):
+    url = context.get_current_parameters().get("url")
+    return urls.url_hash(url) if url else None
+
 class Bookmark(Base):
     __tablename__ = 'bookmarks'
 
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String(255))
-    url = Column(String(255), index=True)  # Removed unique constraint
+    url = Column(String(2048))  # Removed unique constraint; looked up through url_hash
+    # SHA-256 of the normalized URL, filled in on every insert (bulk ones too);
+    # updates that change url must set it, see crud.py
+    url_hash = Column(String(64), default=_hash_url, index=True, nullable=True)
     folder_id = Column(Integer, ForeignKey('folders.id'))
     created_at = Column(DateTime, default=datetime.utcnow)
+    blob_sha256 = Column(String(64), ForeignKey('blobs.sha256'), index=True, nullable=True)
     folder = relationship("Folder", back_populates="bookmarks")
+
+    __table_args__ = (
+        # Keyset pagination within a folder: WHERE folder_id = ? AND id > ? ORDER BY id
+        Index("ix_bookmarks_folder_id_id", "folder_id", "id"),
+    )
+
+class Blob(Base):
+    """Uploaded file content, stored once under its SHA-256 and reference counted"""
+    __tablename__ = 'blobs'
+
+    sha256 = Column(String(64), primary_key=True)
+    size = Column(BigInteger, nullable=False)
+    ref_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class LinkStatus(Base):
+    """Outcome of the last link check for a bookmark, written by crawler.py"""
+    __tablename__ = 'link_status'
+
+    bookmark_id = Column(Integer, ForeignKey('bookmarks.id', ondelete='CASCADE'), primary_key=True)
+    status_code = Column(Integer, nullable=True)
+    final_url = Column(String(2048), nullable=True)
+    fetched_title = Column(String(255), nullable=True)
+    etag = Column(String(255), nullable=True)
+    last_modified = Column(String(64), nullable=True)
+    error = Column(String(255), nullable=True)
+    dead = Column(Boolean, nullable=False, default=False, index=True)
+    last_checked = Column(DateTime, nullable=False, index=True)
+
+class Change(Base):
+    """One insert, update or delete of a folder or bookmark, written by triggers (see sync.py)"""
+    __tablename__ = 'changes'
+
+    version = Column(Integer, primary_key=True, autoincrement=True)
+    entity = Column(String(16), nullable=False)
+    entity_id = Column(Integer, nullable=False)
+    changed_at = Column(DateTime, nullable=False, index=True)
+
+    # AUTOINCREMENT, so SQLite never hands out a version twice
+    __table_args__ = {"sqlite_autoincrement": True}
+
+class SyncState(Base):
+    """Single row recording how far the change log has been pruned"""
+    __tablename__ = 'sync_state'
+
+    id = Column(Integer, primary_key=True)
+    pruned_through = Column(Integer, nullable=False, default=0)
+
+class Tag(Base):
+    """A tag name, shared by every bookmark that carries it"""
+    __tablename__ = 'tags'
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String(64), unique=True, nullable=False)  # normalized, see tagging.py
+
+class BookmarkTag(Base):
+    """Junction between bookmarks and tags"""
+    __tablename__ = 'bookmark_tags'
+
+    bookmark_id = Column(Integer, ForeignKey('bookmarks.id', ondelete='CASCADE'), primary_key=True)
+    tag_id = Column(Integer, ForeignKey('tags.id', ondelete='CASCADE'), primary_key=True)
+
+    __table_args__ = (
+        # The primary key (bookmark_id, tag_id) finds a bookmark's tags; this
+        # finds a tag's bookmarks in id order, for tag filters and facet counts
+        Index("ix_bookmark_tags_tag_id_bookmark_id", "tag_id", "bookmark_id"),
+    )
+
+class BookmarkVisit(Base):
+    """How often and how recently a bookmark was opened, written in batches by visits.py"""
+    __tablename__ = 'bookmark_visits'
+
+    bookmark_id = Column(Integer, ForeignKey('bookmarks.id', ondelete='CASCADE'), primary_key=True)
+    visit_count = Column(Integer, nullable=False, default=0)
+    last_visited_at = Column(DateTime, nullable=False, index=True)
+    frecency = Column(Float, nullable=False, default=0.0, index=True)
+
+class Job(Base):
+    """A background job: queued in this table, run by the workers in jobs.py"""
+    __tablename__ = 'jobs'
+
+    id = Column(Integer, primary_key=True)
+    kind = Column(String(64), nullable=False)
+    params = Column(Text, nullable=False, default="{}")  # JSON
+    status = Column(String(16), nullable=False, default="queued")  # queued, running, succeeded, failed, cancelled
+    progress = Column(Integer, nullable=False, default=0)
+    total = Column(Integer, nullable=True)
+    result = Column(Text, nullable=True)  # JSON
+    error = Column(String(1024), nullable=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=3)
+    cancel_requested = Column(Boolean, nullable=False, default=False)
+    worker = Column(String(64), nullable=True)
+    run_after = Column(DateTime, nullable=False, default=datetime.utcnow)
+    heartbeat_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        # Claiming: WHERE status = 'queued' AND run_after <= now ORDER BY id
+        Index("ix_jobs_status_run_after", "status", "run_after"),
+    )
+
+class SchemaMigration(Base):
+    """A migration from migrations.MIGRATIONS that has been applied"""
+    __tablename__ = 'schema_migrations'
+
+    version = Column(Integer, primary_key=True, autoincrement=False)
+    name = Column(String(128), nullable=False)
+    applied_at = Column(DateTime, nullable=False)
+
+class SchemaState(Base):
+    """Single row holding the fingerprint of the models the schema was last synced to"""
+    __tablename__ = 'schema_state'
+
+    id = Column(Integer, primary_key=True)
+    fingerprint = Column(String(64), nullable=False)
+    updated_at = Column(DateTime, nullable=False)
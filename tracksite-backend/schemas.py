@@ -1,7 +1,8 @@
 # schemas.py
 
-from pydantic import BaseModel
-from typing import List, Optional
+from pydantic import BaseModel, Field, Json
+from typing import Any, Dict, List, Literal, Optional, Union
+from typing_extensions import Annotated
 from datetime import datetime
 
 class BookmarkBase(BaseModel):
@@ -15,20 +16,192 @@ class Bookmark(BookmarkBase):
     id: int
     folder_id: Optional[int]
     created_at: datetime
+    blob_sha256: Optional[str] = None
 
     class Config:
          from_attributes = True
 
+class DuplicateGroup(BaseModel):
+    url_hash: str
+    normalized_url: str
+    count: int
+    bookmarks: List[Bookmark]
+
+class TagList(BaseModel):
+    tags: List[str]
+
+class TagCount(BaseModel):
+    name: str
+    count: int
+
+    class Config:
+        from_attributes = True
+
 class FolderBase(BaseModel):
     name: str
 
 class FolderCreate(FolderBase):
-    pass
+    parent_id: Optional[int] = None  # None creates a root folder
 
 class Folder(FolderBase):
     id: int
+    parent_id: Optional[int] = None
+    path: str = "/"
     created_at: datetime
     bookmarks: List[Bookmark] = []
 
     class Config:
         from_attributes = True
+
+class FolderSummary(FolderBase):
+    id: int
+    parent_id: Optional[int] = None
+    path: str = "/"
+    created_at: datetime
+    bookmark_count: int
+
+    class Config:
+        from_attributes = True
+
+class FolderMove(BaseModel):
+    parent_id: Optional[int] = None  # None makes it a root folder
+
+class FolderTree(BaseModel):
+    id: int
+    bookmark_count: int  # in the whole subtree
+    folders: List[FolderSummary]  # the folder and its descendants, in tree order
+
+class ImportRecordError(BaseModel):
+    line: Optional[int]
+    error: str
+
+class ImportReport(BaseModel):
+    created: int
+    folders_created: int
+    failed: int
+    errors: List[ImportRecordError] = []
+
+class SearchResult(Bookmark):
+    search_rank: float
+
+# Batch mutations: POST /bookmarks/batch applies these in order, in one transaction
+
+MAX_BATCH_OPERATIONS = 1000
+MAX_BATCH_IDS = 10000
+
+class BatchCreate(BookmarkCreate):
+    op: Literal["create"]
+
+class BatchUpdate(BookmarkCreate):
+    op: Literal["update"]
+    id: int
+
+class BatchMove(BaseModel):
+    op: Literal["move"]
+    ids: List[int] = Field(..., min_length=1, max_length=MAX_BATCH_IDS)
+    folder_id: Optional[int] = None
+
+class BatchDelete(BaseModel):
+    op: Literal["delete"]
+    ids: List[int] = Field(..., min_length=1, max_length=MAX_BATCH_IDS)
+
+BatchOperation = Annotated[Union[BatchCreate, BatchUpdate, BatchMove, BatchDelete], Field(discriminator="op")]
+
+class BatchRequest(BaseModel):
+    operations: List[BatchOperation] = Field(..., min_length=1, max_length=MAX_BATCH_OPERATIONS)
+
+class BatchResult(BaseModel):
+    index: int
+    op: str
+    ids: List[int] = []
+    missing: List[int] = []
+    bookmark: Optional[Bookmark] = None
+
+class BatchReport(BaseModel):
+    results: List[BatchResult]
+
+class DeadLink(Bookmark):
+    status_code: Optional[int]
+    final_url: Optional[str]
+    fetched_title: Optional[str]
+    error: Optional[str]
+    last_checked: datetime
+
+class VisitedBookmark(Bookmark):
+    visit_count: int
+    last_visited_at: datetime
+
+class CrawlStatus(BaseModel):
+    running: bool
+    started_at: Optional[datetime]
+    finished_at: Optional[datetime]
+    total: int
+    checked: int
+    unchanged: int
+    dead: int
+    error: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
+class ProcessInfo(BaseModel):
+    id: int
+    pid: Optional[int]
+    argv: List[str]
+    status: str
+    returncode: Optional[int]
+    error: Optional[str]
+    started_at: datetime
+    ended_at: Optional[datetime]
+
+    class Config:
+        from_attributes = True
+
+class JobCreate(BaseModel):
+    kind: str
+    params: Dict[str, Any] = {}
+
+class Job(BaseModel):
+    id: int
+    kind: str
+    params: Json[Any]
+    status: str
+    progress: int
+    total: Optional[int] = None
+    result: Optional[Json[Any]] = None
+    error: Optional[str] = None
+    attempts: int
+    max_attempts: int
+    cancel_requested: bool
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+class Backup(BaseModel):
+    """A snapshot's manifest (see backup.py)"""
+    name: str
+    created_at: datetime
+    dialect: str
+    seconds: float
+    throttled_seconds: float
+    bytes_copied: int
+    previous: Optional[str] = None
+    database: Dict[str, Any]
+    uploads: Dict[str, int]
+
+class FolderInfo(FolderBase):
+    id: int
+    parent_id: Optional[int] = None
+    path: str = "/"
+    created_at: datetime
+
+class SyncResult(BaseModel):
+    version: int
+    more: bool
+    folders: List[FolderInfo] = []
+    bookmarks: List[Bookmark] = []
+    deleted_folders: List[int] = []
+    deleted_bookmarks: List[int] = []
@@ -0,0 +1,124 @@
+# search.py
+
+import re
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+import crud
+
+# Title matches count for more than URL matches when ranking
+TITLE_WEIGHT = 10.0
+URL_WEIGHT = 1.0
+
+MYSQL_FULLTEXT_INDEX = "ft_bookmarks_title_url"
+
+# External-content FTS5 table over bookmarks(title, url), kept in step by triggers
+# so every write path (crud, bulk import, raw SQL) updates it incrementally.
+SQLITE_FTS_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS bookmarks_fts
+    USING fts5(title, url, content='bookmarks', content_rowid='id')
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS bookmarks_fts_ai AFTER INSERT ON bookmarks BEGIN
+        INSERT INTO bookmarks_fts(rowid, title, url) VALUES (new.id, new.title, new.url);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS bookmarks_fts_ad AFTER DELETE ON bookmarks BEGIN
+        INSERT INTO bookmarks_fts(bookmarks_fts, rowid, title, url)
+        VALUES ('delete', old.id, old.title, old.url);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS bookmarks_fts_au AFTER UPDATE OF title, url ON bookmarks BEGIN
+        INSERT INTO bookmarks_fts(bookmarks_fts, rowid, title, url)
+        VALUES ('delete', old.id, old.title, old.url);
+        INSERT INTO bookmarks_fts(rowid, title, url) VALUES (new.id, new.title, new.url);
+    END
+    """,
+]
+
+def ensure_search_index(engine):
+    """Create the full-text index for the engine's dialect if it is missing"""
+    with engine.begin() as conn:
+        dialect = conn.dialect.name
+        if dialect == "sqlite":
+            exists = conn.execute(text(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'bookmarks_fts'"
+            )).first()
+            for statement in SQLITE_FTS_DDL:
+                conn.execute(text(statement))
+            if not exists:
+                # Index rows that were written before the table existed
+                conn.execute(text("INSERT INTO bookmarks_fts(bookmarks_fts) VALUES ('rebuild')"))
+        elif dialect == "mysql":
+            exists = conn.execute(
+                text("SHOW INDEX FROM bookmarks WHERE Key_name = :name"),
+                {"name": MYSQL_FULLTEXT_INDEX},
+            ).first()
+            if not exists:
+                conn.execute(text(
+                    f"CREATE FULLTEXT INDEX {MYSQL_FULLTEXT_INDEX} ON bookmarks (title, url)"
+                ))
+
+def _terms(q: str):
+    return [term for term in q.split() if re.search(r"\w", term)]
+
+def _fts5_query(terms):
+    # Quote every term so user input can never be parsed as FTS5 syntax, and
+    # prefix-match the last one for search-as-you-type.
+    quoted = ['"' + term.replace('"', '""') + '"' for term in terms]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+def search_bookmarks(db: Session, q: str, folder_id: int = None, limit: int = 100, cursor: str = None):
+    """Return (rows, next_cursor) of bookmarks matching q, best match first.
+
+    Rows carry the bookmark columns plus a search_rank where lower is better
+    (bm25 on SQLite, negated MATCH relevance on MySQL). Pages are keyed on
+    (search_rank, id).
+    """
+    terms = _terms(q)
+    if not terms:
+        return [], None
+    limit = max(1, min(limit, crud.MAX_PAGE_SIZE))
+    params = {"limit": limit + 1}
+
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        params["q"] = _fts5_query(terms)
+        params.update(title_weight=TITLE_WEIGHT, url_weight=URL_WEIGHT)
+        inner = """
+            SELECT b.id, b.title, b.url, b.folder_id, b.created_at, b.blob_sha256,
+                   bm25(bookmarks_fts, :title_weight, :url_weight) AS search_rank
+            FROM bookmarks_fts JOIN bookmarks b ON b.id = bookmarks_fts.rowid
+            WHERE bookmarks_fts MATCH :q
+        """
+    elif dialect == "mysql":
+        params["q"] = " ".join(terms)
+        inner = """
+            SELECT b.id, b.title, b.url, b.folder_id, b.created_at, b.blob_sha256,
+                   -MATCH (b.title, b.url) AGAINST (:q IN NATURAL LANGUAGE MODE) AS search_rank
+            FROM bookmarks b
+            WHERE MATCH (b.title, b.url) AGAINST (:q IN NATURAL LANGUAGE MODE)
+        """
+    else:
+        raise NotImplementedError(f"Full-text search is not supported on {dialect}")
+
+    if folder_id is not None:
+        inner += " AND b.folder_id = :folder_id"
+        params["folder_id"] = folder_id
+
+    outer = f"SELECT * FROM ({inner}) AS matches"
+    if cursor is not None:
+        last_rank, last_id = crud.decode_cursor(cursor, arity=2)
+        outer += " WHERE search_rank > :last_rank OR (search_rank = :last_rank AND id > :last_id)"
+        params.update(last_rank=float(last_rank), last_id=int(last_id))
+    outer += " ORDER BY search_rank, id LIMIT :limit"
+
+    rows = db.execute(text(outer), params).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = crud.encode_cursor(rows[-1].search_rank, rows[-1].id)
+    return rows, next_cursor
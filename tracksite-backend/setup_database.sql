@@ -5,10 +5,22 @@
 CREATE DATABASE IF NOT EXISTS tracksite_db;
 USE tracksite_db;
 
--- Create the folders table
+-- Create the folders table. path holds the ancestor ids ("/1/5/"); binary
+-- collation keeps '/' sorting before '0' for subtree range scans
 CREATE TABLE IF NOT EXISTS folders (
     id INT AUTO_INCREMENT PRIMARY KEY,
-    name VARCHAR(255) NOT NULL UNIQUE,
+    name VARCHAR(255) NOT NULL,
+    parent_id INT NULL,
+    path VARCHAR(512) CHARACTER SET ascii COLLATE ascii_bin NOT NULL DEFAULT '/',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (parent_id) REFERENCES folders(id)
+);
+
+-- Create the blobs table (uploaded content, stored once per SHA-256)
+CREATE TABLE IF NOT EXISTS blobs (
+    sha256 CHAR(64) PRIMARY KEY,
+    size BIGINT NOT NULL,
+    ref_count INT NOT NULL DEFAULT 0,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
@@ -17,15 +29,129 @@ CREATE TABLE IF NOT EXISTS bookmarks (
     id INT AUTO_INCREMENT PRIMARY KEY,
     title VARCHAR(255) NOT NULL,
     url VARCHAR(2048) NOT NULL,
+    url_hash CHAR(64),
     folder_id INT,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    FOREIGN KEY (folder_id) REFERENCES folders(id) ON DELETE CASCADE
+    blob_sha256 CHAR(64),
+    FOREIGN KEY (folder_id) REFERENCES folders(id) ON DELETE CASCADE,
+    FOREIGN KEY (blob_sha256) REFERENCES blobs(sha256)
+);
+
+-- Create the tags table and the bookmark_tags junction (many-to-many)
+CREATE TABLE IF NOT EXISTS tags (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    name VARCHAR(64) NOT NULL UNIQUE
+);
+
+CREATE TABLE IF NOT EXISTS bookmark_tags (
+    bookmark_id INT NOT NULL,
+    tag_id INT NOT NULL,
+    PRIMARY KEY (bookmark_id, tag_id),
+    FOREIGN KEY (bookmark_id) REFERENCES bookmarks(id) ON DELETE CASCADE,
+    FOREIGN KEY (tag_id) REFERENCES tags(id) ON DELETE CASCADE
+);
+
+-- Create the bookmark_visits table (visit counts, written in batches by visits.py)
+CREATE TABLE IF NOT EXISTS bookmark_visits (
+    bookmark_id INT PRIMARY KEY,
+    visit_count INT NOT NULL DEFAULT 0,
+    last_visited_at DATETIME NOT NULL,
+    frecency DOUBLE NOT NULL DEFAULT 0,
+    FOREIGN KEY (bookmark_id) REFERENCES bookmarks(id) ON DELETE CASCADE
+);
+
+-- Create the jobs table (background job queue, see jobs.py)
+CREATE TABLE IF NOT EXISTS jobs (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    kind VARCHAR(64) NOT NULL,
+    params TEXT NOT NULL,
+    status VARCHAR(16) NOT NULL DEFAULT 'queued',
+    progress INT NOT NULL DEFAULT 0,
+    total INT NULL,
+    result TEXT NULL,
+    error VARCHAR(1024) NULL,
+    attempts INT NOT NULL DEFAULT 0,
+    max_attempts INT NOT NULL DEFAULT 3,
+    cancel_requested BOOLEAN NOT NULL DEFAULT FALSE,
+    worker VARCHAR(64) NULL,
+    run_after DATETIME NOT NULL,
+    heartbeat_at DATETIME NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    started_at DATETIME NULL,
+    finished_at DATETIME NULL
+);
+
+-- Migration bookkeeping (see migrations.py)
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    version INT PRIMARY KEY,
+    name VARCHAR(128) NOT NULL,
+    applied_at DATETIME NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS schema_state (
+    id INT PRIMARY KEY,
+    fingerprint VARCHAR(64) NOT NULL,
+    updated_at DATETIME NOT NULL
+);
+
+-- Create the link_status table (last link check per bookmark, see crawler.py)
+CREATE TABLE IF NOT EXISTS link_status (
+    bookmark_id INT PRIMARY KEY,
+    status_code INT NULL,
+    final_url VARCHAR(2048) NULL,
+    fetched_title VARCHAR(255) NULL,
+    etag VARCHAR(255) NULL,
+    last_modified VARCHAR(64) NULL,
+    error VARCHAR(255) NULL,
+    dead BOOLEAN NOT NULL DEFAULT FALSE,
+    last_checked DATETIME NOT NULL,
+    FOREIGN KEY (bookmark_id) REFERENCES bookmarks(id) ON DELETE CASCADE
 );
 
+-- Change log for GET /sync: one row per insert, update or delete, written by triggers (see sync.py)
+CREATE TABLE IF NOT EXISTS changes (
+    version INT AUTO_INCREMENT PRIMARY KEY,
+    entity VARCHAR(16) NOT NULL,
+    entity_id INT NOT NULL,
+    changed_at DATETIME NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS sync_state (
+    id INT PRIMARY KEY,
+    pruned_through INT NOT NULL DEFAULT 0
+);
+
+CREATE TRIGGER folders_changes_i AFTER INSERT ON folders FOR EACH ROW
+    INSERT INTO changes (entity, entity_id, changed_at) VALUES ('folder', NEW.id, UTC_TIMESTAMP());
+CREATE TRIGGER folders_changes_u AFTER UPDATE ON folders FOR EACH ROW
+    INSERT INTO changes (entity, entity_id, changed_at) VALUES ('folder', NEW.id, UTC_TIMESTAMP());
+CREATE TRIGGER folders_changes_d AFTER DELETE ON folders FOR EACH ROW
+    INSERT INTO changes (entity, entity_id, changed_at) VALUES ('folder', OLD.id, UTC_TIMESTAMP());
+CREATE TRIGGER bookmarks_changes_i AFTER INSERT ON bookmarks FOR EACH ROW
+    INSERT INTO changes (entity, entity_id, changed_at) VALUES ('bookmark', NEW.id, UTC_TIMESTAMP());
+CREATE TRIGGER bookmarks_changes_u AFTER UPDATE ON bookmarks FOR EACH ROW
+    INSERT INTO changes (entity, entity_id, changed_at) VALUES ('bookmark', NEW.id, UTC_TIMESTAMP());
+CREATE TRIGGER bookmarks_changes_d AFTER DELETE ON bookmarks FOR EACH ROW
+    INSERT INTO changes (entity, entity_id, changed_at) VALUES ('bookmark', OLD.id, UTC_TIMESTAMP());
+
 -- Create indexes for better performance
 CREATE INDEX idx_folders_name ON folders(name);
-CREATE INDEX idx_bookmarks_url ON bookmarks(url);
-CREATE INDEX idx_bookmarks_folder ON bookmarks(folder_id);
+CREATE INDEX idx_folders_parent ON folders(parent_id);
+-- Folder names are unique among siblings; also serves subtree scans on path
+CREATE UNIQUE INDEX ux_folders_path_name ON folders(path, name);
+CREATE INDEX idx_bookmarks_url_hash ON bookmarks(url_hash);
+CREATE INDEX idx_bookmarks_folder ON bookmarks(folder_id, id);
+CREATE INDEX idx_bookmarks_blob ON bookmarks(blob_sha256);
+CREATE INDEX idx_bookmark_tags_tag ON bookmark_tags(tag_id, bookmark_id);
+CREATE INDEX idx_link_status_dead ON link_status(dead);
+CREATE INDEX idx_link_status_checked ON link_status(last_checked);
+CREATE INDEX idx_changes_changed_at ON changes(changed_at);
+CREATE INDEX idx_bookmark_visits_last_visited ON bookmark_visits(last_visited_at);
+CREATE INDEX idx_bookmark_visits_frecency ON bookmark_visits(frecency);
+CREATE INDEX idx_jobs_status_run_after ON jobs(status, run_after);
+
+-- Full-text index used by GET /search
+CREATE FULLTEXT INDEX ft_bookmarks_title_url ON bookmarks(title, url);
 
 -- Insert some sample data (optional)
 INSERT INTO folders (name) VALUES 
@@ -0,0 +1,106 @@
+# storage.py
+
+import hashlib
+import os
+import shutil
+import tempfile
+import uuid
+from pathlib import Path
+from urllib.parse import urlparse
+
+UPLOAD_DIR = Path("uploads")
+FILES_DIR = UPLOAD_DIR / "files"
+APPLICATIONS_DIR = UPLOAD_DIR / "applications"
+BLOBS_DIR = UPLOAD_DIR / "blobs"
+
+CHUNK_SIZE = 1024 * 1024
+
+def ensure_dirs():
+    for directory in (UPLOAD_DIR, FILES_DIR, APPLICATIONS_DIR, BLOBS_DIR):
+        directory.mkdir(exist_ok=True)
+
+def blob_path(sha256: str) -> Path:
+    return BLOBS_DIR / sha256[:2] / sha256
+
+def write_temp_blob(src):
+    """Stream src into a temp file in fixed-size chunks, hashing as it goes.
+
+    Returns (sha256, size, temp_path). The temp file lives in BLOBS_DIR so
+    that promoting it to its content address is an atomic rename.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    fd, temp_path = tempfile.mkstemp(dir=BLOBS_DIR, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = src.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                size += len(chunk)
+                out.write(chunk)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+    return digest.hexdigest(), size, Path(temp_path)
+
+def commit_blob(temp_path: Path, sha256: str) -> Path:
+    """Move a temp file to its content address, or drop it if already stored"""
+    path = blob_path(sha256)
+    if path.exists():
+        temp_path.unlink()
+    else:
+        path.parent.mkdir(exist_ok=True)
+        os.replace(temp_path, path)
+    return path
+
+def link_blob(sha256: str, directory: Path, filename: str, mode: int = None) -> Path:
+    """Expose a blob under a unique upload name without copying its bytes.
+
+    Hardlinks keep the existing uploads/files/{uuid}_{name} paths, and every
+    route built on them, working while the data is stored once. Filesystems
+    without hardlink support fall back to a copy.
+    """
+    dest = directory / f"{uuid.uuid4()}_{Path(filename).name}"
+    try:
+        os.link(blob_path(sha256), dest)
+    except OSError:
+        shutil.copyfile(blob_path(sha256), dest)
+    if mode is not None:
+        os.chmod(dest, mode)
+    return dest
+
+def store_upload(src, directory: Path, filename: str, mode: int = None):
+    """Save an upload by content address and link it into directory.
+
+    Returns (sha256, size, link_path). Blocking, so run it in the threadpool.
+    """
+    sha256, size, temp_path = write_temp_blob(src)
+    commit_blob(temp_path, sha256)
+    return sha256, size, link_blob(sha256, directory, filename, mode)
+
+def path_from_url(url: str):
+    """Return the local path of a file:// or app:// bookmark URL, if any"""
+    parsed = urlparse(url or "")
+    if parsed.scheme not in ("file", "app"):
+        return None
+    return Path(parsed.netloc + parsed.path)
+
+def unlink_quietly(path: Path):
+    try:
+        path.unlink()
+    except FileNotFoundError:
+        pass
+
+def remove_upload(url: str, orphaned_blobs=()):
+    """Remove a deleted upload's link and any blobs no bookmark references"""
+    path = path_from_url(url)
+    if path is not None:
+        unlink_quietly(path)
+    for sha256 in orphaned_blobs:
+        unlink_quietly(blob_path(sha256))
+        try:
+            blob_path(sha256).parent.rmdir()
+        except OSError:
+            pass  # still holds other blobs
@@ -0,0 +1,191 @@
+# sync.py
+
+import logging
+import os
+import threading
+from datetime import datetime, timedelta
+from sqlalchemy import delete, func, insert, select, text, update
+from sqlalchemy.orm import Session
+import models, schemas
+from database import engine
+
+# How long deletes (and every other change) stay in the log. Clients that last
+# synced before that get 410 and must reload everything.
+RETENTION_DAYS = float(os.getenv("TRACKSITE_SYNC_RETENTION_DAYS", "30"))
+PRUNE_INTERVAL_SECONDS = 3600
+PRUNE_BATCH_SIZE = 10000
+MAX_SYNC_CHANGES = 5000
+
+logger = logging.getLogger("tracksite.sync")
+
+# Tracked tables, with the entity their changes are logged under and the column
+# holding its id. A bookmark's tags count as part of the bookmark.
+TRACKED_TABLES = {
+    "folders": ("folder", "id"),
+    "bookmarks": ("bookmark", "id"),
+    "bookmark_tags": ("bookmark", "bookmark_id"),
+}
+
+# Row triggers log every write, whatever path it takes: ORM flushes (including
+# Folder.bookmarks cascade deletes), bulk imports, batch statements, raw SQL.
+# On MySQL, rows removed by a foreign key ON DELETE CASCADE do not fire them;
+# the app always deletes bookmarks itself before their folder.
+def _trigger_ddl(dialect: str):
+    now = "CURRENT_TIMESTAMP" if dialect == "sqlite" else "UTC_TIMESTAMP()"
+    for table, (entity, key) in TRACKED_TABLES.items():
+        for event, row in (("INSERT", "NEW"), ("UPDATE", "NEW"), ("DELETE", "OLD")):
+            name = f"{table}_changes_{event[0].lower()}"
+            statement = (
+                f"INSERT INTO changes (entity, entity_id, changed_at) "
+                f"VALUES ('{entity}', {row}.{key}, {now})"
+            )
+            if dialect == "sqlite":
+                ddl = f"CREATE TRIGGER IF NOT EXISTS {name} AFTER {event} ON {table} BEGIN {statement}; END"
+            else:
+                ddl = f"CREATE TRIGGER {name} AFTER {event} ON {table} FOR EACH ROW {statement}"
+            yield name, ddl
+
+def ensure_change_log(engine):
+    """Create the change-log triggers for the engine's dialect if they are missing"""
+    with engine.begin() as conn:
+        dialect = conn.dialect.name
+        if dialect == "sqlite":
+            for _, ddl in _trigger_ddl(dialect):
+                conn.execute(text(ddl))
+        elif dialect == "mysql":
+            for name, ddl in _trigger_ddl(dialect):
+                exists = conn.execute(
+                    text("SELECT 1 FROM information_schema.TRIGGERS "
+                         "WHERE TRIGGER_SCHEMA = DATABASE() AND TRIGGER_NAME = :name"),
+                    {"name": name},
+                ).first()
+                if not exists:
+                    conn.execute(text(ddl))
+        else:
+            raise NotImplementedError(f"Change tracking is not supported on {dialect}")
+
+class SyncExpired(Exception):
+    """The client's version is older than the pruned log, or newer than the database"""
+
+def _set_horizon(conn, through: int):
+    result = conn.execute(
+        update(models.SyncState).where(models.SyncState.id == 1).values(pruned_through=through)
+    )
+    if result.rowcount == 0:
+        conn.execute(insert(models.SyncState).values(id=1, pruned_through=through))
+
+def prune(engine, retention_days: float = RETENTION_DAYS, batch_size: int = PRUNE_BATCH_SIZE) -> int:
+    """Drop log entries older than the retention window, batch_size at a time,
+    each batch in its own short transaction; returns the new horizon.
+
+    The horizon moves with every batch, in the same transaction as its delete,
+    so a sync never sees a gap the horizon does not account for.
+    """
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    with engine.connect() as conn:
+        through = conn.scalar(
+            select(func.max(models.Change.version)).where(models.Change.changed_at < cutoff)
+        )
+    if through is None:
+        return None
+    while True:
+        with engine.begin() as conn:
+            bound = conn.scalar(
+                select(models.Change.version)
+                .where(models.Change.version <= through)
+                .order_by(models.Change.version)
+                .offset(batch_size - 1)
+                .limit(1)
+            )
+            bound = through if bound is None else bound
+            conn.execute(delete(models.Change).where(models.Change.version <= bound))
+            _set_horizon(conn, bound)
+        if bound == through:
+            return through
+
+class Pruner:
+    """Thread that prunes the change log every PRUNE_INTERVAL_SECONDS, so that
+    GET /sync stays a read"""
+
+    def __init__(self, engine, interval: float = PRUNE_INTERVAL_SECONDS):
+        self.engine = engine
+        self.interval = interval
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                prune(self.engine)
+            except Exception:
+                logger.exception("Could not prune the change log; trying again in %ss", self.interval)
+            self._stopping.wait(self.interval)
+
+    def start(self):
+        if self._thread is None:
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name="tracksite-sync-prune", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        self._stopping.set()
+        thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join(timeout)
+
+pruner = Pruner(engine)
+
+def get_changes(db: Session, since: int = None, limit: int = MAX_SYNC_CHANGES) -> dict:
+    """What changed after version since, as current rows plus ids of deleted ones.
+
+    Several changes to one row collapse into its current state, so a client
+    applying the result (upserts, then deletes) ends up in step. Results are
+    capped at limit log entries; with more set, call again from version.
+    Without since, only the current version is returned, to start syncing from.
+    """
+    limit = max(1, min(limit, MAX_SYNC_CHANGES))
+    pruned_through = db.scalar(
+        select(models.SyncState.pruned_through).where(models.SyncState.id == 1)
+    ) or 0
+    latest = max(db.scalar(select(func.max(models.Change.version))) or 0, pruned_through)
+    result = {
+        "version": latest, "more": False, "folders": [], "bookmarks": [],
+        "deleted_folders": [], "deleted_bookmarks": [],
+    }
+    if since is None:
+        return result
+    if since < pruned_through:
+        raise SyncExpired(f"Changes before version {pruned_through} have been pruned")
+    if since > latest:
+        raise SyncExpired(f"Version {since} is newer than this database ({latest})")
+
+    entries = db.execute(
+        select(models.Change.version, models.Change.entity, models.Change.entity_id)
+        .where(models.Change.version > since)
+        .order_by(models.Change.version)
+        .limit(limit + 1)
+    ).all()
+    result["more"] = len(entries) > limit
+    entries = entries[:limit]
+    result["version"] = entries[-1].version if entries else since
+
+    changed = {"folder": set(), "bookmark": set()}
+    for entry in entries:
+        changed[entry.entity].add(entry.entity_id)
+
+    if changed["folder"]:
+        columns = [getattr(models.Folder, name) for name in schemas.FolderInfo.model_fields]
+        folders = db.execute(
+            select(*columns)
+            .where(models.Folder.id.in_(changed["folder"]))
+        ).all()
+        result["folders"] = [row._asdict() for row in folders]
+        result["deleted_folders"] = sorted(changed["folder"] - {row.id for row in folders})
+    if changed["bookmark"]:
+        columns = [getattr(models.Bookmark, name) for name in schemas.Bookmark.model_fields]
+        bookmarks = db.execute(
+            select(*columns).where(models.Bookmark.id.in_(changed["bookmark"]))
+        ).all()
+        result["bookmarks"] = [row._asdict() for row in bookmarks]
+        result["deleted_bookmarks"] = sorted(changed["bookmark"] - {row.id for row in bookmarks})
+    return result
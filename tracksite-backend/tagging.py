@@ -0,0 +1,40 @@
+# tagging.py
+
+from sqlalchemy import text
+
+MAX_TAG_LENGTH = 64
+MAX_TAGS = 50  # per bookmark, and per filter
+
+# SQLite does not enforce foreign keys here, so a trigger stands in for the
+# ON DELETE CASCADE on bookmark_tags and covers every way bookmarks are deleted
+# (ORM, batch statements, folder deletes). MySQL cascades through the key itself.
+SQLITE_CLEANUP_DDL = """
+    CREATE TRIGGER IF NOT EXISTS bookmark_tags_ad AFTER DELETE ON bookmarks BEGIN
+        DELETE FROM bookmark_tags WHERE bookmark_id = old.id;
+    END
+"""
+
+def ensure_tag_cleanup(engine):
+    """Create the trigger that drops a deleted bookmark's tags, where one is needed"""
+    with engine.begin() as conn:
+        if conn.dialect.name == "sqlite":
+            conn.execute(text(SQLITE_CLEANUP_DDL))
+
+def normalize_tag(name: str) -> str:
+    """Tags are compared case-insensitively, with runs of whitespace collapsed"""
+    return " ".join(name.split()).lower()
+
+def parse_tags(tags) -> list:
+    """Normalized, de-duplicated tag names from a list or a comma-separated string.
+    Raises ValueError for names that are too long or too many names."""
+    if not tags:
+        return []
+    if isinstance(tags, str):
+        tags = tags.split(",")
+    names = list(dict.fromkeys(name for name in map(normalize_tag, tags) if name))
+    too_long = [name for name in names if len(name) > MAX_TAG_LENGTH]
+    if too_long:
+        raise ValueError(f"Tags may be at most {MAX_TAG_LENGTH} characters: {too_long[0]!r}")
+    if len(names) > MAX_TAGS:
+        raise ValueError(f"At most {MAX_TAGS} tags are allowed")
+    return names
@@ -0,0 +1,40 @@
+# tests/conftest.py
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+# database.py reads its URL at import, so point it somewhere disposable first
+os.environ.setdefault("TRACKSITE_DATABASE_URL", f"sqlite:///{tempfile.mkdtemp(prefix='tracksite-tests-')}/tracksite.db")
+os.environ.setdefault("TRACKSITE_JOB_WORKERS", "0")
+sys.path.insert(0, str(BACKEND_DIR))
+
+import database, migrations
+
+@pytest.fixture
+def make_db(tmp_path):
+    """Factory for sessions on freshly migrated SQLite databases of the test's own"""
+    engines, sessions = [], []
+
+    def make(name: str = "test"):
+        engine = database.make_engine(f"sqlite:///{tmp_path / name}.db")
+        migrations.upgrade(engine)
+        engines.append(engine)
+        sessions.append(sessionmaker(autocommit=False, autoflush=False, bind=engine)())
+        return sessions[-1]
+
+    yield make
+    for session in sessions:
+        session.close()
+    for engine in engines:
+        engine.dispose()
+
+@pytest.fixture
+def db(make_db):
+    return make_db()
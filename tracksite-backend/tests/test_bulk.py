@@ -0,0 +1,52 @@
+# tests/test_bulk.py
+
+import io
+
+import pytest
+
+import bulk, crud, models, schemas
+
+def folder_paths(db) -> dict:
+    """{url: tuple of folder names from the root down} for every bookmark"""
+    folders = {folder.id: folder for folder in db.query(models.Folder)}
+    paths = {}
+    for bookmark in db.query(models.Bookmark):
+        names, folder_id = [], bookmark.folder_id
+        while folder_id is not None:
+            names.insert(0, folders[folder_id].name)
+            folder_id = folders[folder_id].parent_id
+        paths[bookmark.url] = tuple(names)
+    return paths
+
+@pytest.fixture
+def source(make_db):
+    """Two same-named subfolders under different parents, plus a root bookmark"""
+    db = make_db("source")
+    for parent_name, url in (("A", "https://a.example/x"), ("B", "https://b.example/x")):
+        parent = crud.create_folder(db, schemas.FolderCreate(name=parent_name))
+        child = crud.create_folder(db, schemas.FolderCreate(name="X", parent_id=parent.id))
+        crud.create_bookmark(db, schemas.BookmarkCreate(title=f"{parent_name}/X", url=url, folder_id=child.id))
+    crud.create_bookmark(db, schemas.BookmarkCreate(title="Top", url="https://top.example/", folder_id=None))
+    return db
+
+EXPECTED = {
+    "https://a.example/x": ("A", "X"),
+    "https://b.example/x": ("B", "X"),
+    "https://top.example/": (),
+}
+
+def test_ndjson_round_trip_keeps_nesting(source, make_db):
+    exported = "".join(bulk.export_ndjson(source)).encode()
+    target = make_db("target")
+    stats = bulk.import_bookmarks(target, bulk.iter_ndjson(io.BytesIO(exported)))
+    assert stats["failed"] == 0
+    assert stats["folders_created"] == 4
+    assert folder_paths(target) == EXPECTED
+
+def test_netscape_html_round_trip_keeps_nesting(source, make_db):
+    exported = "".join(bulk.export_netscape_html(source)).encode()
+    target = make_db("target")
+    stats = bulk.import_bookmarks(target, bulk.iter_netscape_html(io.BytesIO(exported)))
+    assert stats["failed"] == 0
+    assert stats["folders_created"] == 4
+    assert folder_paths(target) == EXPECTED
@@ -0,0 +1,37 @@
+# tests/test_cache.py
+
+from cache import ReadCache
+
+def test_evicts_least_recently_used_past_maxbytes():
+    cache = ReadCache(maxsize=100, maxbytes=250)
+    cache.set("a", (b"a" * 100, None), 1)
+    cache.set("b", (b"b" * 100, None), 1)
+    assert cache.get("a", 1) is not None  # now "b" is the oldest
+    cache.set("c", (b"c" * 100, None), 1)
+    assert cache.get("b", 1) is None
+    assert cache.get("a", 1) is not None
+    assert cache.get("c", 1) is not None
+    assert cache.size == 200
+
+def test_evicts_past_maxsize():
+    cache = ReadCache(maxsize=2, maxbytes=1000)
+    for key in "abc":
+        cache.set(key, (b"x", None), 1)
+    assert cache.get("a", 1) is None
+    assert cache.size == 2
+
+def test_skips_values_larger_than_maxbytes():
+    cache = ReadCache(maxsize=100, maxbytes=50)
+    cache.set("small", (b"x" * 10, None), 1)
+    cache.set("big", (b"x" * 51, None), 1)
+    assert cache.get("big", 1) is None
+    assert cache.get("small", 1) is not None
+    assert cache.size == 10
+
+def test_replacing_and_retiring_entries_keeps_size_exact():
+    cache = ReadCache(maxsize=100, maxbytes=1000)
+    cache.set("a", (b"x" * 100, "cursor"), 1)
+    cache.set("a", (b"x" * 40, None), 1)
+    assert cache.size == 40
+    assert cache.get("a", 2) is None  # older generation, dropped
+    assert cache.size == 0
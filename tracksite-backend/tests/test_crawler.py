@@ -0,0 +1,89 @@
+# tests/test_crawler.py
+
+import asyncio
+from datetime import datetime
+
+import httpx
+import pytest
+from sqlalchemy import insert, select
+
+import crawler, database, models
+
+PAGE = b"<html><head><title>Fetched</title></head><body></body></html>"
+
+def handler(request):
+    """Stub web: a 304 for a known ETag, a HEAD-rejecting host, a flaky host and a dead link"""
+    host = request.url.host
+    if host == "unchanged.test":
+        if request.headers.get("if-none-match") == '"v1"':
+            return httpx.Response(304)
+        return httpx.Response(200, headers={"etag": '"v1"'})
+    if host == "no-head.test":
+        if request.method == "HEAD":
+            return httpx.Response(405)
+        return httpx.Response(200, headers={"content-type": "text/html"}, content=PAGE)
+    if host == "flaky.test":
+        handler.flaky_calls += 1
+        if handler.flaky_calls == 1:
+            return httpx.Response(503)
+        return httpx.Response(200, headers={"content-type": "text/html"}, content=PAGE)
+    return httpx.Response(404)
+
+@pytest.fixture
+def async_engine(db, monkeypatch):
+    monkeypatch.setattr(crawler, "BACKOFF_SECONDS", 0.0)
+    handler.flaky_calls = 0
+    yield database.make_async_engine(str(db.get_bind().url))
+
+def add_bookmark(db, url: str, **link_status) -> int:
+    bookmark_id = db.execute(insert(models.Bookmark).values(
+        title=url, url=url, created_at=datetime.utcnow()
+    )).inserted_primary_key[0]
+    if link_status:
+        db.execute(insert(models.LinkStatus).values(
+            bookmark_id=bookmark_id, last_checked=datetime.utcnow(), **link_status
+        ))
+    db.commit()
+    return bookmark_id
+
+def test_crawl_records_link_health(db, async_engine):
+    unchanged = add_bookmark(db, "https://unchanged.test/", etag='"v1"', fetched_title="Known")
+    no_head = add_bookmark(db, "https://no-head.test/", fetched_title="Old title")
+    flaky = add_bookmark(db, "https://flaky.test/")
+    dead = add_bookmark(db, "https://dead.test/")
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            try:
+                return await crawler.crawl(client=client, engine=async_engine)
+            finally:
+                await async_engine.dispose()
+
+    progress = asyncio.run(run())
+    assert (progress.total, progress.checked, progress.unchanged, progress.dead) == (4, 4, 1, 1)
+    assert progress.error is None
+
+    rows = {row.bookmark_id: row for row in db.scalars(select(models.LinkStatus))}
+    assert rows[unchanged].status_code == 304
+    assert rows[unchanged].fetched_title == "Known"
+    assert rows[no_head].status_code == 200  # GET after the HEAD was rejected
+    assert rows[no_head].fetched_title == "Fetched"
+    assert rows[flaky].status_code == 200  # retried after the 503
+    assert handler.flaky_calls == 2
+    assert rows[flaky].fetched_title == "Fetched"
+    assert rows[dead].status_code == 404
+    assert rows[dead].dead and not rows[flaky].dead
+
+def test_background_crawl_keeps_its_error(monkeypatch):
+    async def fail(engine):
+        raise RuntimeError("database is gone")
+
+    monkeypatch.setattr(crawler, "remove_orphans", fail)
+
+    async def run():
+        assert crawler.start_crawl()
+        await asyncio.wait([crawler._task])
+
+    asyncio.run(run())
+    assert not crawler.progress.running
+    assert crawler.progress.error == "RuntimeError: database is gone"
@@ -0,0 +1,12 @@
+# tests/test_metrics.py
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+def test_failed_statement_does_not_leak_its_start_time(db):
+    with db.get_bind().connect() as conn:
+        conn.execute(text("SELECT 1"))
+        with pytest.raises(OperationalError):
+            conn.execute(text("SELECT * FROM no_such_table"))
+        assert conn.info["query_start"] == []
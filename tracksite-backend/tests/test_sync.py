@@ -0,0 +1,20 @@
+# tests/test_sync.py
+
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, insert, select
+
+import models, sync
+
+def test_prune_deletes_in_batches_and_moves_the_horizon(db):
+    old = datetime.utcnow() - timedelta(days=sync.RETENTION_DAYS + 1)
+    db.execute(insert(models.Change), [
+        {"entity": "bookmark", "entity_id": n, "changed_at": old} for n in range(5)
+    ] + [{"entity": "bookmark", "entity_id": 99, "changed_at": datetime.utcnow()}])
+    db.commit()
+    newest_old = db.scalar(select(func.max(models.Change.version)).where(models.Change.changed_at == old))
+
+    assert sync.prune(db.get_bind(), batch_size=2) == newest_old
+    assert db.scalar(select(func.count()).select_from(models.Change)) == 1
+    assert db.scalar(select(models.SyncState.pruned_through)) == newest_old
+    assert sync.prune(db.get_bind(), batch_size=2) is None
@@ -0,0 +1,52 @@
+# urls.py
+
+import hashlib
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+# Query parameters that only record which campaign or click led to a page
+TRACKING_PARAMS = {
+    "fbclid", "gclid", "dclid", "gbraid", "wbraid", "msclkid", "yclid",
+    "mc_cid", "mc_eid", "igshid", "_ga", "_gl", "ref_src",
+}
+TRACKING_PREFIXES = ("utm_",)
+
+def is_tracking_param(name: str) -> bool:
+    name = name.lower()
+    return name in TRACKING_PARAMS or name.startswith(TRACKING_PREFIXES)
+
+def normalize_url(url: str) -> str:
+    """Canonical form of a URL, used to detect duplicates.
+
+    Lowercases the scheme and host, drops default ports and tracking parameters,
+    sorts the query string and gives an empty path a "/". Anything that is not
+    an http(s) URL, such as an upload path, is only stripped of whitespace.
+    """
+    url = url.strip()
+    try:
+        parts = urlsplit(url)
+        port = parts.port
+    except ValueError:
+        return url
+    scheme = parts.scheme.lower()
+    if scheme not in DEFAULT_PORTS or not parts.hostname:
+        return url
+
+    host = parts.hostname  # urlsplit lowercases it
+    if ":" in host:
+        host = f"[{host}]"
+    if port is not None and port != DEFAULT_PORTS[scheme]:
+        host = f"{host}:{port}"
+    userinfo, _, _ = parts.netloc.rpartition("@")
+    netloc = f"{userinfo}@{host}" if userinfo else host
+
+    query = sorted(
+        (name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not is_tracking_param(name)
+    )
+    return urlunsplit((scheme, netloc, parts.path or "/", urlencode(query), parts.fragment))
+
+def url_hash(url: str) -> str:
+    """Fixed-width key for the normalized URL: the hex SHA-256 of normalize_url(url)"""
+    return hashlib.sha256(normalize_url(url).encode()).hexdigest()
@@ -0,0 +1,199 @@
+# visits.py
+
+"""Write-behind visit tracking.
+
+Clicks are counted in memory, per bookmark, and written every FLUSH_SECONDS as
+one batched upsert instead of a committed row per click. The buffer holds at
+most MAX_PENDING bookmarks; reaching that triggers an early flush, and visits
+to further bookmarks are dropped until it has run. Visits show up in the
+rankings once they are flushed.
+"""
+
+import logging
+import os
+import threading
+from datetime import datetime
+from sqlalchemy import func, select, text
+from sqlalchemy.dialects import mysql, sqlite
+from sqlalchemy.orm import Session
+import crud, fastjson, models, schemas
+from database import engine
+
+FLUSH_SECONDS = float(os.getenv("TRACKSITE_VISIT_FLUSH_SECONDS", "5"))
+MAX_PENDING = int(os.getenv("TRACKSITE_VISIT_BUFFER_SIZE", "10000"))
+
+# Frecency: a visit at time t adds 2 ** ((t - FRECENCY_EPOCH) / half-life), so
+# ordering by the running sum ranks bookmarks as if every visit's weight halved
+# each HALF_LIFE_DAYS, without ever rewriting old rows. A double tops out at
+# 2 ** 1024, i.e. 1024 half-lives (about 84 years) after the epoch, so weights
+# overflow around 2108. Before then, move FRECENCY_EPOCH forward and multiply
+# every stored frecency by 2 ** -(shift / half-life): that keeps the order.
+HALF_LIFE_DAYS = 30
+FRECENCY_EPOCH = datetime(2024, 1, 1)
+
+logger = logging.getLogger("tracksite.visits")
+
+# See tagging.py: SQLite does not enforce the ON DELETE CASCADE
+SQLITE_CLEANUP_DDL = """
+    CREATE TRIGGER IF NOT EXISTS bookmark_visits_ad AFTER DELETE ON bookmarks BEGIN
+        DELETE FROM bookmark_visits WHERE bookmark_id = old.id;
+    END
+"""
+
+def ensure_visit_cleanup(engine):
+    """Create the trigger that drops a deleted bookmark's visits, where one is needed"""
+    with engine.begin() as conn:
+        if conn.dialect.name == "sqlite":
+            conn.execute(text(SQLITE_CLEANUP_DDL))
+
+def visit_weight(when: datetime) -> float:
+    return 2.0 ** ((when - FRECENCY_EPOCH).total_seconds() / (HALF_LIFE_DAYS * 86400))
+
+def write_visits(engine, pending: dict):
+    """Add {bookmark_id: [count, last_visited_at, frecency]} to bookmark_visits
+    in one transaction, as a single executemany upsert"""
+    table = models.BookmarkVisit.__table__
+    with engine.begin() as conn:
+        ids = list(pending)
+        existing = set()
+        for start in range(0, len(ids), crud.LOOKUP_CHUNK_SIZE):
+            chunk = ids[start:start + crud.LOOKUP_CHUNK_SIZE]
+            existing.update(conn.scalars(select(models.Bookmark.id).where(models.Bookmark.id.in_(chunk))))
+        rows = [
+            {"bookmark_id": bookmark_id, "visit_count": count, "last_visited_at": last, "frecency": frecency}
+            for bookmark_id, (count, last, frecency) in pending.items()
+            if bookmark_id in existing  # deleted since the click
+        ]
+        if not rows:
+            return
+        dialect = conn.dialect.name
+        if dialect == "sqlite":
+            stmt = sqlite.insert(table)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[table.c.bookmark_id],
+                set_={
+                    "visit_count": table.c.visit_count + stmt.excluded.visit_count,
+                    "last_visited_at": func.max(table.c.last_visited_at, stmt.excluded.last_visited_at),
+                    "frecency": table.c.frecency + stmt.excluded.frecency,
+                },
+            )
+        elif dialect == "mysql":
+            stmt = mysql.insert(table)
+            stmt = stmt.on_duplicate_key_update(
+                visit_count=table.c.visit_count + stmt.inserted.visit_count,
+                last_visited_at=func.greatest(table.c.last_visited_at, stmt.inserted.last_visited_at),
+                frecency=table.c.frecency + stmt.inserted.frecency,
+            )
+        else:
+            raise NotImplementedError(f"Visit tracking is not supported on {dialect}")
+        conn.execute(stmt, rows)
+
+class VisitBuffer:
+    """Visit counts waiting to be written, and the thread that writes them"""
+
+    def __init__(self, engine, max_pending: int = MAX_PENDING, interval: float = FLUSH_SECONDS):
+        self.engine = engine
+        self.max_pending = max_pending
+        self.interval = interval
+        self.dropped = 0
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def record(self, bookmark_id: int, when: datetime = None) -> bool:
+        """Count one visit; False if the buffer was full and it was dropped"""
+        when = when or datetime.utcnow()
+        with self._lock:
+            entry = self._pending.get(bookmark_id)
+            if entry is None:
+                if len(self._pending) >= self.max_pending:
+                    self.dropped += 1
+                    self._wake.set()
+                    return False
+                entry = self._pending[bookmark_id] = [0, when, 0.0]
+                if len(self._pending) >= self.max_pending:
+                    self._wake.set()
+            entry[0] += 1
+            entry[1] = max(entry[1], when)
+            entry[2] += visit_weight(when)
+        self.start()
+        return True
+
+    def flush(self) -> int:
+        """Write everything buffered so far; returns the number of bookmarks written"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        try:
+            write_visits(self.engine, pending)
+        except Exception:
+            logger.exception("Could not write %d buffered visits; keeping them for the next flush", len(pending))
+            with self._lock:
+                for bookmark_id, (count, last, frecency) in pending.items():
+                    entry = self._pending.get(bookmark_id)
+                    if entry is not None:
+                        entry[0] += count
+                        entry[1] = max(entry[1], last)
+                        entry[2] += frecency
+                    elif len(self._pending) < self.max_pending:
+                        self._pending[bookmark_id] = [count, last, frecency]
+                    else:
+                        self.dropped += count
+            return 0
+        return len(pending)
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self.flush()
+
+    def start(self):
+        """Start the flushing thread, once"""
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._stopping.clear()
+                self._thread = threading.Thread(target=self._run, name="tracksite-visits", daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        """Stop the thread and write whatever is still buffered"""
+        self._stopping.set()
+        self._wake.set()
+        thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join(timeout)
+        self.flush()
+
+buffer = VisitBuffer(engine)
+
+# Rankings
+def _ranked(db: Session, order, folder_id: int = None, limit: int = 20) -> bytes:
+    limit = max(1, min(limit, crud.MAX_PAGE_SIZE))
+    names = list(schemas.VisitedBookmark.model_fields)
+    columns = [
+        getattr(models.BookmarkVisit if name in ("visit_count", "last_visited_at") else models.Bookmark, name)
+        for name in names
+    ]
+    query = (
+        db.query(*columns)
+        .select_from(models.BookmarkVisit)
+        .join(models.Bookmark, models.Bookmark.id == models.BookmarkVisit.bookmark_id)
+    )
+    if folder_id is not None:
+        query = query.filter(models.Bookmark.folder_id == folder_id)
+    rows = query.order_by(order.desc()).limit(limit)
+    return fastjson.dumps(fastjson.row_dicts(rows, names))
+
+def get_top(db: Session, folder_id: int = None, limit: int = 20) -> bytes:
+    """Most used bookmarks by frecency, read backwards along its index"""
+    return _ranked(db, models.BookmarkVisit.frecency, folder_id, limit)
+
+def get_recent(db: Session, folder_id: int = None, limit: int = 20) -> bytes:
+    """Most recently opened bookmarks, read backwards along the last_visited_at index"""
+    return _ranked(db, models.BookmarkVisit.last_visited_at, folder_id, limit)